@@ -20,6 +20,77 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 __path__ = __import__('pkgutil').extend_path(__path__, __name__)
 
-from .logging_config import LoggingConfig
-from .local_sensors import LocalSensors
-from .server import Server
+# Classes are imported on first use, so importing the package doesn't pull in RPi.GPIO,
+# toml, asyncio or Flask, nor configure logging.
+_EXPORTS = {
+    "Aggregator": "aggregator",
+    "AggregatorClient": "aggregator_client",
+    "AlertRule": "alert_rule",
+    "AlertSink": "alert_sink",
+    "AsyncHttpServer": "async_http_server",
+    "BinaryCodec": "binary_codec",
+    "ChangeOnlyFilter": "change_only_filter",
+    "ColumnarExport": "columnar_export",
+    "ConfigWatcher": "config_watcher",
+    "DebouncedSensorState": "debounced_sensor_state",
+    "DurationRule": "duration_rule",
+    "FileAlertSink": "file_alert_sink",
+    "FlappingRule": "flapping_rule",
+    "GpioScheduler": "gpio_scheduler",
+    "GroupRule": "group_rule",
+    "JsonCodec": "json_codec",
+    "JsonFileStorage": "json_file_storage",
+    "JsonLinesCodec": "json_lines_codec",
+    "JsonLogFormatter": "json_log_formatter",
+    "LegacyCompactor": "legacy_compactor",
+    "LocalSensors": "local_sensors",
+    "LogAlertSink": "log_alert_sink",
+    "LoggingConfig": "logging_config",
+    "Measure": "measure",
+    "MeasureStorage": "measure_storage",
+    "MeasureValidator": "measure_validator",
+    "Metrics": "metrics",
+    "ReadingLog": "reading_log",
+    "Rollups": "rollups",
+    "RulesEngine": "rules_engine",
+    "ScheduledPin": "scheduled_pin",
+    "SegmentedStorage": "segmented_storage",
+    "SensorDescriptor": "sensor_descriptor",
+    "SensorDictionary": "sensor_dictionary",
+    "SensorState": "sensor_state",
+    "Server": "server",
+    "SimulatedGpio": "simulated_gpio",
+    "StatusCache": "status_cache",
+    "TimestampFormatter": "timestamp_formatter",
+    "UdpServer": "udp_server",
+    "Uplink": "uplink",
+    "UplinkSpool": "uplink_spool",
+    "WebhookAlertSink": "webhook_alert_sink",
+    "WriteBehindQueue": "write_behind_queue",
+}
+
+__all__ = list(_EXPORTS)
+
+def __getattr__(name:str):
+    """
+    Imports the module defining given class, the first time it's accessed.
+    :param name: The class name.
+    :type name: str
+    :return: The class.
+    :rtype: type
+    """
+    module = _EXPORTS.get(name, None)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    result = getattr(import_module(f".{module}", __name__), name)
+    globals()[name] = result
+    return result
+
+def __dir__():
+    """
+    Lists the attributes of the package, including the classes not imported yet.
+    :return: Such attributes.
+    :rtype: List[str]
+    """
+    return sorted(set(globals()) | set(__all__))
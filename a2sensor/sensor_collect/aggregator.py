@@ -0,0 +1,214 @@
+"""
+a2sensor/sensor_collect/aggregator.py
+
+This script defines the Aggregator class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from .json_codec import JsonCodec
+import logging
+from .measure import Measure
+import os
+import signal
+import socketserver
+import threading
+from typing import Dict, List
+
+class Aggregator():
+    """
+    Owns the storage and the status cache on behalf of several HTTP worker processes.
+
+    Workers connect to its Unix socket and send newline-delimited JSON messages:
+    {"op": "save", "measures": [[id, name, status, epoch, count], ...]} hands measures
+    to the Server, and {"op": "subscribe"} turns the connection into a stream of status
+    cache snapshots, {"nonce", "version", "sensors"}, the first one complete and then one
+    per change.
+
+    Class name: Aggregator
+
+    Responsibilities:
+        - Be the single writer of the storage.
+        - Serve the measures forwarded by workers, and notify them of status changes.
+
+    Collaborators:
+        - a2sensor.sensor_collect.AggregatorClient
+        - a2sensor.sensor_collect.Server
+    """
+
+    def __init__(self, server, socketPath:str):
+        """
+        Creates a new Aggregator instance.
+        :param server: The server storing the measures.
+        :type server: a2sensor.sensor_collect.Server
+        :param socketPath: The path of the Unix socket to listen to.
+        :type socketPath: str
+        """
+        super().__init__()
+        self._server = server
+        self._socket_path = socketPath
+        self._socket_server = None
+
+    @property
+    def server(self):
+        """
+        Retrieves the server storing the measures.
+        :return: Such server.
+        :rtype: a2sensor.sensor_collect.Server
+        """
+        return self._server
+
+    @property
+    def socket_path(self) -> str:
+        """
+        Retrieves the path of the Unix socket.
+        :return: Such path.
+        :rtype: str
+        """
+        return self._socket_path
+
+    @classmethod
+    def encode_measures(cls, measures:List[Measure]) -> List[List]:
+        """
+        Converts given measures to their wire format.
+        :param measures: The measures.
+        :type measures: List[a2sensor.sensor_collect.Measure]
+        :return: A list with the id, name, status, epoch and count of each one.
+        :rtype: List[List]
+        """
+        return [ [ measure.sensor_id, measure.sensor_name, measure.status, measure.epoch, measure.count ] for measure in measures ]
+
+    @classmethod
+    def decode_measures(cls, items:List[List]) -> List[Measure]:
+        """
+        Converts given measures from their wire format.
+        :param items: A list with the id, name, status, epoch and count of each one.
+        :type items: List[List]
+        :return: The measures.
+        :rtype: List[a2sensor.sensor_collect.Measure]
+        """
+        return [ Measure(*item) for item in items ]
+
+    def handle(self, reader, writer):
+        """
+        Serves a worker connection.
+        :param reader: The file to read messages from.
+        :type reader: io.BufferedReader
+        :param writer: The file to write messages to.
+        :type writer: io.BufferedWriter
+        """
+        codec = JsonCodec.instance()
+        for line in reader:
+            message = codec.loads(line)
+            operation = message.get('op', None)
+            if operation == "save":
+                self._server.save_all(self.__class__.decode_measures(message['measures']))
+            elif operation == "subscribe":
+                self.stream_status(writer)
+                return
+            else:
+                logging.getLogger("a2sensor").warning(f"Unknown aggregator operation {operation}")
+
+    def stream_status(self, writer):
+        """
+        Writes the status cache, and then every change, until the worker goes away.
+        :param writer: The file to write messages to.
+        :type writer: io.BufferedWriter
+        """
+        cache = self._server.status_cache
+        codec = JsonCodec.instance()
+        version = 0
+        while self._socket_server is not None:
+            current, sensors = cache.snapshot(version)
+            if sensors or version == 0:
+                writer.write(codec.dumps({ "nonce": cache.nonce, "version": current, "sensors": sensors }) + b"\n")
+                writer.flush()
+            version = current
+            cache.wait_for_change(version, 15)
+
+    def listen(self):
+        """
+        Binds the Unix socket, replacing any stale one.
+        """
+        aggregator = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                try:
+                    aggregator.handle(self.rfile, self.wfile)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        if os.path.exists(self._socket_path):
+            os.remove(self._socket_path)
+        self._socket_server = socketserver.ThreadingUnixStreamServer(self._socket_path, Handler)
+        self._socket_server.daemon_threads = True
+
+    def serve_forever(self):
+        """
+        Serves workers until shutdown() is called.
+        """
+        if self._socket_server is None:
+            self.listen()
+        try:
+            self._socket_server.serve_forever()
+        finally:
+            self._socket_server.server_close()
+            self._socket_server = None
+            if os.path.exists(self._socket_path):
+                os.remove(self._socket_path)
+
+    def shutdown(self):
+        """
+        Stops listening. Must be called from another thread than serve_forever().
+        """
+        if self._socket_server is not None:
+            self._socket_server.shutdown()
+
+    @classmethod
+    def run_process(cls, dataFolder:str, localSensorsFile:str, options:Dict, socketPath:str, ready=None):
+        """
+        Runs an aggregator as the main function of its own process, until it receives SIGTERM or SIGINT.
+        :param dataFolder: The storage folder.
+        :type dataFolder: str
+        :param localSensorsFile: The sensor definition file.
+        :type localSensorsFile: str
+        :param options: Any other keyword argument accepted by the Server constructor.
+        :type options: Dict
+        :param socketPath: The path of the Unix socket to listen to.
+        :type socketPath: str
+        :param ready: The event to set once listening. Optional.
+        :type ready: multiprocessing.Event
+        """
+        from .logging_config import LoggingConfig
+        from .server import Server
+        LoggingConfig.instance().configure_logging(**LoggingConfig.options_from_environment())
+        Server.configure(dataFolder, localSensorsFile, **options)
+        server = Server.instance()
+        server.start_udp_server()
+        aggregator = cls(server, socketPath)
+
+        def stop(signum, frame):
+            threading.Thread(target=aggregator.shutdown).start()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        aggregator.listen()
+        if ready is not None:
+            ready.set()
+        try:
+            aggregator.serve_forever()
+        finally:
+            server.close()
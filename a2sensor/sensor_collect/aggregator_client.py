@@ -0,0 +1,217 @@
+"""
+a2sensor/sensor_collect/aggregator_client.py
+
+This script defines the AggregatorClient class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from .aggregator import Aggregator
+from .json_codec import JsonCodec
+import logging
+from .measure import Measure
+from .measure_storage import MeasureStorage
+import socket
+from .status_cache import StatusCache
+import threading
+from typing import Iterator, List
+
+class AggregatorClient():
+    """
+    Stands for the Server in an HTTP worker process, forwarding measures to the Aggregator.
+
+    It exposes the part of the Server interface the HTTP endpoints use: measures are sent
+    over the aggregator's Unix socket, the status cache is a mirror kept up to date by the
+    aggregator, and queries read the storage files directly, seeing what the aggregator has
+    flushed so far.
+
+    Class name: AggregatorClient
+
+    Responsibilities:
+        - Forward measures to the aggregator.
+        - Mirror its status cache.
+        - Read stored measures.
+
+    Collaborators:
+        - a2sensor.sensor_collect.Aggregator
+        - a2sensor.sensor_collect.StatusCache
+    """
+
+    def __init__(self, socketPath:str, storageFolder:str, storageBackend:str="segmented", rollupInterval:float=60.0, jsonCodec:str="auto", **options):
+        """
+        Creates a new AggregatorClient instance.
+        :param socketPath: The path of the aggregator's Unix socket.
+        :type socketPath: str
+        :param storageFolder: The folder of the storage.
+        :type storageFolder: str
+        :param storageBackend: The storage backend, as in the Server.
+        :type storageBackend: str
+        :param rollupInterval: Whether the aggregator computes rollups, if greater than zero.
+        :type rollupInterval: float
+        :param jsonCodec: The JSON library, as in the Server.
+        :type jsonCodec: str
+        :param options: Other Server options, ignored since the aggregator applies them.
+        :type options: Dict
+        """
+        super().__init__()
+        JsonCodec.configure(jsonCodec)
+        self._socket_path = socketPath
+        from .logging_config import LoggingConfig
+        self._storage = MeasureStorage.for_backend(storageBackend, storageFolder, LoggingConfig.instance().date_format, flushInterval=0)
+        self._rollups = None
+        if rollupInterval > 0:
+            from .rollups import Rollups
+            self._rollups = Rollups(self._storage)
+        self._status_cache = StatusCache()
+        self._connection = None
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._subscriber = threading.Thread(target=self._mirror_status, name="aggregator-subscriber", daemon=True)
+        self._subscriber.start()
+
+    @property
+    def socket_path(self) -> str:
+        """
+        Retrieves the path of the aggregator's Unix socket.
+        :return: Such path.
+        :rtype: str
+        """
+        return self._socket_path
+
+    @property
+    def storage(self) -> MeasureStorage:
+        """
+        Retrieves the storage, for reading.
+        :return: Such storage.
+        :rtype: a2sensor.sensor_collect.MeasureStorage
+        """
+        return self._storage
+
+    @property
+    def rollups(self):
+        """
+        Retrieves the per-minute and per-hour aggregates, if enabled.
+        :return: Such aggregates, or None.
+        :rtype: a2sensor.sensor_collect.Rollups
+        """
+        return self._rollups
+
+    @property
+    def status_cache(self) -> StatusCache:
+        """
+        Retrieves the mirror of the aggregator's status cache.
+        :return: Such cache.
+        :rtype: a2sensor.sensor_collect.StatusCache
+        """
+        return self._status_cache
+
+    def save_to_file(self, sensorId:str, sensorName:str, status:str):
+        """
+        Forwards given measure to the aggregator.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :param sensorName: The sensor name.
+        :type sensorName: str
+        :param status: The status the sensor has read.
+        :type status: str
+        """
+        self.save_all([ Measure(sensorId, sensorName, status) ])
+
+    def save_all(self, measures:List[Measure]):
+        """
+        Forwards given measures to the aggregator, as a single message.
+        :param measures: The measures.
+        :type measures: List[a2sensor.sensor_collect.Measure]
+        :raise OSError: If the aggregator cannot be reached.
+        """
+        message = JsonCodec.instance().dumps({ "op": "save", "measures": Aggregator.encode_measures(measures) }) + b"\n"
+        with self._lock:
+            try:
+                self._connect().sendall(message)
+            except OSError:
+                # the aggregator may have been restarted: retry once with a new connection
+                self._disconnect()
+                self._connect().sendall(message)
+
+    def _connect(self) -> socket.socket:
+        """
+        Retrieves the connection to the aggregator, opening it if needed. Must be called with the lock held.
+        :return: The connection.
+        :rtype: socket.socket
+        """
+        if self._connection is None:
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            connection.connect(self._socket_path)
+            self._connection = connection
+        return self._connection
+
+    def _disconnect(self):
+        """
+        Closes the connection to the aggregator, if any. Must be called with the lock held.
+        """
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def query(self, sensorId:str, start:int=None, end:int=None) -> Iterator[Measure]:
+        """
+        Reads the stored measures of given sensor within a time range, oldest first, lazily.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :param start: The first time to include, in microseconds since the epoch. Optional.
+        :type start: int
+        :param end: The first time to exclude, in microseconds since the epoch. Optional.
+        :type end: int
+        :return: The measures.
+        :rtype: Iterator[a2sensor.sensor_collect.Measure]
+        """
+        return self._storage.query(sensorId, start, end)
+
+    def _mirror_status(self):
+        """
+        Subscribes to the aggregator's status cache, and applies its snapshots, reconnecting until closed.
+        """
+        while not self._closed.is_set():
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+                    connection.connect(self._socket_path)
+                    connection.sendall(b'{"op":"subscribe"}\n')
+                    with connection.makefile('rb') as reader:
+                        codec = JsonCodec.instance()
+                        for line in reader:
+                            snapshot = codec.loads(line)
+                            if snapshot["nonce"] != self._status_cache.nonce:
+                                # first snapshot, or the aggregator was restarted
+                                self._status_cache.reset(snapshot["nonce"])
+                            self._status_cache.apply(snapshot["version"], snapshot["sensors"])
+            except OSError as error:
+                logging.getLogger("a2sensor").warning(f"Cannot follow the aggregator status: {error}")
+            self._closed.wait(1)
+
+    def start_udp_server(self):
+        """
+        Does nothing: the aggregator ingests measures over UDP.
+        """
+        pass
+
+    def close(self):
+        """
+        Closes the connection to the aggregator.
+        """
+        self._closed.set()
+        self._status_cache.close()
+        with self._lock:
+            self._disconnect()
+        self._storage.close()
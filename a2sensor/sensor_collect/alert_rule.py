@@ -0,0 +1,128 @@
+"""
+a2sensor/sensor_collect/alert_rule.py
+
+This script defines the AlertRule class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from .measure import Measure
+from typing import Dict, List
+
+class AlertRule():
+    """
+    Base class of the rules evaluated on the stream of measures.
+
+    Rules see each measure once, in the order they are ingested, and keep their own state, so
+    each measure costs them constant time. Measures carry the time they were taken, which is
+    the clock of the rules, except for tick(), which lets rules fire on sensors that went
+    silent. Each alert is a dictionary with the "rule", its "state" ("firing" or "resolved"),
+    the "epoch" it refers to, a "message", and fields of each kind of rule.
+
+    Class name: AlertRule
+
+    Responsibilities:
+        - Update its state with each measure.
+        - Raise and resolve alerts.
+
+    Collaborators:
+        - a2sensor.sensor_collect.RulesEngine
+    """
+
+    TYPES = [ "duration", "group", "flapping" ]
+
+    def __init__(self, name:str):
+        """
+        Creates a new AlertRule instance.
+        :param name: The name of the rule, in its alerts.
+        :type name: str
+        """
+        super().__init__()
+        self._name = name
+
+    @property
+    def name(self) -> str:
+        """
+        Retrieves the name of the rule.
+        :return: Such name.
+        :rtype: str
+        """
+        return self._name
+
+    def update(self, measure:Measure) -> List[Dict]:
+        """
+        Processes a new measure.
+        :param measure: The measure.
+        :type measure: a2sensor.sensor_collect.Measure
+        :return: The alerts raised or resolved.
+        :rtype: List[Dict]
+        """
+        raise NotImplementedError()
+
+    def tick(self, now:int) -> List[Dict]:
+        """
+        Processes the passing of time, without new measures.
+        :param now: The current time, in microseconds since the epoch.
+        :type now: int
+        :return: The alerts raised or resolved.
+        :rtype: List[Dict]
+        """
+        return []
+
+    def alert(self, state:str, epoch:int, message:str, **fields) -> Dict:
+        """
+        Builds an alert of this rule.
+        :param state: Either "firing" or "resolved".
+        :type state: str
+        :param epoch: The time it refers to, in microseconds since the epoch.
+        :type epoch: int
+        :param message: The description.
+        :type message: str
+        :param fields: Any other field.
+        :type fields: Dict
+        :return: The alert.
+        :rtype: Dict
+        """
+        result = { "rule": self._name, "state": state, "epoch": epoch, "message": message }
+        result.update(fields)
+        return result
+
+    @classmethod
+    def from_config(cls, config:Dict):
+        """
+        Builds a rule from its settings in the rules file.
+        :param config: The settings, with its "type": "duration", "group" or "flapping".
+        :type config: Dict
+        :return: The rule.
+        :rtype: a2sensor.sensor_collect.AlertRule
+        :raise ValueError: If the settings are not valid.
+        """
+        kind = config.get('type', None)
+        name = config.get('name', kind)
+        if kind == "duration":
+            if 'seconds' not in config and 'minutes' not in config:
+                raise ValueError(f"Rule {name} must have either 'seconds' or 'minutes'")
+            from .duration_rule import DurationRule
+            return DurationRule(name, config.get('status', "stuck"), config['seconds'] if 'seconds' in config else config['minutes'] * 60, config.get('sensors', None))
+        if kind == "group":
+            missing = [ key for key in [ "sensors", "more_than" ] if key not in config ]
+            if missing:
+                raise ValueError(f"Rule {name} must have {' and '.join(repr(key) for key in missing)}")
+            from .group_rule import GroupRule
+            return GroupRule(name, config['sensors'], config.get('status', "empty"), config['more_than'])
+        if kind == "flapping":
+            from .flapping_rule import FlappingRule
+            return FlappingRule(name, config.get('transitions', 5), config.get('seconds', 300), config.get('sensors', None))
+        raise ValueError(f"Unknown rule type {kind}: must be one of {', '.join(cls.TYPES)}")
@@ -0,0 +1,72 @@
+"""
+a2sensor/sensor_collect/alert_sink.py
+
+This script defines the AlertSink class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from typing import Dict, List
+
+class AlertSink():
+    """
+    Base class of the destinations of alerts.
+
+    Class name: AlertSink
+
+    Responsibilities:
+        - Deliver alerts.
+
+    Collaborators:
+        - a2sensor.sensor_collect.RulesEngine
+    """
+
+    TYPES = [ "log", "file", "webhook" ]
+
+    def send(self, alerts:List[Dict]):
+        """
+        Delivers given alerts.
+        :param alerts: The alerts.
+        :type alerts: List[Dict]
+        :raise OSError: If they cannot be delivered.
+        """
+        raise NotImplementedError()
+
+    def close(self):
+        """
+        Releases any resource.
+        """
+        pass
+
+    @classmethod
+    def from_config(cls, config:Dict):
+        """
+        Builds a sink from its settings in the rules file.
+        :param config: The settings, with its "type": "log", "file" or "webhook".
+        :type config: Dict
+        :return: The sink.
+        :rtype: a2sensor.sensor_collect.AlertSink
+        """
+        kind = config.get('type', None)
+        if kind == "log":
+            from .log_alert_sink import LogAlertSink
+            return LogAlertSink(config.get('level', "warning"))
+        if kind == "file":
+            from .file_alert_sink import FileAlertSink
+            return FileAlertSink(config['path'])
+        if kind == "webhook":
+            from .webhook_alert_sink import WebhookAlertSink
+            return WebhookAlertSink(config['url'], config.get('timeout', 5.0))
+        raise ValueError(f"Unknown sink type {kind}: must be one of {', '.join(cls.TYPES)}")
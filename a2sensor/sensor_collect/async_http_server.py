@@ -0,0 +1,448 @@
+"""
+a2sensor/sensor_collect/async_http_server.py
+
+This script defines the AsyncHttpServer class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+from http import HTTPStatus
+from .json_codec import JsonCodec
+from .json_lines_codec import JsonLinesCodec
+import json
+import logging
+import math
+from .measure import Measure
+from .measure_validator import MeasureValidator
+from .metrics import Metrics
+import threading
+import time
+from typing import Dict, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+class AsyncHttpServer():
+    """
+    Asyncio ingestion server, an alternative to the Flask app for many concurrent, keep-alive clients.
+
+    It speaks just enough HTTP/1.1 for the ingestion endpoints, with the same contract and
+    validation as the Flask app: PUT /v1/<sensorId>/measure, POST /v1/measures (JSON array or
+    NDJSON, optionally gzip-compressed), GET /v1/<sensorId>/measures and /v1/<sensorId>/rollups,
+    GET /v1/status (with If-None-Match and "wait"), and GET /metrics. Responses are compact JSON,
+    with sorted keys and a trailing newline, like Flask's jsonify, encoded with the JsonCodec. Measures are handed to the
+    Server from the event loop, so a write-behind queue with the "block" policy pauses all
+    connections while it's full, which is the back-pressure wanted.
+
+    Class name: AsyncHttpServer
+
+    Responsibilities:
+        - Serve thousands of connections from a single thread.
+        - Validate measures and hand them to the Server.
+
+    Collaborators:
+        - a2sensor.sensor_collect.MeasureValidator
+        - a2sensor.sensor_collect.Server
+    """
+
+    def __init__(self, server, port:int, host:str="0.0.0.0", maxBodySize:int=16777216, keepAliveTimeout:float=75.0):
+        """
+        Creates a new AsyncHttpServer instance.
+        :param server: The server storing the measures.
+        :type server: a2sensor.sensor_collect.Server
+        :param port: The TCP port.
+        :type port: int
+        :param host: The address to bind to.
+        :type host: str
+        :param maxBodySize: The largest request body accepted, in bytes.
+        :type maxBodySize: int
+        :param keepAliveTimeout: The seconds an idle connection is kept open.
+        :type keepAliveTimeout: float
+        """
+        super().__init__()
+        self._server = server
+        self._port = port
+        self._host = host
+        self._max_body_size = maxBodySize
+        self._keep_alive_timeout = keepAliveTimeout
+        self._loop = None
+        self._tcp_server = None
+        self._connections = 0
+
+    @property
+    def port(self) -> int:
+        """
+        Retrieves the TCP port.
+        :return: Such port.
+        :rtype: int
+        """
+        return self._port
+
+    @property
+    def connections(self) -> int:
+        """
+        Retrieves the number of open connections.
+        :return: Such number.
+        :rtype: int
+        """
+        return self._connections
+
+    @classmethod
+    def json_body(cls, data:Dict) -> bytes:
+        """
+        Encodes given data as a response body, as Flask's jsonify does.
+        :param data: The data.
+        :type data: Dict
+        :return: The body.
+        :rtype: bytes
+        """
+        return JsonCodec.instance().dumps(data, sortKeys=True) + b"\n"
+
+    async def handle_connection(self, reader:asyncio.StreamReader, writer:asyncio.StreamWriter):
+        """
+        Serves the requests of a connection, until the client closes it or stays idle too long.
+        :param reader: The stream to read requests from.
+        :type reader: asyncio.StreamReader
+        :param writer: The stream to write responses to.
+        :type writer: asyncio.StreamWriter
+        """
+        self._connections += 1
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), self._keep_alive_timeout)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line.strip():
+                    break
+                parts = request_line.decode("latin-1").split()
+                if len(parts) != 3:
+                    await self.respond(writer, 400, self.json_body({"error": "Invalid request line"}), False)
+                    break
+                method, target, version = parts
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, separator, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                connection = headers.get('connection', "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+                if 'transfer-encoding' in headers:
+                    await self.respond(writer, 411, self.json_body({"error": "A Content-Length is required"}), False)
+                    break
+                length = int(headers.get('content-length', 0) or 0)
+                if length > self._max_body_size:
+                    await self.respond(writer, 413, self.json_body({"error": "The request body is too large"}), False)
+                    break
+                body = await reader.readexactly(length) if length > 0 else b""
+                status_code, extra_headers, response_body = await self.dispatch(method, target, headers, body)
+                await self.respond(writer, status_code, response_body, keep_alive, extra_headers)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError, asyncio.LimitOverrunError):
+            pass
+        except asyncio.CancelledError:
+            # the server is stopping
+            pass
+        finally:
+            self._connections -= 1
+            writer.close()
+
+    async def respond(self, writer:asyncio.StreamWriter, statusCode:int, body:bytes, keepAlive:bool, headers:Dict[str, str]=None):
+        """
+        Writes a response.
+        :param writer: The stream to write to.
+        :type writer: asyncio.StreamWriter
+        :param statusCode: The HTTP status code.
+        :type statusCode: int
+        :param body: The body, JSON unless the headers say otherwise.
+        :type body: bytes
+        :param keepAlive: Whether the connection stays open.
+        :type keepAlive: bool
+        :param headers: Any other header.
+        :type headers: Dict[str, str]
+        """
+        lines = [ f"HTTP/1.1 {statusCode} {HTTPStatus(statusCode).phrase}" ]
+        if body and not (headers and "Content-Type" in headers):
+            lines.append("Content-Type: application/json")
+        lines.append(f"Content-Length: {len(body)}")
+        lines.append("Connection: keep-alive" if keepAlive else "Connection: close")
+        for name, value in (headers or {}).items():
+            lines.append(f"{name}: {value}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def dispatch(self, method:str, target:str, headers:Dict[str, str], body:bytes) -> Tuple[int, Dict[str, str], bytes]:
+        """
+        Routes a request to its endpoint.
+        :param method: The HTTP method.
+        :type method: str
+        :param target: The request target, with the query string.
+        :type target: str
+        :param headers: The request headers, with lowercase names.
+        :type headers: Dict[str, str]
+        :param body: The request body.
+        :type body: bytes
+        :return: The status code, any extra header, and the response body.
+        :rtype: Tuple[int, Dict[str, str], bytes]
+        """
+        url = urlsplit(target)
+        segments = url.path.strip("/").split("/")
+        if method == "PUT" and len(segments) == 3 and segments[0] == "v1" and segments[2] == "measure":
+            route = "/v1/<sensorId>/measure"
+        elif method == "POST" and segments == [ "v1", "measures" ]:
+            route = "/v1/measures"
+        elif method == "GET" and len(segments) == 3 and segments[0] == "v1" and segments[2] == "measures":
+            route = "/v1/<sensorId>/measures"
+        elif method == "GET" and len(segments) == 3 and segments[0] == "v1" and segments[2] == "rollups":
+            route = "/v1/<sensorId>/rollups"
+        elif method == "GET" and segments == [ "v1", "status" ]:
+            route = "/v1/status"
+        elif method == "GET" and segments == [ "metrics" ]:
+            route = "/metrics"
+        else:
+            return 404, {}, self.json_body({"error": "Not found"})
+
+        started = time.perf_counter()
+        try:
+            if route == "/v1/<sensorId>/measure":
+                result = self.measure_endpoint(unquote(segments[1]), headers, body)
+            elif route == "/v1/measures":
+                result = self.measures_endpoint(headers, body)
+            elif route == "/v1/<sensorId>/measures":
+                result = await self.query_endpoint(unquote(segments[1]), parse_qs(url.query, keep_blank_values=True))
+            elif route == "/v1/<sensorId>/rollups":
+                result = await self.rollups_endpoint(unquote(segments[1]), parse_qs(url.query, keep_blank_values=True))
+            elif route == "/v1/status":
+                result = await self.status_endpoint(parse_qs(url.query, keep_blank_values=True), headers)
+            else:
+                result = 200, { "Content-Type": Metrics.CONTENT_TYPE }, Metrics.instance().render().encode("utf-8")
+        except OSError:
+            result = 503, {}, self.json_body({"error": "The storage is not available"})
+        except Exception as error:
+            logging.getLogger("a2sensor").error(f"Cannot serve {method} {url.path}: {error}")
+            result = 500, {}, self.json_body({"error": "Internal error"})
+        labels = (("method", method), ("route", route), ("code", str(result[0])))
+        Metrics.instance().observe("a2sensor_http_request_seconds", time.perf_counter() - started, labels)
+        return result
+
+    @classmethod
+    def mimetype(cls, headers:Dict[str, str]) -> str:
+        """
+        Retrieves the media type of the request body.
+        :param headers: The request headers.
+        :type headers: Dict[str, str]
+        :return: The media type, without parameters, in lowercase.
+        :rtype: str
+        """
+        return headers.get('content-type', "").split(";")[0].strip().lower()
+
+    @classmethod
+    def is_json(cls, headers:Dict[str, str]) -> bool:
+        """
+        Checks whether the request body is JSON, as Flask's request.is_json does.
+        :param headers: The request headers.
+        :type headers: Dict[str, str]
+        :return: True in such case.
+        :rtype: bool
+        """
+        mimetype = cls.mimetype(headers)
+        return mimetype == "application/json" or (mimetype.startswith("application/") and mimetype.endswith("+json"))
+
+    def measure_endpoint(self, sensorId:str, headers:Dict[str, str], body:bytes) -> Tuple[int, Dict[str, str], bytes]:
+        """
+        Collects a new measure from given sensor, as PUT /v1/<sensorId>/measure in the Flask app.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :param headers: The request headers.
+        :type headers: Dict[str, str]
+        :param body: The request body.
+        :type body: bytes
+        :return: The status code, any extra header, and the response body.
+        :rtype: Tuple[int, Dict[str, str], bytes]
+        """
+        try:
+            data = MeasureValidator.parse_measure(body) if self.is_json(headers) else None
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            MeasureValidator.count_failure("invalid_json")
+            return 400, {}, self.json_body({"error": "Invalid JSON format"})
+
+        result = {}
+        sensorName = data.get('sensorName', None)
+        sensorStatus = data.get('sensorStatus', None)
+        messages = MeasureValidator.validate_sensor_id(sensorId) + MeasureValidator.validate(sensorName, sensorStatus)
+        if messages:
+            status_code = 400
+            result["status"] = "invalid request"
+            result["messages"] = messages
+        else:
+            status_code = 200
+            result["status"] = "success"
+            self._server.save_to_file(sensorId, sensorName, sensorStatus)
+
+        return status_code, {}, self.json_body(result)
+
+    def measures_endpoint(self, headers:Dict[str, str], body:bytes) -> Tuple[int, Dict[str, str], bytes]:
+        """
+        Collects a batch of measures, as POST /v1/measures in the Flask app.
+        :param headers: The request headers.
+        :type headers: Dict[str, str]
+        :param body: The request body.
+        :type body: bytes
+        :return: The status code, any extra header, and the response body.
+        :rtype: Tuple[int, Dict[str, str], bytes]
+        """
+        status_code, error, body = MeasureValidator.decode_body(body, headers.get('content-encoding', None), self._max_body_size)
+        if error:
+            return status_code, {}, self.json_body({"error": error})
+
+        codec = JsonCodec.instance()
+        if self.mimetype(headers) == "application/x-ndjson":
+            try:
+                items = [ codec.loads(line) for line in body.splitlines() if line.strip() ]
+            except ValueError:
+                MeasureValidator.count_failure("invalid_json")
+                return 400, {}, self.json_body({"error": "Invalid NDJSON format"})
+        elif self.is_json(headers):
+            try:
+                items = codec.loads(body)
+            except ValueError:
+                items = None
+            if not isinstance(items, list):
+                MeasureValidator.count_failure("invalid_json")
+                return 400, {}, self.json_body({"error": "Invalid JSON format: expected an array of measures"})
+        else:
+            MeasureValidator.count_failure("invalid_json")
+            return 400, {}, self.json_body({"error": "Invalid JSON format"})
+
+        status_code, result, measures = MeasureValidator.validate_batch(items)
+        if measures:
+            self._server.save_all(measures)
+
+        return status_code, {}, self.json_body(result)
+
+    async def query_endpoint(self, sensorId:str, query:Dict) -> Tuple[int, Dict[str, str], bytes]:
+        """
+        Retrieves the stored measures of given sensor as NDJSON, as GET /v1/<sensorId>/measures in the Flask app.
+        The storage is read in a thread, not in the event loop.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :param query: The query parameters.
+        :type query: Dict
+        :return: The status code, any extra header, and the response body.
+        :rtype: Tuple[int, Dict[str, str], bytes]
+        """
+        try:
+            start = Measure.parse_epoch(query['from'][0]) if 'from' in query else None
+            end = Measure.parse_epoch(query['to'][0]) if 'to' in query else None
+        except (ValueError, OverflowError):
+            return 400, {}, self.json_body({"error": "Invalid 'from' or 'to' parameter: must be seconds since the epoch or an ISO 8601 date"})
+
+        server = self._server
+        codec = JsonLinesCodec(server.storage.date_format)
+        body = await asyncio.get_running_loop().run_in_executor(None, lambda: b"".join(codec.encode(measure) for measure in server.query(sensorId, start, end)))
+        return 200, { "Content-Type": "application/x-ndjson" }, body
+
+    async def rollups_endpoint(self, sensorId:str, query:Dict) -> Tuple[int, Dict[str, str], bytes]:
+        """
+        Retrieves the aggregates of given sensor as NDJSON, as GET /v1/<sensorId>/rollups in the Flask app.
+        The rollups are read in a thread, not in the event loop.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :param query: The query parameters.
+        :type query: Dict
+        :return: The status code, any extra header, and the response body.
+        :rtype: Tuple[int, Dict[str, str], bytes]
+        """
+        rollups = self._server.rollups
+        if rollups is None:
+            return 404, {}, self.json_body({"error": "Rollups are disabled"})
+        try:
+            start = Measure.parse_epoch(query['from'][0]) if 'from' in query else None
+            end = Measure.parse_epoch(query['to'][0]) if 'to' in query else None
+            points = int(query.get('points', [ 1000 ])[0])
+        except (ValueError, OverflowError):
+            return 400, {}, self.json_body({"error": "Invalid 'from', 'to' or 'points' parameter"})
+
+        body = await asyncio.get_running_loop().run_in_executor(None, lambda: "".join(json.dumps(row, separators=(",", ":")) + "\n" for row in rollups.query(sensorId, start, end, points)).encode("utf-8"))
+        return 200, { "Content-Type": "application/x-ndjson" }, body
+
+    async def status_endpoint(self, query:Dict, headers:Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+        """
+        Retrieves the current status of every sensor, as GET /v1/status in the Flask app,
+        except for Server-Sent Events. Long-polls wait in the event loop, without holding any thread.
+        :param query: The query parameters.
+        :type query: Dict
+        :param headers: The request headers.
+        :type headers: Dict[str, str]
+        :return: The status code, any extra header, and the response body.
+        :rtype: Tuple[int, Dict[str, str], bytes]
+        """
+        cache = self._server.status_cache
+        known = None
+        if 'if-none-match' in headers:
+            known = next((version for version in (cache.version_of(tag) for tag in headers['if-none-match'].split(",")) if version is not None), None)
+        if known is not None and known == cache.version:
+            try:
+                wait = float(query.get('wait', [ 0 ])[0])
+            except ValueError:
+                wait = math.nan
+            if not math.isfinite(wait):
+                return 400, {}, self.json_body({"error": "Invalid 'wait' parameter: must be a number of seconds"})
+            wait = min(wait, 300)
+            if wait <= 0 or not await cache.wait_for_change_async(known, wait):
+                return 304, { "ETag": cache.etag_of(known) }, b""
+
+        version, sensors = cache.snapshot()
+        return 200, { "ETag": cache.etag_of(version) }, self.json_body({"version": version, "sensors": sensors})
+
+    async def serve(self):
+        """
+        Listens and serves connections until stop() is called.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._tcp_server = await asyncio.start_server(self.handle_connection, self._host, self._port, backlog=1024)
+        logging.getLogger("a2sensor").info(f"Serving HTTP on {self._host}:{self._port}")
+        async with self._tcp_server:
+            try:
+                await self._tcp_server.serve_forever()
+            except asyncio.CancelledError:
+                pass
+
+    def run(self):
+        """
+        Runs the event loop in the current thread, until stop() is called.
+        """
+        asyncio.run(self.serve())
+
+    def start(self) -> threading.Thread:
+        """
+        Runs the event loop in a background thread.
+        :return: The thread.
+        :rtype: threading.Thread
+        """
+        thread = threading.Thread(target=self.run, name="http-server", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        """
+        Stops listening, from any thread.
+        """
+        if self._loop is not None and self._tcp_server is not None:
+            self._loop.call_soon_threadsafe(self._tcp_server.close)
@@ -0,0 +1,245 @@
+"""
+a2sensor/sensor_collect/binary_codec.py
+
+This script defines the BinaryCodec class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from .measure import Measure
+import mmap
+import os
+from .sensor_dictionary import SensorDictionary
+import struct
+from typing import Dict, Iterable, Iterator
+
+class BinaryCodec():
+    """
+    Encodes measures as fixed-width binary records.
+
+    Each record takes 15 bytes, little-endian: the epoch in microseconds (int64), the number of
+    readings it stands for (uint32), the sensor index (uint16) and the status code (uint8, the
+    index in Measure.STATUSES). Sensor ids and names live in a SensorDictionary sidecar.
+
+    Class name: BinaryCodec
+
+    Responsibilities:
+        - Encode measures as binary records.
+        - Decode binary buffers, without copying them, optionally within a time range.
+        - Convert from and to the stored JSON layout.
+
+    Collaborators:
+        - a2sensor.sensor_collect.Measure
+        - a2sensor.sensor_collect.SensorDictionary
+    """
+
+    EXTENSION = ".bin"
+    RECORD = struct.Struct("<qIHB")
+    # numpy dtype equivalent to RECORD
+    DTYPE = [ ("epoch", "<i8"), ("count", "<u4"), ("sensor", "<u2"), ("status", "u1") ]
+
+    def __init__(self, dictionary:SensorDictionary):
+        """
+        Creates a new BinaryCodec instance.
+        :param dictionary: The mapping of sensor indexes to ids and names.
+        :type dictionary: a2sensor.sensor_collect.SensorDictionary
+        """
+        super().__init__()
+        self._dictionary = dictionary
+
+    @property
+    def dictionary(self) -> SensorDictionary:
+        """
+        Retrieves the mapping of sensor indexes to ids and names.
+        :return: Such dictionary.
+        :rtype: a2sensor.sensor_collect.SensorDictionary
+        """
+        return self._dictionary
+
+    @property
+    def extension(self) -> str:
+        """
+        Retrieves the extension of the segment files.
+        :return: Such extension.
+        :rtype: str
+        """
+        return self.__class__.EXTENSION
+
+    def encode(self, measure:Measure) -> bytes:
+        """
+        Encodes given measure as a binary record.
+        :param measure: The measure.
+        :type measure: a2sensor.sensor_collect.Measure
+        :return: The record.
+        :rtype: bytes
+        """
+        return self.__class__.RECORD.pack(
+            measure.epoch,
+            measure.count,
+            self._dictionary.index_of(measure.sensor_id, measure.sensor_name),
+            Measure.STATUS_CODES[measure.status])
+
+    def encode_all(self, measures:Iterable[Measure]) -> bytes:
+        """
+        Encodes given measures.
+        :param measures: The measures.
+        :type measures: Iterable[a2sensor.sensor_collect.Measure]
+        :return: The records.
+        :rtype: bytes
+        """
+        return b"".join(self.encode(measure) for measure in measures)
+
+    def decode(self, buffer) -> Iterator[Measure]:
+        """
+        Decodes the complete records in given buffer, without copying it.
+        :param buffer: Any object supporting the buffer protocol.
+        :type buffer: bytes
+        :return: The measures.
+        :rtype: Iterator[a2sensor.sensor_collect.Measure]
+        """
+        statuses = Measure.STATUSES
+        lookup = self._dictionary.lookup
+        for epoch, count, index, code in self.__class__.RECORD.iter_unpack(self.complete(buffer)):
+            sensor_id, name = lookup(index)
+            yield Measure(sensor_id, name, statuses[code], epoch, count)
+
+    def complete(self, buffer) -> memoryview:
+        """
+        Retrieves a view of the complete records of given buffer, ignoring a truncated tail.
+        :param buffer: Any object supporting the buffer protocol.
+        :type buffer: bytes
+        :return: The view.
+        :rtype: memoryview
+        """
+        view = memoryview(buffer).cast("B")
+        return view[:len(view) - len(view) % self.__class__.RECORD.size]
+
+    def columns(self, buffer):
+        """
+        Retrieves the records of given buffer as a numpy structured array sharing its memory,
+        with epoch, count, sensor and status fields. Requires numpy.
+        :param buffer: Any object supporting the buffer protocol.
+        :type buffer: bytes
+        :return: The records.
+        :rtype: numpy.ndarray
+        """
+        import numpy
+        return numpy.frombuffer(self.complete(buffer), dtype=numpy.dtype(self.__class__.DTYPE))
+
+    def read(self, path:str) -> Iterator[Measure]:
+        """
+        Reads the measures of given segment file, mapping it in memory.
+        :param path: The path of the segment.
+        :type path: str
+        :return: The measures.
+        :rtype: Iterator[a2sensor.sensor_collect.Measure]
+        """
+        if os.path.getsize(path) < self.__class__.RECORD.size:
+            return
+        with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            measures = self.decode(mapped)
+            try:
+                yield from measures
+            finally:
+                # release the views on the mapping before it gets closed
+                measures.close()
+
+    def last_epoch(self, path:str) -> int:
+        """
+        Retrieves the epoch of the last complete record of given segment file.
+        :param path: The path of the segment.
+        :type path: str
+        :return: The epoch, or None if there are no records.
+        :rtype: int
+        """
+        size = self.__class__.RECORD.size
+        complete = os.path.getsize(path) // size * size
+        if complete == 0:
+            return None
+        with open(path, 'rb') as file:
+            file.seek(complete - size)
+            return struct.unpack_from("<q", file.read(size))[0]
+
+    def query(self, path:str, start:int=None, end:int=None) -> Iterator[Measure]:
+        """
+        Reads the measures of given segment file within a time range.
+        Records have a fixed width, so the first one is found with a binary search on the mapped file.
+        :param path: The path of the segment.
+        :type path: str
+        :param start: The first time to include, in microseconds since the epoch. Optional.
+        :type start: int
+        :param end: The first time to exclude, in microseconds since the epoch. Optional.
+        :type end: int
+        :return: The measures.
+        :rtype: Iterator[a2sensor.sensor_collect.Measure]
+        """
+        size = self.__class__.RECORD.size
+        if os.path.getsize(path) < size:
+            return
+        with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            low = 0
+            if start is not None:
+                high = len(mapped) // size
+                while low < high:
+                    middle = (low + high) // 2
+                    if struct.unpack_from("<q", mapped, middle * size)[0] < start:
+                        low = middle + 1
+                    else:
+                        high = middle
+            view = memoryview(mapped)
+            measures = self.decode(view[low * size:])
+            try:
+                for measure in measures:
+                    if end is not None and measure.epoch >= end:
+                        break
+                    yield measure
+            finally:
+                # release the views on the mapping before it gets closed
+                measures.close()
+                view.release()
+
+    def forget(self, path:str):
+        """
+        Drops any cached information about given segment file.
+        :param path: The path of the segment.
+        :type path: str
+        """
+        pass
+
+    def to_json_layout(self, buffer, dateFormat:str) -> Iterator[Dict]:
+        """
+        Converts binary records to the stored JSON layout.
+        :param buffer: Any object supporting the buffer protocol.
+        :type buffer: bytes
+        :param dateFormat: The format of the timestamps.
+        :type dateFormat: str
+        :return: The JSON-compatible dictionaries, each one including its epoch.
+        :rtype: Iterator[Dict]
+        """
+        for measure in self.decode(buffer):
+            data = measure.to_dict(dateFormat)
+            data['value']['epoch'] = measure.epoch
+            yield data
+
+    def from_json_layout(self, records:Iterable[Dict]) -> bytes:
+        """
+        Converts records in the stored JSON layout to binary records.
+        Records without an epoch, such as the legacy one-file-per-measure ones, should be read through JsonFileStorage instead.
+        :param records: The JSON-compatible dictionaries, each one including its epoch.
+        :type records: Iterable[Dict]
+        :return: The binary records.
+        :rtype: bytes
+        """
+        return self.encode_all(Measure.from_dict(record) for record in records)
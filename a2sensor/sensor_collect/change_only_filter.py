@@ -0,0 +1,144 @@
+"""
+a2sensor/sensor_collect/change_only_filter.py
+
+This script defines the ChangeOnlyFilter class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from .measure import Measure
+import threading
+from typing import Iterable, Iterator, List
+
+class ChangeOnlyFilter():
+    """
+    Reduces a stream of measures to status transitions plus periodic heartbeats.
+
+    Each emitted measure stands for `count` consecutive readings with the same status, the first of which
+    happened at its epoch. The first reading of a new status is emitted right away; the readings that
+    follow are accumulated, and emitted as one run-length record when the status changes, when the
+    heartbeat expires, or when the filter is flushed.
+
+    Class name: ChangeOnlyFilter
+
+    Responsibilities:
+        - Decide which measures need to be persisted.
+        - Rebuild the full series of readings from the persisted ones.
+
+    Collaborators:
+        - a2sensor.sensor_collect.Measure
+    """
+
+    def __init__(self, heartbeat:float=300.0):
+        """
+        Creates a new ChangeOnlyFilter instance.
+        :param heartbeat: The seconds after which a keep-alive record is emitted even if the status didn't change.
+        :type heartbeat: float
+        """
+        super().__init__()
+        self._heartbeat = int(heartbeat * 1000000)
+        # sensorId -> [ status, name, epoch of the last record, epoch of the first pending reading, pending readings ]
+        self._runs = {}
+        self._lock = threading.Lock()
+
+    @property
+    def heartbeat(self) -> int:
+        """
+        Retrieves the microseconds after which a keep-alive record is emitted.
+        :return: Such interval.
+        :rtype: int
+        """
+        return self._heartbeat
+
+    def filter(self, measure:Measure) -> List[Measure]:
+        """
+        Processes given reading.
+        :param measure: The reading.
+        :type measure: a2sensor.sensor_collect.Measure
+        :return: The measures to persist, if any.
+        :rtype: List[a2sensor.sensor_collect.Measure]
+        """
+        result = []
+        with self._lock:
+            run = self._runs.get(measure.sensor_id, None)
+            if run is None or run[0] != measure.status:
+                if run is not None and run[4] > 0:
+                    result.append(Measure(measure.sensor_id, run[1], run[0], run[3], run[4]))
+                result.append(measure)
+                self._runs[measure.sensor_id] = [ measure.status, measure.sensor_name, measure.epoch, None, 0 ]
+            else:
+                if run[4] == 0:
+                    run[3] = measure.epoch
+                run[4] += measure.count
+                if measure.epoch - run[2] >= self._heartbeat:
+                    result.append(Measure(measure.sensor_id, run[1], run[0], run[3], run[4]))
+                    run[2] = measure.epoch
+                    run[3] = None
+                    run[4] = 0
+        return result
+
+    def flush(self) -> List[Measure]:
+        """
+        Emits the readings accumulated since the last record of each sensor.
+        :return: The measures to persist.
+        :rtype: List[a2sensor.sensor_collect.Measure]
+        """
+        result = []
+        with self._lock:
+            for sensorId, run in self._runs.items():
+                if run[4] > 0:
+                    result.append(Measure(sensorId, run[1], run[0], run[3], run[4]))
+                    run[3] = None
+                    run[4] = 0
+        return result
+
+    @classmethod
+    def expand(cls, measures:Iterable[Measure], interval:float=None) -> Iterator[Measure]:
+        """
+        Rebuilds the individual readings of a sensor from its run-length records.
+        The readings of a record are spread evenly until the next record.
+        :param measures: The records of a single sensor, oldest first.
+        :type measures: Iterable[a2sensor.sensor_collect.Measure]
+        :param interval: The seconds between readings, used for the last record. Defaults to the spacing of the previous record.
+        :type interval: float
+        :return: The readings.
+        :rtype: Iterator[a2sensor.sensor_collect.Measure]
+        """
+        step = int(interval * 1000000) if interval is not None else 0
+        previous = None
+        for measure in measures:
+            if previous is not None:
+                step = (measure.epoch - previous.epoch) // previous.count
+                yield from cls._expand_record(previous, step)
+            previous = measure
+        if previous is not None:
+            yield from cls._expand_record(previous, step)
+
+    @classmethod
+    def _expand_record(cls, measure:Measure, step:int) -> Iterator[Measure]:
+        """
+        Rebuilds the readings of a single run-length record.
+        :param measure: The record.
+        :type measure: a2sensor.sensor_collect.Measure
+        :param step: The microseconds between readings.
+        :type step: int
+        :return: The readings.
+        :rtype: Iterator[a2sensor.sensor_collect.Measure]
+        """
+        if measure.count == 1:
+            yield measure
+        else:
+            for index in range(measure.count):
+                yield Measure(measure.sensor_id, measure.sensor_name, measure.status, measure.epoch + index * step)
@@ -0,0 +1,321 @@
+"""
+a2sensor/sensor_collect/columnar_export.py
+
+This script defines the ColumnarExport class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from array import array
+import json
+import mmap
+from .measure import Measure
+import os
+import sys
+from typing import Dict, List
+
+class ColumnarExport():
+    """
+    Exports the history of each sensor as memory-mappable columns, for analytics.
+
+    Each sensor gets a folder with one raw little-endian file per column: epoch.i8 (int64
+    microseconds since the epoch), status.u1 (uint8, the index in Measure.STATUSES) and
+    count.u4 (uint32, the readings each row stands for), plus meta.json with the number of
+    rows, the last epoch exported and the sensor name. Exports are incremental: only the
+    measures after the last epoch exported are appended, and meta.json is replaced once the
+    columns are synced, so an interrupted export is rolled back to the previous one on the
+    next run. Measures stored later with an older epoch are only picked up by a full export.
+    The columns are read back as typed views of the mapped files, as numpy arrays, or as an
+    Arrow table, which can also be written as Parquet or Arrow IPC.
+
+    Class name: ColumnarExport
+
+    Responsibilities:
+        - Append the new measures of each sensor to its columns.
+        - Map the columns in memory, without copying them.
+        - Convert them to Arrow, Parquet and Arrow IPC.
+
+    Collaborators:
+        - a2sensor.sensor_collect.MeasureStorage
+    """
+
+    # name, file extension, array typecode, numpy dtype
+    COLUMNS = [ ("epoch", "i8", "q", "<i8"), ("status", "u1", "B", "u1"), ("count", "u4", "I", "<u4") ]
+    FORMATS = [ "parquet", "arrow" ]
+
+    def __init__(self, storage, folder:str=None, batchSize:int=65536):
+        """
+        Creates a new ColumnarExport instance.
+        :param storage: The storage to export from.
+        :type storage: a2sensor.sensor_collect.MeasureStorage
+        :param folder: The folder of the columns. Defaults to <storage folder>/.columns.
+        :type folder: str
+        :param batchSize: The most rows appended at once.
+        :type batchSize: int
+        """
+        super().__init__()
+        self._storage = storage
+        self._folder = folder if folder is not None else os.path.join(storage.folder, ".columns")
+        self._batch_size = batchSize
+
+    @property
+    def folder(self) -> str:
+        """
+        Retrieves the folder of the columns.
+        :return: Such folder.
+        :rtype: str
+        """
+        return self._folder
+
+    def column_file(self, sensorId:str, column:str) -> str:
+        """
+        Retrieves the path of a column of given sensor.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :param column: The column: "epoch", "status" or "count".
+        :type column: str
+        :return: The path.
+        :rtype: str
+        """
+        extension = next(extension for name, extension, typecode, dtype in self.__class__.COLUMNS if name == column)
+        return os.path.join(self._folder, sensorId, f"{column}.{extension}")
+
+    def sensor_ids(self) -> List[str]:
+        """
+        Retrieves the ids of the exported sensors.
+        :return: Such ids.
+        :rtype: List[str]
+        """
+        if not os.path.isdir(self._folder):
+            return []
+        return sorted(entry.name for entry in os.scandir(self._folder) if os.path.exists(os.path.join(entry.path, "meta.json")))
+
+    def metadata(self, sensorId:str) -> Dict:
+        """
+        Retrieves what has been exported of given sensor.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :return: The "rows", the "last_epoch" (None if there are none), the rows with that epoch ("tail"), the sensor "name" and the "statuses" the codes stand for.
+        :rtype: Dict
+        """
+        path = os.path.join(self._folder, sensorId, "meta.json")
+        if not os.path.exists(path):
+            return self.__class__.empty_metadata()
+        with open(path, 'r') as file:
+            return json.load(file)
+
+    @classmethod
+    def empty_metadata(cls) -> Dict:
+        """
+        Builds the metadata of a sensor not exported yet.
+        :return: Such metadata.
+        :rtype: Dict
+        """
+        return { "rows": 0, "last_epoch": None, "tail": 0, "name": None, "statuses": Measure.STATUSES }
+
+    def export(self, sensorIds:List[str]=None, full:bool=False) -> Dict[str, int]:
+        """
+        Appends the new measures of given sensors to their columns.
+        :param sensorIds: The ids of the sensors. Defaults to all of them.
+        :type sensorIds: List[str]
+        :param full: Whether to export everything again, instead of the new measures only.
+        :type full: bool
+        :return: The rows appended, by sensor id.
+        :rtype: Dict[str, int]
+        """
+        return { sensor_id: self.export_sensor(sensor_id, full) for sensor_id in (sensorIds if sensorIds is not None else self._storage.sensor_ids()) }
+
+    def export_sensor(self, sensorId:str, full:bool=False) -> int:
+        """
+        Appends the new measures of given sensor to its columns.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :param full: Whether to export everything again, instead of the new measures only.
+        :type full: bool
+        :return: The rows appended.
+        :rtype: int
+        """
+        meta = self.metadata(sensorId) if not full else self.__class__.empty_metadata()
+        os.makedirs(os.path.join(self._folder, sensorId), exist_ok=True)
+        files = []
+        try:
+            for name, extension, typecode, dtype in self.__class__.COLUMNS:
+                path = self.column_file(sensorId, name)
+                file = open(path, 'r+b' if os.path.exists(path) else 'w+b')
+                files.append(file)
+                # drop whatever an interrupted export appended
+                file.truncate(meta["rows"] * array(typecode).itemsize)
+                file.seek(0, os.SEEK_END)
+
+            exported = meta["last_epoch"]
+            # measures sharing the last epoch exported are already in, up to this many
+            skip = meta["tail"]
+            last_epoch = exported
+            appended = 0
+            batch = [ array(typecode) for name, extension, typecode, dtype in self.__class__.COLUMNS ]
+            epochs, statuses, counts = batch
+            codes = Measure.STATUS_CODES
+            for measure in self._storage.query(sensorId, exported):
+                epoch = measure.epoch
+                if epoch == exported and skip > 0:
+                    skip -= 1
+                    continue
+                epochs.append(epoch)
+                statuses.append(codes[measure.status])
+                counts.append(measure.count)
+                if last_epoch is None or epoch > last_epoch:
+                    last_epoch = epoch
+                    meta["tail"] = 1
+                elif epoch == last_epoch:
+                    meta["tail"] += 1
+                meta["name"] = measure.sensor_name
+                if len(epochs) >= self._batch_size:
+                    appended += self._write(files, batch)
+            appended += self._write(files, batch)
+
+            for file in files:
+                file.flush()
+                os.fsync(file.fileno())
+        finally:
+            for file in files:
+                file.close()
+
+        if appended or full:
+            meta["rows"] += appended
+            meta["last_epoch"] = last_epoch
+            self._save_metadata(sensorId, meta)
+        return appended
+
+    def _write(self, files:List, batch:List[array]) -> int:
+        """
+        Appends a batch of rows to the column files, and empties it.
+        :param files: The column files, in the order of COLUMNS.
+        :type files: List
+        :param batch: The values of each column.
+        :type batch: List[array.array]
+        :return: The rows written.
+        :rtype: int
+        """
+        result = len(batch[0])
+        for file, values in zip(files, batch):
+            if sys.byteorder == "big":
+                values.byteswap()
+            file.write(values.tobytes())
+            del values[:]
+        return result
+
+    def _save_metadata(self, sensorId:str, meta:Dict):
+        """
+        Writes the metadata of given sensor atomically.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :param meta: The metadata.
+        :type meta: Dict
+        """
+        path = os.path.join(self._folder, sensorId, "meta.json")
+        temporary = f"{path}.tmp"
+        with open(temporary, 'w') as file:
+            json.dump(meta, file)
+        os.replace(temporary, path)
+
+    def columns(self, sensorId:str) -> Dict[str, memoryview]:
+        """
+        Maps the columns of given sensor in memory, up to the rows of the last complete export.
+        The views keep the files mapped until they are released.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :return: A typed view of each column, by name.
+        :rtype: Dict[str, memoryview]
+        """
+        rows = self.metadata(sensorId)["rows"]
+        result = {}
+        for name, extension, typecode, dtype in self.__class__.COLUMNS:
+            size = rows * array(typecode).itemsize
+            if size == 0:
+                result[name] = memoryview(array(typecode))
+                continue
+            with open(self.column_file(sensorId, name), 'rb') as file:
+                mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(mapped)[:size]
+            if sys.byteorder == "big" and typecode != "B":
+                # the files are little-endian: this copies
+                values = array(typecode, view.tobytes())
+                values.byteswap()
+                view = memoryview(values)
+            result[name] = view.cast(typecode)
+        return result
+
+    def arrays(self, sensorId:str) -> Dict:
+        """
+        Retrieves the columns of given sensor as numpy arrays sharing the mapped memory. Requires numpy.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :return: The arrays, by name.
+        :rtype: Dict[str, numpy.ndarray]
+        """
+        import numpy
+        views = self.columns(sensorId)
+        return { name: numpy.frombuffer(views[name], dtype=numpy.dtype(dtype)) for name, extension, typecode, dtype in self.__class__.COLUMNS }
+
+    def to_arrow(self, sensorIds:List[str]=None):
+        """
+        Builds an Arrow table with the exported rows of given sensors: sensor_id, epoch (a UTC
+        timestamp in microseconds), status (dictionary-encoded) and count. The columns of each
+        sensor are a chunk sharing the mapped memory. Requires pyarrow.
+        :param sensorIds: The ids of the sensors. Defaults to all the exported ones.
+        :type sensorIds: List[str]
+        :return: The table.
+        :rtype: pyarrow.Table
+        """
+        import pyarrow
+        dictionary = pyarrow.array(Measure.STATUSES)
+        ids = pyarrow.array(sensorIds if sensorIds is not None else self.sensor_ids(), pyarrow.string())
+        chunks = { "sensor_id": [], "epoch": [], "status": [], "count": [] }
+        for index, sensor_id in enumerate(ids.to_pylist()):
+            views = self.columns(sensor_id)
+            rows = len(views["epoch"])
+            chunks["sensor_id"].append(pyarrow.DictionaryArray.from_arrays(pyarrow.repeat(pyarrow.scalar(index, pyarrow.int32()), rows), ids))
+            chunks["epoch"].append(pyarrow.Array.from_buffers(pyarrow.timestamp("us", tz="UTC"), rows, [ None, pyarrow.py_buffer(views["epoch"]) ]))
+            chunks["status"].append(pyarrow.DictionaryArray.from_arrays(pyarrow.Array.from_buffers(pyarrow.int8(), rows, [ None, pyarrow.py_buffer(views["status"]) ]), dictionary))
+            chunks["count"].append(pyarrow.Array.from_buffers(pyarrow.uint32(), rows, [ None, pyarrow.py_buffer(views["count"]) ]))
+        schema = pyarrow.schema([
+            ("sensor_id", pyarrow.dictionary(pyarrow.int32(), pyarrow.string())),
+            ("epoch", pyarrow.timestamp("us", tz="UTC")),
+            ("status", pyarrow.dictionary(pyarrow.int8(), pyarrow.string())),
+            ("count", pyarrow.uint32()),
+        ])
+        return pyarrow.Table.from_arrays([ pyarrow.chunked_array(chunks[field.name], field.type) for field in schema ], schema=schema)
+
+    def write(self, path:str, fileFormat:str="parquet", sensorIds:List[str]=None):
+        """
+        Writes the exported rows of given sensors as a single file. Requires pyarrow.
+        :param path: The path of the file.
+        :type path: str
+        :param fileFormat: Either "parquet", or "arrow" for an uncompressed Arrow IPC file, which readers can map in memory.
+        :type fileFormat: str
+        :param sensorIds: The ids of the sensors. Defaults to all the exported ones.
+        :type sensorIds: List[str]
+        """
+        if fileFormat not in self.__class__.FORMATS:
+            raise ValueError(f"Unknown export format {fileFormat}: must be one of {', '.join(self.__class__.FORMATS)}")
+        table = self.to_arrow(sensorIds)
+        temporary = f"{path}.tmp"
+        if fileFormat == "parquet":
+            import pyarrow.parquet
+            pyarrow.parquet.write_table(table, temporary)
+        else:
+            import pyarrow.feather
+            pyarrow.feather.write_feather(table, temporary, compression="uncompressed")
+        os.replace(temporary, path)
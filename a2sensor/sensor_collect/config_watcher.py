@@ -0,0 +1,121 @@
+"""
+a2sensor/sensor_collect/config_watcher.py
+
+This script defines the ConfigWatcher class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import logging
+import os
+import threading
+from typing import Callable
+
+class ConfigWatcher():
+    """
+    Watches a configuration file, polling its modification time, size and inode.
+
+    Polling keeps it portable and dependency-free; it also notices editors replacing the
+    file instead of writing it in place.
+
+    Class name: ConfigWatcher
+
+    Responsibilities:
+        - Notice changes of a file.
+        - Call back when it changes.
+
+    Collaborators:
+        - None
+    """
+
+    def __init__(self, path:str, callback:Callable[[], None], exitEvent:threading.Event, interval:float=2.0):
+        """
+        Creates a new ConfigWatcher instance.
+        :param path: The path of the file.
+        :type path: str
+        :param callback: The function to call when the file changes.
+        :type callback: Callable[[], None]
+        :param exitEvent: The event to stop watching.
+        :type exitEvent: threading.Event
+        :param interval: The seconds between checks.
+        :type interval: float
+        """
+        super().__init__()
+        self._path = path
+        self._callback = callback
+        self._exit_event = exitEvent
+        self._interval = interval
+        self._signature = self._current_signature()
+        self._thread = None
+
+    @property
+    def path(self) -> str:
+        """
+        Retrieves the path of the watched file.
+        :return: Such path.
+        :rtype: str
+        """
+        return self._path
+
+    @property
+    def interval(self) -> float:
+        """
+        Retrieves the seconds between checks.
+        :return: Such interval.
+        :rtype: float
+        """
+        return self._interval
+
+    def _current_signature(self):
+        """
+        Retrieves what identifies the current version of the file.
+        :return: Its modification time, size and inode, or None if it doesn't exist.
+        :rtype: Tuple[int, int, int]
+        """
+        try:
+            stat = os.stat(self._path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def changed(self) -> bool:
+        """
+        Checks whether the file changed since the last check. A missing file, i.e. while being replaced, is not a change.
+        :return: True in such case.
+        :rtype: bool
+        """
+        signature = self._current_signature()
+        if signature is None or signature == self._signature:
+            return False
+        self._signature = signature
+        return True
+
+    def run(self):
+        """
+        Checks the file every interval seconds, until the exit event is set.
+        """
+        while not self._exit_event.wait(self._interval):
+            if self.changed():
+                try:
+                    self._callback()
+                except Exception as error:
+                    logging.getLogger("a2sensor").error(f"Cannot reload {self._path}: {error}")
+
+    def start(self):
+        """
+        Starts watching in the background.
+        """
+        self._thread = threading.Thread(target=self.run, name="config-watcher", daemon=True)
+        self._thread.start()
@@ -0,0 +1,116 @@
+"""
+a2sensor/sensor_collect/debounced_sensor_state.py
+
+This script defines the DebouncedSensorState class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+class DebouncedSensorState():
+    """
+    Computes the status of a sensor sampled faster than it reports, over time windows.
+
+    Each sample carries its time. A change of level only counts once the new level has held
+    for the debounce time, so shorter glitches are ignored, and the run of the new level
+    starts when it first showed up. The sensor is "empty" once the level has been active for
+    the active window, "stuck" once it has been inactive for the inactive window, and "ok"
+    otherwise, as SensorState does with consecutive samples; until a window has passed since
+    the first sample, a run covering every sample is enough. The status is only returned
+    once per report interval.
+
+    Class name: DebouncedSensorState
+
+    Responsibilities:
+        - Debounce the level of a sensor.
+        - Track how long the level has held.
+        - Derive its status, at the report interval.
+
+    Collaborators:
+        - None
+    """
+
+    __slots__ = ("active_window", "inactive_window", "debounce", "report_interval", "sample_interval", "started", "level", "run_start", "changed_at", "next_report", "status")
+
+    def __init__(self, activeWindow:float, inactiveWindow:float, debounce:float, reportInterval:float, sampleInterval:float):
+        """
+        Creates a new DebouncedSensorState instance.
+        :param activeWindow: The seconds the level must be active to be considered "empty".
+        :type activeWindow: float
+        :param inactiveWindow: The seconds the level must be inactive to be considered "stuck".
+        :type inactiveWindow: float
+        :param debounce: The seconds a new level must hold to be taken into account.
+        :type debounce: float
+        :param reportInterval: The seconds between statuses returned.
+        :type reportInterval: float
+        :param sampleInterval: The seconds between samples, the time each sample stands for.
+        :type sampleInterval: float
+        """
+        super().__init__()
+        self.active_window = activeWindow
+        self.inactive_window = inactiveWindow
+        self.debounce = debounce
+        self.report_interval = reportInterval
+        self.sample_interval = sampleInterval
+        self.started = None
+        self.level = None
+        self.run_start = None
+        # when the raw level started to differ from the debounced one, if it does
+        self.changed_at = None
+        self.next_report = None
+        self.status = None
+
+    def update(self, value, now:float) -> str:
+        """
+        Processes a new sample.
+        :param value: The value read from the sensor.
+        :type value: int
+        :param now: The time of the sample, in seconds of a monotonic clock.
+        :type now: float
+        :return: The resulting status, "empty", "stuck" or "ok", if a report is due; None otherwise.
+        :rtype: str
+        """
+        level = 1 if value else 0
+        if self.started is None:
+            self.started = now
+            self.level = level
+            self.run_start = now
+            self.next_report = now
+        elif level == self.level:
+            self.changed_at = None
+        else:
+            if self.changed_at is None:
+                self.changed_at = now
+            if now - self.changed_at >= self.debounce:
+                self.level = level
+                self.run_start = self.changed_at
+                self.changed_at = None
+
+        if now < self.next_report:
+            return None
+        self.next_report += self.report_interval
+        if self.next_report <= now:
+            # fell behind a whole interval: stay on the same grid
+            self.next_report += ((now - self.next_report) // self.report_interval + 1) * self.report_interval
+
+        run = now - self.run_start + self.sample_interval
+        elapsed = now - self.started + self.sample_interval
+        if self.level and run >= min(self.active_window, elapsed):
+            self.status = "empty"
+        elif not self.level and run >= min(self.inactive_window, elapsed):
+            self.status = "stuck"
+        else:
+            self.status = "ok"
+        return self.status
@@ -0,0 +1,115 @@
+"""
+a2sensor/sensor_collect/duration_rule.py
+
+This script defines the DurationRule class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from .alert_rule import AlertRule
+from .measure import Measure
+from typing import Dict, List
+
+class DurationRule(AlertRule):
+    """
+    Fires when a sensor has been in a status, "stuck" by default, for longer than a duration.
+
+    The alert resolves with the first measure of a different status. Sensors that stop
+    reporting while in the status fire on tick(), against the wall clock.
+
+    Class name: DurationRule
+
+    Responsibilities:
+        - Track since when each sensor is in its status.
+
+    Collaborators:
+        - a2sensor.sensor_collect.RulesEngine
+    """
+
+    def __init__(self, name:str, status:str, seconds:float, sensors:List[str]=None):
+        """
+        Creates a new DurationRule instance.
+        :param name: The name of the rule.
+        :type name: str
+        :param status: The status: "stuck", "empty" or "ok".
+        :type status: str
+        :param seconds: The seconds a sensor must stay in the status.
+        :type seconds: float
+        :param sensors: The ids of the sensors the rule applies to. Defaults to all of them.
+        :type sensors: List[str]
+        """
+        super().__init__(name)
+        if status not in Measure.STATUS_CODES:
+            raise ValueError(f"Unknown status {status}: must be one of {', '.join(Measure.STATUSES)}")
+        self._status = status
+        self._duration = int(seconds * 1000000)
+        self._sensors = frozenset(sensors) if sensors is not None else None
+        # sensor id -> [ status, since, firing ]
+        self._states = {}
+        # sensor id -> since, for the sensors in the status and not firing yet
+        self._pending = {}
+
+    def update(self, measure:Measure) -> List[Dict]:
+        """
+        Processes a new measure.
+        :param measure: The measure.
+        :type measure: a2sensor.sensor_collect.Measure
+        :return: The alerts raised or resolved.
+        :rtype: List[Dict]
+        """
+        sensor_id = measure.sensor_id
+        if self._sensors is not None and sensor_id not in self._sensors:
+            return []
+        state = self._states.get(sensor_id, None)
+        result = []
+        if state is None or state[0] != measure.status:
+            if state is not None and state[2]:
+                result.append(self.alert("resolved", measure.epoch, f"{sensor_id} is {measure.status}", sensorId=sensor_id, status=self._status))
+            state = [ measure.status, measure.epoch, False ]
+            self._states[sensor_id] = state
+            if measure.status == self._status:
+                self._pending[sensor_id] = measure.epoch
+            else:
+                self._pending.pop(sensor_id, None)
+        if state[0] == self._status and not state[2] and measure.epoch - state[1] >= self._duration:
+            result.append(self.fire(sensor_id, state, measure.epoch))
+        return result
+
+    def tick(self, now:int) -> List[Dict]:
+        """
+        Fires for the sensors that have been in the status long enough, even without new measures.
+        :param now: The current time, in microseconds since the epoch.
+        :type now: int
+        :return: The alerts raised.
+        :rtype: List[Dict]
+        """
+        due = [ sensor_id for sensor_id, since in self._pending.items() if now - since >= self._duration ]
+        return [ self.fire(sensor_id, self._states[sensor_id], now) for sensor_id in due ]
+
+    def fire(self, sensorId:str, state:List, epoch:int) -> Dict:
+        """
+        Marks given sensor as firing.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :param state: Its state.
+        :type state: List
+        :param epoch: The time, in microseconds since the epoch.
+        :type epoch: int
+        :return: The alert.
+        :rtype: Dict
+        """
+        state[2] = True
+        self._pending.pop(sensorId, None)
+        return self.alert("firing", epoch, f"{sensorId} has been {self._status} for {(epoch - state[1]) / 1000000:.0f} seconds", sensorId=sensorId, status=self._status, since=state[1])
@@ -0,0 +1,76 @@
+"""
+a2sensor/sensor_collect/file_alert_sink.py
+
+This script defines the FileAlertSink class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from .alert_sink import AlertSink
+from .json_codec import JsonCodec
+import os
+from typing import Dict, List
+
+class FileAlertSink(AlertSink):
+    """
+    Appends alerts to a file, as NDJSON.
+
+    Class name: FileAlertSink
+
+    Responsibilities:
+        - Write alerts to a file.
+
+    Collaborators:
+        - a2sensor.sensor_collect.JsonCodec
+        - a2sensor.sensor_collect.RulesEngine
+    """
+
+    def __init__(self, path:str):
+        """
+        Creates a new FileAlertSink instance.
+        :param path: The path of the file.
+        :type path: str
+        """
+        super().__init__()
+        self._path = path
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._file = open(path, 'ab')
+
+    @property
+    def path(self) -> str:
+        """
+        Retrieves the path of the file.
+        :return: Such path.
+        :rtype: str
+        """
+        return self._path
+
+    def send(self, alerts:List[Dict]):
+        """
+        Appends given alerts to the file.
+        :param alerts: The alerts.
+        :type alerts: List[Dict]
+        """
+        codec = JsonCodec.instance()
+        self._file.write(b"".join(codec.dumps(alert) + b"\n" for alert in alerts))
+        self._file.flush()
+
+    def close(self):
+        """
+        Closes the file.
+        """
+        self._file.close()
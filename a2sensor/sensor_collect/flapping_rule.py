@@ -0,0 +1,115 @@
+"""
+a2sensor/sensor_collect/flapping_rule.py
+
+This script defines the FlappingRule class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from .alert_rule import AlertRule
+from collections import deque
+from .measure import Measure
+from typing import Dict, List
+
+class FlappingRule(AlertRule):
+    """
+    Fires when a sensor changes its status more than a number of times within a window.
+
+    Each sensor keeps the times of its last transitions, at most one more than the limit, so
+    the state per sensor is bounded. The alert resolves once the transitions within the
+    window are back to the limit, with a later measure or on tick().
+
+    Class name: FlappingRule
+
+    Responsibilities:
+        - Track the recent transitions of each sensor.
+
+    Collaborators:
+        - a2sensor.sensor_collect.RulesEngine
+    """
+
+    def __init__(self, name:str, transitions:int=5, seconds:float=300, sensors:List[str]=None):
+        """
+        Creates a new FlappingRule instance.
+        :param name: The name of the rule.
+        :type name: str
+        :param transitions: The most transitions within the window without firing.
+        :type transitions: int
+        :param seconds: The seconds of the window.
+        :type seconds: float
+        :param sensors: The ids of the sensors the rule applies to. Defaults to all of them.
+        :type sensors: List[str]
+        """
+        super().__init__(name)
+        self._transitions = transitions
+        self._window = int(seconds * 1000000)
+        self._sensors = frozenset(sensors) if sensors is not None else None
+        # sensor id -> [ status, times of the last transitions ]
+        self._states = {}
+        self._firing = set()
+
+    def update(self, measure:Measure) -> List[Dict]:
+        """
+        Processes a new measure.
+        :param measure: The measure.
+        :type measure: a2sensor.sensor_collect.Measure
+        :return: The alerts raised or resolved.
+        :rtype: List[Dict]
+        """
+        sensor_id = measure.sensor_id
+        if self._sensors is not None and sensor_id not in self._sensors:
+            return []
+        state = self._states.get(sensor_id, None)
+        if state is None:
+            self._states[sensor_id] = [ measure.status, deque(maxlen=self._transitions + 1) ]
+            return []
+        times = state[1]
+        if state[0] != measure.status:
+            state[0] = measure.status
+            times.append(measure.epoch)
+        return self.check(sensor_id, times, measure.epoch)
+
+    def tick(self, now:int) -> List[Dict]:
+        """
+        Resolves the alerts of the sensors that calmed down, even without new measures.
+        :param now: The current time, in microseconds since the epoch.
+        :type now: int
+        :return: The alerts resolved.
+        :rtype: List[Dict]
+        """
+        return [ alert for sensor_id in list(self._firing) for alert in self.check(sensor_id, self._states[sensor_id][1], now) ]
+
+    def check(self, sensorId:str, times:deque, epoch:int) -> List[Dict]:
+        """
+        Drops the transitions out of the window, and fires or resolves accordingly.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :param times: The times of its last transitions.
+        :type times: collections.deque
+        :param epoch: The current time, in microseconds since the epoch.
+        :type epoch: int
+        :return: The alert raised or resolved, if any.
+        :rtype: List[Dict]
+        """
+        while times and epoch - times[0] > self._window:
+            times.popleft()
+        count = len(times)
+        if count > self._transitions and sensorId not in self._firing:
+            self._firing.add(sensorId)
+            return [ self.alert("firing", epoch, f"{sensorId} changed its status {count} times in {self._window / 1000000:.0f} seconds", sensorId=sensorId, transitions=count) ]
+        if count <= self._transitions and sensorId in self._firing:
+            self._firing.discard(sensorId)
+            return [ self.alert("resolved", epoch, f"{sensorId} changed its status {count} times in {self._window / 1000000:.0f} seconds", sensorId=sensorId, transitions=count) ]
+        return []
@@ -18,11 +18,56 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
-from flask import Flask, request, jsonify
+import atexit
+from flask import Flask, g, request, Response, stream_with_context
+import json
+from .json_codec import JsonCodec
+from .json_lines_codec import JsonLinesCodec
+from .logging_config import LoggingConfig
+import math
+from .measure import Measure
+from .measure_validator import MeasureValidator
+from .metrics import Metrics
 import os
+from .server import Server
+import sys
+import time
 
 app = Flask(__name__)
 
+@app.before_request
+def start_timer():
+    """
+    Remembers when the request started.
+    """
+    g.started = time.perf_counter()
+
+@app.after_request
+def observe_request(response):
+    """
+    Observes the duration of the request, by method, route and status code.
+    :param response: The response.
+    :type response: flask.Response
+    :return: The same response.
+    :rtype: flask.Response
+    """
+    if request.url_rule is not None and 'started' in g:
+        labels = (("method", request.method), ("route", request.url_rule.rule), ("code", str(response.status_code)))
+        Metrics.instance().observe("a2sensor_http_request_seconds", time.perf_counter() - g.started, labels)
+    return response
+
+def json_response(data, status_code:int=200) -> Response:
+    """
+    Encodes given data as a JSON response, with the JSON codec of the process, as jsonify does.
+    :param data: The data.
+    :type data: Any
+    :param status_code: The status code.
+    :type status_code: int
+    :return: The response.
+    :rtype: flask.Response
+    """
+    return Response(JsonCodec.instance().dumps(data, sortKeys=True) + b"\n", status=status_code, mimetype="application/json")
+
 @app.route("/v1/<sensorId>/measure", methods=["PUT"])
 def measure_endpoint(sensorId: str):
     """
@@ -30,33 +75,181 @@ def measure_endpoint(sensorId: str):
     :param sensorId: The id of the sensor.
     :type sensorId: str
     """
-    if not request.is_json:
-        return jsonify({"error": "Invalid JSON format"}), 400
+    try:
+        data = MeasureValidator.parse_measure(request.get_data()) if request.is_json else None
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        MeasureValidator.count_failure("invalid_json")
+        return json_response({"error": "Invalid JSON format"}, 400)
 
-    data = request.get_json()
-
-    from .server import Server
     result = {}
     sensorName = data.get('sensorName', None)
     sensorStatus = data.get('sensorStatus', None)
-    if sensorName is None or sensorStatus is None or sensorStatus not in [ "empty", "ok", "stuck" ]:
+    messages = MeasureValidator.validate_sensor_id(sensorId) + MeasureValidator.validate(sensorName, sensorStatus)
+    if messages:
         status_code = 400
         result["status"] = "invalid request"
-        messages = []
-        if sensorName is None:
-            messages.append("Missing 'sensorName' attribute")
-        if sensorStatus is None:
-            messages.append("Missing 'sensorStatus' attribute")
-        elif sensorStatus not in [ "empty", "ok", "stuck" ]:
-            messages.append(f"Provided 'sensorStatus' is {sensorStatus} and must be one of 'empty', 'ok' or 'stuck'")
         result["messages"] = messages
 
     else:
         status_code = 200
         result["status"] = "success"
-        Server.instance().save_to_file(sensorId, sensorName, sensorStatus)
+        try:
+            Server.instance().save_to_file(sensorId, sensorName, sensorStatus)
+        except OSError:
+            return json_response({"error": "The storage is not available"}, 503)
+
+    return json_response(result, status_code)
+
+@app.route("/v1/measures", methods=["POST"])
+def measures_endpoint():
+    """
+    Collects a batch of measures, from any number of sensors.
+    The body is either a JSON array, or NDJSON (application/x-ndjson), of objects with
+    sensorId, sensorName, sensorStatus and, optionally, the epoch of the reading in microseconds
+    and the number of readings it stands for. It can be gzip-compressed (Content-Encoding: gzip).
+    """
+    status_code, error, body = MeasureValidator.decode_body(request.get_data(), request.headers.get("Content-Encoding", None))
+    if error:
+        return json_response({"error": error}, status_code)
+
+    codec = JsonCodec.instance()
+    if request.mimetype == "application/x-ndjson":
+        try:
+            items = [ codec.loads(line) for line in body.splitlines() if line.strip() ]
+        except ValueError:
+            MeasureValidator.count_failure("invalid_json")
+            return json_response({"error": "Invalid NDJSON format"}, 400)
+    elif request.is_json:
+        try:
+            items = codec.loads(body)
+        except ValueError:
+            items = None
+        if not isinstance(items, list):
+            MeasureValidator.count_failure("invalid_json")
+            return json_response({"error": "Invalid JSON format: expected an array of measures"}, 400)
+    else:
+        MeasureValidator.count_failure("invalid_json")
+        return json_response({"error": "Invalid JSON format"}, 400)
+
+    status_code, result, measures = MeasureValidator.validate_batch(items)
+
+    if measures:
+        try:
+            Server.instance().save_all(measures)
+        except OSError:
+            return json_response({"error": "The storage is not available"}, 503)
+
+    return json_response(result, status_code)
+
+@app.route("/v1/<sensorId>/measures", methods=["GET"])
+def query_endpoint(sensorId: str):
+    """
+    Streams the stored measures of given sensor as NDJSON, optionally within the time range
+    given by the "from" and "to" parameters, either seconds since the epoch or ISO 8601 dates.
+    :param sensorId: The id of the sensor.
+    :type sensorId: str
+    """
+    try:
+        start = Measure.parse_epoch(request.args['from']) if 'from' in request.args else None
+        end = Measure.parse_epoch(request.args['to']) if 'to' in request.args else None
+    except (ValueError, OverflowError):
+        return json_response({"error": "Invalid 'from' or 'to' parameter: must be seconds since the epoch or an ISO 8601 date"}, 400)
+
+    server = Server.instance()
+    codec = JsonLinesCodec(server.storage.date_format)
+
+    def generate():
+        for measure in server.query(sensorId, start, end):
+            yield codec.encode(measure)
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+@app.route("/v1/<sensorId>/rollups", methods=["GET"])
+def rollups_endpoint(sensorId: str):
+    """
+    Streams the aggregates of given sensor as NDJSON, within the time range given by the "from"
+    and "to" parameters, from the finest tier needing at most "points" rows (1000 by default).
+    :param sensorId: The id of the sensor.
+    :type sensorId: str
+    """
+    rollups = Server.instance().rollups
+    if rollups is None:
+        return json_response({"error": "Rollups are disabled"}, 404)
+    try:
+        start = Measure.parse_epoch(request.args['from']) if 'from' in request.args else None
+        end = Measure.parse_epoch(request.args['to']) if 'to' in request.args else None
+        points = int(request.args.get('points', 1000))
+    except (ValueError, OverflowError):
+        return json_response({"error": "Invalid 'from', 'to' or 'points' parameter"}, 400)
 
-    return jsonify(result), status_code
+    def generate():
+        for row in rollups.query(sensorId, start, end, points):
+            yield json.dumps(row, separators=(",", ":")) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+@app.route("/v1/status", methods=["GET"])
+def status_endpoint():
+    """
+    Retrieves the current status of every sensor.
+    Supports If-None-Match (answering 304 if nothing changed), long-polling with the "wait"
+    parameter (seconds to wait for a change before answering 304), and Server-Sent Events,
+    with "Accept: text/event-stream" or "stream=sse", pushing only the sensors that change.
+    """
+    cache = Server.instance().status_cache
+    if request.args.get('stream', None) == "sse" or request.accept_mimetypes.best == "text/event-stream":
+        return Response(stream_with_context(status_events(cache)), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    known = None
+    if request.if_none_match:
+        known = next((version for version in (cache.version_of(tag) for tag in request.if_none_match.as_set()) if version is not None), None)
+    if known is not None and known == cache.version:
+        try:
+            wait = float(request.args.get('wait', 0))
+        except ValueError:
+            wait = math.nan
+        if not math.isfinite(wait):
+            return json_response({"error": "Invalid 'wait' parameter: must be a number of seconds"}, 400)
+        wait = min(wait, 300)
+        if wait <= 0 or not cache.wait_for_change(known, wait):
+            return Response(status=304, headers={"ETag": cache.etag_of(known)})
+
+    version, sensors = cache.snapshot()
+    response = json_response({"version": version, "sensors": sensors})
+    response.headers["ETag"] = cache.etag_of(version)
+    return response
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """
+    Retrieves the metrics of this process, in the Prometheus text format.
+    """
+    return Response(Metrics.instance().render(), content_type=Metrics.CONTENT_TYPE)
+
+def status_events(cache):
+    """
+    Generates Server-Sent Events with the status of the sensors, first all of them, and then the ones that change,
+    until the server closes.
+    :param cache: The status cache.
+    :type cache: a2sensor.sensor_collect.StatusCache
+    """
+    version = 0
+    nonce = cache.nonce
+    while not cache.closed:
+        if cache.nonce != nonce:
+            # the cache was reset: send every sensor again
+            version = 0
+            nonce = cache.nonce
+        current, sensors = cache.snapshot(version)
+        if sensors:
+            yield f"id: {cache.etag_of(current)}\nevent: status\ndata: {json.dumps(sensors)}\n\n"
+        version = current
+        if not cache.wait_for_change(version, 15) and not cache.closed:
+            yield ": keep-alive\n\n"
+
+LoggingConfig.instance().configure_logging(**LoggingConfig.options_from_environment())
 
 if Server.instance() is None:
     folder = os.environ.get('DATA_FOLDER', None)
@@ -67,4 +260,11 @@ if Server.instance() is None:
     if file is None:
         print(f"Error: The required environment variable LOCAL_SENSORS_CONFIG_FILE is not set.")
         sys.exit(1)
-    Server.configure(folder, file)
+    socket_path = os.environ.get('AGGREGATOR_SOCKET', None)
+    if socket_path is None:
+        Server.configure(folder, file, **Server.options_from_environment())
+        Server.instance().start_udp_server()
+    else:
+        # one of several workers: the aggregator owns the storage
+        Server.connect(socket_path, folder, **Server.options_from_environment())
+    atexit.register(Server.instance().close)
@@ -0,0 +1,183 @@
+"""
+a2sensor/sensor_collect/gpio_scheduler.py
+
+This script defines the GpioScheduler class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from collections import deque
+import heapq
+import logging
+from .scheduled_pin import ScheduledPin
+import threading
+import time
+from typing import Callable, List
+
+class GpioScheduler():
+    """
+    Samples many pins from a single thread, using a heap keyed by the time each pin is due.
+
+    Pins are due at fixed multiples of their period since they were added, so the time spent
+    sampling never accumulates as drift. Pins with edge detection enabled are not polled:
+    their level is kept up to date by GPIO.add_event_detect callbacks. Other threads change
+    the schedule through a queue of commands, applied by the scheduler thread itself.
+
+    Class name: GpioScheduler
+
+    Responsibilities:
+        - Sample each pin at its period, without drift.
+        - Track the level of edge-detected pins.
+
+    Collaborators:
+        - a2sensor.sensor_collect.ScheduledPin
+    """
+
+    def __init__(self, gpio, callback:Callable[[str, int], None], exitEvent:threading.Event, clock:Callable[[], float]=time.monotonic):
+        """
+        Creates a new GpioScheduler instance.
+        :param gpio: The GPIO module (RPi.GPIO, or any module with the same interface).
+        :type gpio: module
+        :param callback: The function receiving the sensor key and the level of each sample.
+        :type callback: Callable[[str, int], None]
+        :param exitEvent: The event stopping the scheduler.
+        :type exitEvent: threading.Event
+        :param clock: The monotonic clock, in seconds.
+        :type clock: Callable[[], float]
+        """
+        super().__init__()
+        self._gpio = gpio
+        self._callback = callback
+        self._exit_event = exitEvent
+        self._clock = clock
+        self._heap = []
+        self._commands = deque()
+        self._gpio.setmode(self._gpio.BCM)
+
+    @property
+    def pins(self) -> List[ScheduledPin]:
+        """
+        Retrieves the scheduled pins.
+        :return: Such pins.
+        :rtype: List[a2sensor.sensor_collect.ScheduledPin]
+        """
+        return list(self._heap)
+
+    def add(self, sensorKey:str, pin:int, period:float, edgeDetect:bool=False) -> ScheduledPin:
+        """
+        Schedules given pin. The first sample is taken right away.
+        :param sensorKey: The key of the sensor.
+        :type sensorKey: str
+        :param pin: The pin.
+        :type pin: int
+        :param period: The seconds between samples.
+        :type period: float
+        :param edgeDetect: Whether to track the level with edge detection instead of polling.
+        :type edgeDetect: bool
+        :return: The scheduled pin.
+        :rtype: a2sensor.sensor_collect.ScheduledPin
+        :raise ValueError: If the period is not positive.
+        """
+        if not period > 0:
+            raise ValueError(f"Cannot schedule {sensorKey} every {period} seconds: the period must be positive")
+        gpio = self._gpio
+        gpio.setup(pin, gpio.IN)
+        scheduled = ScheduledPin(sensorKey, pin, period, self._clock(), edgeDetect)
+        if edgeDetect:
+            scheduled.level = gpio.input(pin)
+            def on_edge(channel):
+                scheduled.level = gpio.input(channel)
+            gpio.add_event_detect(pin, gpio.BOTH, callback=on_edge)
+        heapq.heappush(self._heap, scheduled)
+        return scheduled
+
+    def remove(self, sensorKey:str):
+        """
+        Stops sampling the pin of given sensor.
+        :param sensorKey: The key of the sensor.
+        :type sensorKey: str
+        """
+        for scheduled in [ scheduled for scheduled in self._heap if scheduled.sensor_key == sensorKey ]:
+            if scheduled.edge_detect:
+                self._gpio.remove_event_detect(scheduled.pin)
+            self._heap.remove(scheduled)
+        heapq.heapify(self._heap)
+
+    def schedule(self, sensorKey:str, pin:int, period:float, edgeDetect:bool=False):
+        """
+        Asks the scheduler thread to add given pin, from any thread.
+        :param sensorKey: The key of the sensor.
+        :type sensorKey: str
+        :param pin: The pin.
+        :type pin: int
+        :param period: The seconds between samples.
+        :type period: float
+        :param edgeDetect: Whether to track the level with edge detection instead of polling.
+        :type edgeDetect: bool
+        """
+        self._commands.append(lambda: self.add(sensorKey, pin, period, edgeDetect))
+
+    def unschedule(self, sensorKey:str):
+        """
+        Asks the scheduler thread to remove the pin of given sensor, from any thread.
+        :param sensorKey: The key of the sensor.
+        :type sensorKey: str
+        """
+        self._commands.append(lambda: self.remove(sensorKey))
+
+    def run_once(self) -> float:
+        """
+        Applies the pending commands, and samples every pin that is due.
+        :return: The seconds until the next pin is due.
+        :rtype: float
+        """
+        commands = self._commands
+        while commands:
+            try:
+                commands.popleft()()
+            except Exception as error:
+                logging.getLogger("a2sensor").error(f"Cannot change the schedule: {error}")
+        heap = self._heap
+        if not heap:
+            return None
+        now = self._clock()
+        while heap[0].due <= now:
+            scheduled = heap[0]
+            value = scheduled.level if scheduled.edge_detect else self._gpio.input(scheduled.pin)
+            try:
+                self._callback(scheduled.sensor_key, value)
+            except Exception as error:
+                logging.getLogger("a2sensor").error(f"Cannot process sample of {scheduled.sensor_key}: {error}")
+            scheduled.due += scheduled.period
+            now = self._clock()
+            if scheduled.due <= now:
+                # fell behind a whole period: skip the missed samples, but stay on the same grid
+                missed = int((now - scheduled.due) // scheduled.period) + 1
+                scheduled.due += missed * scheduled.period
+                scheduled.skipped += missed
+            heapq.heapreplace(heap, scheduled)
+        return heap[0].due - now
+
+    def run(self):
+        """
+        Samples the pins until the exit event is set.
+        Commands are applied at the latest when the next pin is due, or within a second if there's none.
+        """
+        while not self._exit_event.is_set():
+            delay = self.run_once()
+            self._exit_event.wait(delay if delay is not None else 1)
+        for scheduled in self._heap:
+            if scheduled.edge_detect:
+                self._gpio.remove_event_detect(scheduled.pin)
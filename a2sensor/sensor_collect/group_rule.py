@@ -0,0 +1,84 @@
+"""
+a2sensor/sensor_collect/group_rule.py
+
+This script defines the GroupRule class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from .alert_rule import AlertRule
+from .measure import Measure
+from typing import Dict, List
+
+class GroupRule(AlertRule):
+    """
+    Fires when more than a number of the sensors of a group are in a status, "empty" by default.
+
+    The number of sensors of the group in the status is kept up to date with each measure,
+    and the alert resolves once it's back to the limit or below.
+
+    Class name: GroupRule
+
+    Responsibilities:
+        - Count the sensors of a group in the status.
+
+    Collaborators:
+        - a2sensor.sensor_collect.RulesEngine
+    """
+
+    def __init__(self, name:str, sensors:List[str], status:str="empty", moreThan:int=0):
+        """
+        Creates a new GroupRule instance.
+        :param name: The name of the rule, and of the group in its alerts.
+        :type name: str
+        :param sensors: The ids of the sensors of the group.
+        :type sensors: List[str]
+        :param status: The status: "stuck", "empty" or "ok".
+        :type status: str
+        :param moreThan: The most sensors in the status without firing.
+        :type moreThan: int
+        """
+        super().__init__(name)
+        if status not in Measure.STATUS_CODES:
+            raise ValueError(f"Unknown status {status}: must be one of {', '.join(Measure.STATUSES)}")
+        self._sensors = frozenset(sensors)
+        self._status = status
+        self._more_than = moreThan
+        self._matching = set()
+        self._firing = False
+
+    def update(self, measure:Measure) -> List[Dict]:
+        """
+        Processes a new measure.
+        :param measure: The measure.
+        :type measure: a2sensor.sensor_collect.Measure
+        :return: The alerts raised or resolved.
+        :rtype: List[Dict]
+        """
+        sensor_id = measure.sensor_id
+        if sensor_id not in self._sensors:
+            return []
+        if measure.status == self._status:
+            self._matching.add(sensor_id)
+        else:
+            self._matching.discard(sensor_id)
+        count = len(self._matching)
+        if not self._firing and count > self._more_than:
+            self._firing = True
+            return [ self.alert("firing", measure.epoch, f"{count} of {len(self._sensors)} sensors of {self._name} are {self._status}", status=self._status, count=count, sensors=sorted(self._matching)) ]
+        if self._firing and count <= self._more_than:
+            self._firing = False
+            return [ self.alert("resolved", measure.epoch, f"{count} of {len(self._sensors)} sensors of {self._name} are {self._status}", status=self._status, count=count) ]
+        return []
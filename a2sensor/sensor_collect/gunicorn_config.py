@@ -0,0 +1,66 @@
+"""
+a2sensor/sensor_collect/gunicorn_config.py
+
+This script defines the gunicorn settings, and the hooks running a single Aggregator alongside the HTTP workers.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import multiprocessing
+import os
+
+# long-polls (GET /v1/status?wait=) and Server-Sent Events hold requests open for minutes: threaded
+# workers keep serving meanwhile, and their heartbeat doesn't depend on requests finishing, so the
+# worker timeout doesn't kill them as it would sync workers
+worker_class = "gthread"
+threads = int(os.environ.get('GUNICORN_THREADS', 32))
+
+_aggregator = None
+
+def on_starting(server):
+    """
+    Starts the aggregator process before any worker is forked, and lets the workers know its socket
+    through the AGGREGATOR_SOCKET environment variable.
+    :param server: The gunicorn arbiter.
+    :type server: gunicorn.arbiter.Arbiter
+    """
+    global _aggregator
+    from .aggregator import Aggregator
+    from .server import Server
+
+    folder = os.environ.get('DATA_FOLDER', None)
+    if folder is None:
+        raise RuntimeError("The required environment variable DATA_FOLDER is not set.")
+    socket_path = os.environ.setdefault('AGGREGATOR_SOCKET', os.path.join(folder, ".aggregator.sock"))
+    # a fresh interpreter, not a copy of the arbiter
+    context = multiprocessing.get_context("spawn")
+    ready = context.Event()
+    _aggregator = context.Process(
+        target=Aggregator.run_process,
+        args=(folder, os.environ.get('LOCAL_SENSORS_CONFIG_FILE', None), Server.options_from_environment(), socket_path, ready),
+        name="aggregator")
+    _aggregator.start()
+    if not ready.wait(60):
+        raise RuntimeError("The aggregator did not start")
+
+def on_exit(server):
+    """
+    Stops the aggregator once the workers are gone, letting it drain its queue and close the storage.
+    :param server: The gunicorn arbiter.
+    :type server: gunicorn.arbiter.Arbiter
+    """
+    if _aggregator is not None and _aggregator.is_alive():
+        _aggregator.terminate()
+        _aggregator.join(60)
@@ -0,0 +1,119 @@
+"""
+a2sensor/sensor_collect/json_codec.py
+
+This script defines the JsonCodec class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import json
+from typing import Any, Union
+
+class JsonCodec():
+    """
+    Encodes and decodes JSON with the standard library, or with orjson if installed.
+
+    Both produce compact JSON, as bytes; orjson writes non-ASCII characters as UTF-8 rather
+    than escaping them, which decodes to the same values. Errors are ValueErrors either way.
+    The process-wide codec is chosen with configure(), and is "auto" (orjson if available)
+    until then.
+
+    Class name: JsonCodec
+
+    Responsibilities:
+        - Encode and decode JSON, as fast as the installed libraries allow.
+
+    Collaborators:
+        - None
+    """
+
+    _instance = None
+
+    BACKENDS = [ "auto", "json", "orjson" ]
+
+    def __init__(self, backend:str="auto"):
+        """
+        Creates a new JsonCodec instance.
+        :param backend: Either "json", "orjson", or "auto" to use orjson if installed.
+        :type backend: str
+        """
+        super().__init__()
+        if backend not in self.__class__.BACKENDS:
+            raise ValueError(f"Unknown JSON codec {backend}: must be one of {', '.join(self.__class__.BACKENDS)}")
+        self._orjson = None
+        if backend != "json":
+            try:
+                import orjson
+                self._orjson = orjson
+            except ImportError:
+                if backend == "orjson":
+                    raise
+        self._name = "orjson" if self._orjson is not None else "json"
+
+    @property
+    def name(self) -> str:
+        """
+        Retrieves the library in use.
+        :return: Either "json" or "orjson".
+        :rtype: str
+        """
+        return self._name
+
+    def dumps(self, data:Any, sortKeys:bool=False) -> bytes:
+        """
+        Encodes given data as compact JSON.
+        :param data: The data.
+        :type data: Any
+        :param sortKeys: Whether to sort the keys of objects.
+        :type sortKeys: bool
+        :return: The JSON text.
+        :rtype: bytes
+        """
+        if self._orjson is not None:
+            return self._orjson.dumps(data, option=self._orjson.OPT_SORT_KEYS if sortKeys else 0)
+        return json.dumps(data, sort_keys=sortKeys, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, text:Union[bytes, str]) -> Any:
+        """
+        Decodes given JSON text.
+        :param text: The JSON text.
+        :type text: Union[bytes, str]
+        :return: The data.
+        :rtype: Any
+        :raise ValueError: If the text is not valid JSON.
+        """
+        if self._orjson is not None:
+            return self._orjson.loads(text)
+        return json.loads(text)
+
+    @classmethod
+    def configure(cls, backend:str="auto"):
+        """
+        Sets the codec of the process.
+        :param backend: Either "json", "orjson", or "auto" to use orjson if installed.
+        :type backend: str
+        """
+        cls._instance = cls(backend)
+
+    @classmethod
+    def instance(cls):
+        """
+        Retrieves the codec of the process.
+        :return: Such codec.
+        :rtype: a2sensor.sensor_collect.JsonCodec
+        """
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
@@ -0,0 +1,178 @@
+"""
+a2sensor/sensor_collect/json_file_storage.py
+
+This script defines the JsonFileStorage class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from bisect import bisect_left
+from datetime import datetime
+from .json_codec import JsonCodec
+from .measure import Measure
+from .measure_storage import MeasureStorage
+import os
+from .timestamp_formatter import TimestampFormatter
+from typing import Iterator
+
+class JsonFileStorage(MeasureStorage):
+    """
+    Legacy storage writing one JSON file per measure.
+
+    Class name: JsonFileStorage
+
+    Responsibilities:
+        - Persist each measure in <folder>/<sensorId>/<YYYYmmddHHMMSSffffff>.json.
+        - Read such files back, optionally within a time range.
+
+    Collaborators:
+        - a2sensor.sensor_collect.Measure
+    """
+
+    FILE_NAME_FORMAT = "%Y%m%d%H%M%S%f"
+
+    def __init__(self, folder:str, dateFormat:str):
+        """
+        Creates a new JsonFileStorage instance.
+        :param folder: The root folder of the storage.
+        :type folder: str
+        :param dateFormat: The format of the timestamps in the stored records.
+        :type dateFormat: str
+        """
+        super().__init__(folder, dateFormat)
+        # sensorId -> folder, once known to exist
+        self._folders = {}
+
+    def append(self, measure:Measure):
+        """
+        Persists given measure.
+        :param measure: The measure.
+        :type measure: a2sensor.sensor_collect.Measure
+        """
+        folder = self._folders.get(measure.sensor_id, None)
+        if folder is None:
+            folder = self.sensor_folder(measure.sensor_id)
+            os.makedirs(folder, exist_ok=True)
+            self._folders[measure.sensor_id] = folder
+
+        filepath = os.path.join(folder, self.file_name_of(measure.epoch))
+
+        with open(filepath, 'wb') as file:
+            file.write(JsonCodec.instance().dumps(measure.to_dict(self.date_format)))
+
+    def read(self, sensorId:str) -> Iterator[Measure]:
+        """
+        Reads the measures of given sensor, oldest first.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :return: The measures.
+        :rtype: Iterator[a2sensor.sensor_collect.Measure]
+        """
+        return self.query(sensorId)
+
+    def query(self, sensorId:str, start:int=None, end:int=None) -> Iterator[Measure]:
+        """
+        Reads the measures of given sensor within a time range, oldest first.
+        File names sort chronologically, so the range is found with a binary search on them.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :param start: The first time to include, in microseconds since the epoch. Optional.
+        :type start: int
+        :param end: The first time to exclude, in microseconds since the epoch. Optional.
+        :type end: int
+        :return: The measures.
+        :rtype: Iterator[a2sensor.sensor_collect.Measure]
+        """
+        folder = self.sensor_folder(sensorId)
+        if not os.path.isdir(folder):
+            return
+        names = sorted(name for name in os.listdir(folder) if self.is_measure_file(name))
+        first = bisect_left(names, self.file_name_of(start)) if start is not None else 0
+        last = bisect_left(names, self.file_name_of(end)) if end is not None else len(names)
+        for name in names[first:last]:
+            with open(os.path.join(folder, name), 'rb') as file:
+                data = JsonCodec.instance().loads(file.read())
+            yield Measure.from_dict(data, self.epoch_of_file(name))
+
+    def latest(self, sensorId:str) -> Measure:
+        """
+        Reads the last stored measure of given sensor, from the file with the highest name.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :return: The measure, or None if there's none.
+        :rtype: a2sensor.sensor_collect.Measure
+        """
+        folder = self.sensor_folder(sensorId)
+        if not os.path.isdir(folder):
+            return None
+        name = max((name for name in os.listdir(folder) if self.is_measure_file(name)), default=None)
+        if name is None:
+            return None
+        with open(os.path.join(folder, name), 'rb') as file:
+            return Measure.from_dict(JsonCodec.instance().loads(file.read()), self.epoch_of_file(name))
+
+    def delete_before(self, sensorId:str, epoch:int) -> int:
+        """
+        Deletes the measures of given sensor older than given time.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :param epoch: The time, in microseconds since the epoch.
+        :type epoch: int
+        :return: The number of files deleted.
+        :rtype: int
+        """
+        folder = self.sensor_folder(sensorId)
+        if not os.path.isdir(folder):
+            return 0
+        limit = self.file_name_of(epoch)
+        result = 0
+        for name in os.listdir(folder):
+            if self.is_measure_file(name) and name < limit:
+                os.remove(os.path.join(folder, name))
+                result += 1
+        return result
+
+    @classmethod
+    def file_name_of(cls, epoch:int) -> str:
+        """
+        Builds the name of the file of a measure taken at given time.
+        :param epoch: The time, in microseconds since the epoch.
+        :type epoch: int
+        :return: The file name.
+        :rtype: str
+        """
+        return TimestampFormatter.for_format(cls.FILE_NAME_FORMAT).format(epoch) + ".json"
+
+    @classmethod
+    def is_measure_file(cls, fileName:str) -> bool:
+        """
+        Checks whether given file name is the one of a measure file, and not i.e. a segment.
+        :param fileName: The name of the file.
+        :type fileName: str
+        :return: True in such case.
+        :rtype: bool
+        """
+        return len(fileName) == 25 and fileName.endswith(".json") and fileName[:20].isdigit()
+
+    @classmethod
+    def epoch_of_file(cls, fileName:str) -> int:
+        """
+        Retrieves the time encoded in the name of a measure file.
+        :param fileName: The name of the file.
+        :type fileName: str
+        :return: The time, in microseconds since the epoch.
+        :rtype: int
+        """
+        return Measure.epoch_of(datetime.strptime(fileName[:20], cls.FILE_NAME_FORMAT))
@@ -0,0 +1,203 @@
+"""
+a2sensor/sensor_collect/json_lines_codec.py
+
+This script defines the JsonLinesCodec class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import json
+from json.encoder import encode_basestring_ascii
+import os
+from .json_codec import JsonCodec
+from .measure import Measure
+from .time_index import TimeIndex
+from .timestamp_formatter import TimestampFormatter
+from typing import Iterator
+
+class JsonLinesCodec():
+    """
+    Encodes measures as NDJSON segment records: the stored JSON layout, plus the epoch, one per line.
+
+    Class name: JsonLinesCodec
+
+    Responsibilities:
+        - Encode measures as segment records.
+        - Decode segment files, optionally within a time range.
+
+    Collaborators:
+        - a2sensor.sensor_collect.JsonCodec
+        - a2sensor.sensor_collect.Measure
+        - a2sensor.sensor_collect.TimeIndex
+    """
+
+    EXTENSION = ".ndjson"
+
+    def __init__(self, dateFormat:str):
+        """
+        Creates a new JsonLinesCodec instance.
+        :param dateFormat: The format of the timestamps in the records.
+        :type dateFormat: str
+        """
+        super().__init__()
+        self._date_format = dateFormat
+        self._formatter = TimestampFormatter.for_format(dateFormat)
+        self._codec = JsonCodec.instance()
+        # (sensorId, sensorName) -> the encoded record up to the status
+        self._prefixes = {}
+        self._time_index = TimeIndex(self.epoch_of)
+
+    @property
+    def extension(self) -> str:
+        """
+        Retrieves the extension of the segment files.
+        :return: Such extension.
+        :rtype: str
+        """
+        return self.__class__.EXTENSION
+
+    def encode(self, measure:Measure) -> bytes:
+        """
+        Encodes given measure as a segment record.
+        The output is the same as json.dumps of the stored layout plus the epoch, but the part
+        depending only on the sensor is encoded once.
+        :param measure: The measure.
+        :type measure: a2sensor.sensor_collect.Measure
+        :return: The record.
+        :rtype: bytes
+        """
+        if type(measure.sensor_name) is str:
+            key = (measure.sensor_id, measure.sensor_name)
+            prefix = self._prefixes.get(key, None)
+            if prefix is None:
+                prefix = self._prefix_of(measure)
+                self._prefixes[key] = prefix
+        else:
+            # only names validated elsewhere are cached: anything else is encoded as is
+            prefix = self._prefix_of(measure)
+        count = f',"count":{measure.count}' if measure.count != 1 else ""
+        return f'{prefix}{json.dumps(measure.status)},"timestamp":{encode_basestring_ascii(self._formatter.format(measure.epoch))}{count},"epoch":{measure.epoch}}}}}\n'.encode("utf-8")
+
+    def decode(self, record:bytes) -> Measure:
+        """
+        Decodes given segment record.
+        :param record: The record.
+        :type record: bytes
+        :return: The measure, or None if the record is truncated.
+        :rtype: a2sensor.sensor_collect.Measure
+        """
+        try:
+            return Measure.from_dict(self._codec.loads(record))
+        except ValueError:
+            return None
+
+    def epoch_of(self, record:bytes) -> int:
+        """
+        Retrieves the epoch of given segment record.
+        :param record: The record.
+        :type record: bytes
+        :return: The epoch, or None if the record is truncated.
+        :rtype: int
+        """
+        # records end with the epoch, and a quote followed by "epoch": can't be part of a string
+        position = record.rfind(b'"epoch":')
+        if position >= 0 and record.endswith(b"}}\n"):
+            try:
+                return int(record[position + 8:-3])
+            except ValueError:
+                pass
+        measure = self.decode(record)
+        return measure.epoch if measure is not None else None
+
+    def last_epoch(self, path:str) -> int:
+        """
+        Retrieves the epoch of the last complete record of given segment file, reading just its tail.
+        :param path: The path of the segment.
+        :type path: str
+        :return: The epoch, or None if there are no records.
+        :rtype: int
+        """
+        with open(path, 'rb') as file:
+            end = file.seek(0, os.SEEK_END)
+            length = 4096
+            while True:
+                file.seek(max(end - length, 0))
+                tail = file.read(length)
+                # drop a record still being written
+                tail = tail[:tail.rfind(b"\n") + 1]
+                lines = tail.splitlines(True)
+                # the first line may be cut, unless the tail starts the file
+                for record in reversed(lines if length >= end else lines[1:]):
+                    epoch = self.epoch_of(record)
+                    if epoch is not None:
+                        return epoch
+                if length >= end:
+                    return None
+                length *= 4
+
+    def read(self, path:str) -> Iterator[Measure]:
+        """
+        Reads the measures of given segment file.
+        :param path: The path of the segment.
+        :type path: str
+        :return: The measures.
+        :rtype: Iterator[a2sensor.sensor_collect.Measure]
+        """
+        with open(path, 'rb') as file:
+            for record in file:
+                measure = self.decode(record)
+                if measure is not None:
+                    yield measure
+
+    def query(self, path:str, start:int=None, end:int=None) -> Iterator[Measure]:
+        """
+        Reads the measures of given segment file within a time range, seeking through a sparse time index.
+        :param path: The path of the segment.
+        :type path: str
+        :param start: The first time to include, in microseconds since the epoch. Optional.
+        :type start: int
+        :param end: The first time to exclude, in microseconds since the epoch. Optional.
+        :type end: int
+        :return: The measures.
+        :rtype: Iterator[a2sensor.sensor_collect.Measure]
+        """
+        offset = self._time_index.seek(path, start) if start is not None else 0
+        with open(path, 'rb') as file:
+            file.seek(offset)
+            for record in file:
+                measure = self.decode(record)
+                if measure is None or (start is not None and measure.epoch < start):
+                    continue
+                if end is not None and measure.epoch >= end:
+                    break
+                yield measure
+
+    def forget(self, path:str):
+        """
+        Drops any cached information about given segment file.
+        :param path: The path of the segment.
+        :type path: str
+        """
+        self._time_index.forget(path)
+
+    def _prefix_of(self, measure:Measure) -> str:
+        """
+        Encodes the part of the record of given measure that depends only on its sensor.
+        :param measure: The measure.
+        :type measure: a2sensor.sensor_collect.Measure
+        :return: The record up to the status.
+        :rtype: str
+        """
+        return json.dumps({ "id": measure.sensor_id, "name": measure.sensor_name }, separators=(",", ":"))[:-1] + ',"value":{"status":'
@@ -0,0 +1,65 @@
+"""
+a2sensor/sensor_collect/json_log_formatter.py
+
+This script defines the JsonLogFormatter class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from datetime import datetime, timezone
+import json
+import logging
+
+class JsonLogFormatter(logging.Formatter):
+    """
+    Formats log records as one JSON object per line, for journald or log shippers.
+
+    Each object has the time (ISO 8601, UTC), level, logger and message, plus the exception
+    if any, and the structured fields given through "extra" (sensor_id, status, ...).
+
+    Class name: JsonLogFormatter
+
+    Responsibilities:
+        - Format log records as JSON.
+
+    Collaborators:
+        - a2sensor.sensor_collect.LoggingConfig
+    """
+
+    # the attributes every LogRecord has, which are not structured fields
+    RESERVED = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None)).keys()) | { "message", "asctime" }
+
+    def format(self, record:logging.LogRecord) -> str:
+        """
+        Formats given record.
+        :param record: The record.
+        :type record: logging.LogRecord
+        :return: The JSON line.
+        :rtype: str
+        """
+        result = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in self.__class__.RESERVED:
+                result[name] = value
+        if record.exc_info:
+            result["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            result["exception"] = record.exc_text
+        return json.dumps(result, default=str)
@@ -0,0 +1,240 @@
+"""
+a2sensor/sensor_collect/legacy_compactor.py
+
+This script defines the LegacyCompactor class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import json
+from .json_codec import JsonCodec
+from .json_file_storage import JsonFileStorage
+import logging
+from .measure import Measure
+import os
+import shutil
+from typing import Dict, List
+
+class LegacyCompactor():
+    """
+    Migrates the legacy one-JSON-file-per-measure layout to time-sorted segments.
+
+    It works in three resumable steps, tracked in <folder>/.compaction/checkpoint.json:
+    the file names of each sensor are streamed into one spill file per day, so no folder
+    is ever listed in memory at once; then, day by day, the files are parsed by a process
+    pool and written as a single segment, which is read back and compared before the
+    source files are removed.
+
+    Class name: LegacyCompactor
+
+    Responsibilities:
+        - Convert legacy measure files into segments, with bounded memory.
+        - Resume an interrupted migration without losing or duplicating measures.
+
+    Collaborators:
+        - a2sensor.sensor_collect.JsonFileStorage
+        - a2sensor.sensor_collect.SegmentedStorage
+    """
+
+    def __init__(self, storage, workers:int=None, chunkSize:int=1000, keepSources:bool=False):
+        """
+        Creates a new LegacyCompactor instance.
+        :param storage: The segmented storage to write to. Its folder holds the legacy files.
+        :type storage: a2sensor.sensor_collect.SegmentedStorage
+        :param workers: The number of parsing processes. Defaults to the number of CPUs.
+        :type workers: int
+        :param chunkSize: The number of files each process parses at once.
+        :type chunkSize: int
+        :param keepSources: Whether to keep the legacy files once migrated.
+        :type keepSources: bool
+        """
+        super().__init__()
+        self._storage = storage
+        self._workers = workers
+        self._chunk_size = chunkSize
+        self._keep_sources = keepSources
+        self._folder = os.path.join(storage.folder, ".compaction")
+        self._checkpoint_file = os.path.join(self._folder, "checkpoint.json")
+
+    @property
+    def folder(self) -> str:
+        """
+        Retrieves the folder with the spill files and the checkpoint.
+        :return: Such folder.
+        :rtype: str
+        """
+        return self._folder
+
+    def run(self) -> Dict[str, int]:
+        """
+        Migrates every legacy measure file, resuming from the checkpoint if any.
+        :return: The number of "days" migrated, "measures" written, and source "files" deleted.
+        :rtype: Dict[str, int]
+        """
+        logger = logging.getLogger("a2sensor")
+        checkpoint = self._load_checkpoint()
+        if not checkpoint["spilled"]:
+            self.spill()
+            checkpoint["spilled"] = True
+            self._save_checkpoint(checkpoint)
+        result = { "days": 0, "measures": 0, "files": 0 }
+        with ProcessPoolExecutor(self._workers) as executor:
+            for sensor_id in sorted(os.listdir(self._folder)):
+                spill_folder = os.path.join(self._folder, sensor_id)
+                if not os.path.isdir(spill_folder):
+                    continue
+                for spill in sorted(os.listdir(spill_folder)):
+                    day = f"{sensor_id}/{spill[:8]}"
+                    if day in checkpoint["done"]:
+                        continue
+                    with open(os.path.join(spill_folder, spill), 'r') as file:
+                        names = sorted(file.read().split())
+                    if day not in checkpoint["verified"]:
+                        measures = self.parse(executor, sensor_id, names)
+                        if measures:
+                            self.verify(self._storage.write_segment(sensor_id, measures), measures)
+                        result["measures"] += len(measures)
+                        checkpoint["verified"].append(day)
+                        self._save_checkpoint(checkpoint)
+                    if not self._keep_sources:
+                        result["files"] += self.delete_sources(sensor_id, names)
+                    checkpoint["verified"].remove(day)
+                    checkpoint["done"].append(day)
+                    self._save_checkpoint(checkpoint)
+                    result["days"] += 1
+                    logger.info(f"Compacted {day}: {len(names)} files")
+        shutil.rmtree(self._folder)
+        return result
+
+    def spill(self):
+        """
+        Streams the names of the legacy files of each sensor into one spill file per day.
+        """
+        shutil.rmtree(self._folder, ignore_errors=True)
+        for sensor_id in self._storage.sensor_ids():
+            spills = {}
+            try:
+                with os.scandir(self._storage.sensor_folder(sensor_id)) as entries:
+                    for entry in entries:
+                        if not JsonFileStorage.is_measure_file(entry.name):
+                            continue
+                        day = entry.name[:8]
+                        spill = spills.get(day, None)
+                        if spill is None:
+                            os.makedirs(os.path.join(self._folder, sensor_id), exist_ok=True)
+                            spill = open(os.path.join(self._folder, sensor_id, f"{day}.names"), 'w')
+                            spills[day] = spill
+                        spill.write(entry.name + "\n")
+            finally:
+                for spill in spills.values():
+                    spill.close()
+
+    def parse(self, executor:ProcessPoolExecutor, sensorId:str, names:List[str]) -> List[Measure]:
+        """
+        Parses given legacy files in parallel, keeping their order.
+        :param executor: The process pool.
+        :type executor: concurrent.futures.ProcessPoolExecutor
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :param names: The names of the files, sorted.
+        :type names: List[str]
+        :return: The measures.
+        :rtype: List[a2sensor.sensor_collect.Measure]
+        """
+        folder = self._storage.sensor_folder(sensorId)
+        chunks = [ names[position:position + self._chunk_size] for position in range(0, len(names), self._chunk_size) ]
+        result = []
+        for measures in executor.map(self.__class__.parse_files, [ folder ] * len(chunks), chunks):
+            result.extend(measures)
+        return result
+
+    @staticmethod
+    def parse_files(folder:str, names:List[str]) -> List[Measure]:
+        """
+        Parses given legacy files. Runs in the worker processes.
+        :param folder: The folder of the files.
+        :type folder: str
+        :param names: The names of the files.
+        :type names: List[str]
+        :return: The measures. Files already gone are skipped.
+        :rtype: List[a2sensor.sensor_collect.Measure]
+        """
+        codec = JsonCodec.instance()
+        result = []
+        for name in names:
+            try:
+                with open(os.path.join(folder, name), 'rb') as file:
+                    data = codec.loads(file.read())
+            except FileNotFoundError:
+                continue
+            result.append(Measure.from_dict(data, JsonFileStorage.epoch_of_file(name)))
+        return result
+
+    def verify(self, path:str, measures:List[Measure]):
+        """
+        Reads given segment back, and compares it with the measures written to it.
+        :param path: The path of the segment.
+        :type path: str
+        :param measures: The measures.
+        :type measures: List[a2sensor.sensor_collect.Measure]
+        """
+        written = [ (measure.epoch, measure.status, measure.count) for measure in self._storage.codec.read(path) ]
+        expected = [ (measure.epoch, measure.status, measure.count) for measure in measures ]
+        if written != expected:
+            raise ValueError(f"Segment {path} doesn't match its {len(measures)} source files")
+
+    def delete_sources(self, sensorId:str, names:List[str]) -> int:
+        """
+        Deletes given legacy files.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :param names: The names of the files.
+        :type names: List[str]
+        :return: The number of files deleted.
+        :rtype: int
+        """
+        folder = self._storage.sensor_folder(sensorId)
+        result = 0
+        for name in names:
+            try:
+                os.remove(os.path.join(folder, name))
+                result += 1
+            except FileNotFoundError:
+                pass
+        return result
+
+    def _load_checkpoint(self) -> Dict:
+        """
+        Loads the checkpoint of a previous run.
+        :return: The checkpoint, with whether names were "spilled", and the "verified" and "done" days.
+        :rtype: Dict
+        """
+        if not os.path.exists(self._checkpoint_file):
+            return { "spilled": False, "verified": [], "done": [] }
+        with open(self._checkpoint_file, 'r') as file:
+            return json.load(file)
+
+    def _save_checkpoint(self, checkpoint:Dict):
+        """
+        Writes the checkpoint atomically.
+        :param checkpoint: The checkpoint.
+        :type checkpoint: Dict
+        """
+        os.makedirs(self._folder, exist_ok=True)
+        temporary = f"{self._checkpoint_file}.tmp"
+        with open(temporary, 'w') as file:
+            json.dump(checkpoint, file)
+        os.replace(temporary, self._checkpoint_file)
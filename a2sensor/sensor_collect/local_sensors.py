@@ -18,13 +18,13 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
-from collections import deque
 from itertools import islice
 import logging
-import RPi.GPIO as GPIO
+from .metrics import Metrics
+from .sensor_descriptor import SensorDescriptor
+from .sensor_state import SensorState
 import threading
 import time
-import toml
 from typing import Dict, List
 
 class LocalSensors():
@@ -41,19 +41,42 @@ class LocalSensors():
     """
     _instance = None
 
-    def __init__(self, configFile:str, callback):
+    SAMPLERS = [ "threads", "scheduler" ]
+
+    GPIO_BACKENDS = [ "rpi", "simulated" ]
+
+    def __init__(self, configFile:str, callback, sampler:str="threads", gpio=None, reloadInterval:float=0):
         """
         Creates a new LocalSensors instance.
         :param configFile: The configuration file.
         :type configFile: str
         :param callback: The callback function to call for each read of a sensor.
         :type callbalk: function
+        :param sampler: How to sample the pins: one "threads" per sensor, or a single "scheduler".
+        :type sampler: str
+        :param gpio: The GPIO module, or any object with the same interface. Defaults to RPi.GPIO.
+        :type gpio: module
+        :param reloadInterval: The seconds between checks of the configuration file for changes. Zero disables reloading.
+        :type reloadInterval: float
         """
         super().__init__()
+        if sampler not in self.__class__.SAMPLERS:
+            raise ValueError(f"Unknown sampler {sampler}: must be one of {', '.join(self.__class__.SAMPLERS)}")
         self._config_file = configFile
+        self._sampler = sampler
+        self._gpio = gpio if gpio is not None else self.__class__.gpio_for_backend("rpi")
         self._sensors = {}
         self._callback = callback
-        self._previous_measures = {}
+        self._states = {}
+        self._descriptors = {}
+        self._reload_interval = reloadInterval
+        self._running = False
+        self._scheduler = None
+        self._threads = {}
+        self._stop_events = {}
+        # sensorKey -> monotonic time of the last sample, to measure jitter
+        self._last_samples = {}
+        self._metrics = Metrics.instance()
         self._exit_event = threading.Event()
         self.configure()
 
@@ -66,6 +89,50 @@ class LocalSensors():
         """
         return self._config_file
 
+    @property
+    def sampler(self) -> str:
+        """
+        Retrieves how the pins are sampled.
+        :return: Either "threads" or "scheduler".
+        :rtype: str
+        """
+        return self._sampler
+
+    @property
+    def reload_interval(self) -> float:
+        """
+        Retrieves the seconds between checks of the configuration file for changes.
+        :return: Such interval, or zero if reloading is disabled.
+        :rtype: float
+        """
+        return self._reload_interval
+
+    @property
+    def gpio(self):
+        """
+        Retrieves the GPIO module.
+        :return: Such module.
+        :rtype: module
+        """
+        return self._gpio
+
+    @classmethod
+    def gpio_for_backend(cls, backend:str):
+        """
+        Retrieves the GPIO implementation of given backend, importing RPi.GPIO only when asked for.
+        :param backend: Either "rpi" or "simulated", with random traces.
+        :type backend: str
+        :return: The GPIO module, or an object with the same interface.
+        :rtype: module
+        """
+        if backend == "rpi":
+            import RPi.GPIO as GPIO
+            return GPIO
+        if backend == "simulated":
+            from .simulated_gpio import SimulatedGpio
+            return SimulatedGpio()
+        raise ValueError(f"Unknown GPIO backend {backend}: must be one of {', '.join(cls.GPIO_BACKENDS)}")
+
     @property
     def sensors(self) -> Dict[str, Dict]:
         """
@@ -85,13 +152,22 @@ class LocalSensors():
         return self._callback
 
     @property
-    def previous_measures(self) -> Dict[str, List[bool]]:
+    def states(self) -> Dict[str, SensorState]:
         """
-        Retrieves a dictionary with the previous measures of each sensor.
+        Retrieves a dictionary with the state computed from the previous measures of each sensor.
         :return: Such dictionary.
-        :rtype: Dict[str, List[bool]]
+        :rtype: Dict[str, a2sensor.sensor_collect.SensorState]
+        """
+        return self._states
+
+    @property
+    def descriptors(self) -> Dict[str, SensorDescriptor]:
+        """
+        Retrieves the resolved settings of each sensor.
+        :return: Such descriptors.
+        :rtype: Dict[str, a2sensor.sensor_collect.SensorDescriptor]
         """
-        return self._previous_measures
+        return self._descriptors
 
     @property
     def exit_event(self):
@@ -106,64 +182,195 @@ class LocalSensors():
         """
         Reads the settings from the configuration file.
         """
+        self.reload()
+
+    def reload(self):
+        """
+        Reads the settings from the configuration file again, applying only what changed.
+        Samplers are started or stopped only for the sensors whose pin, period or edge detection
+        changed, and sensors keep their state unless their thresholds changed. The new settings
+        replace the previous ones at once, so sampling never waits for a reload.
+        """
+        import toml
         config = toml.load(self.config_file)
 
+        previous = self._descriptors
+        sensors = {}
+        descriptors = {}
         index = 0
         for sensor, attributes in config.items():
             attributes['index'] = index
             index = index + 1
-            self.sensors[sensor] = attributes
-            self.previous_measures[sensor] = deque(maxlen=max(attributes.get('times_active_until_considered_stuck', 5), attributes.get('times_inactive_until_considered_empty', 5)))
+            sensors[sensor] = attributes
+            descriptor = SensorDescriptor.for_sensor(sensor, attributes)
+            old = previous.get(sensor, None)
+            if old is not None and old.has_thresholds_of(descriptor):
+                descriptor.state = old.state
+            descriptors[sensor] = descriptor
+
+        stopped = [ sensor for sensor, old in previous.items() if old.pin != -1 and (sensor not in descriptors or not old.samples_like(descriptors[sensor])) ]
+        started = [ sensor for sensor, new in descriptors.items() if new.pin != -1 and (sensor not in previous or not previous[sensor].samples_like(new)) ]
+
+        if self._running:
+            # before the new settings are visible, so the old samplers never use them
+            for sensor in stopped:
+                self.stop_sampler(sensor)
+
+        self._sensors = sensors
+        self._states = { sensor: descriptor.state for sensor, descriptor in descriptors.items() }
+        self._descriptors = descriptors
+
+        if self._running:
+            for sensor in started:
+                self.start_sampler(sensor)
+            logging.getLogger("a2sensor").info(f"Reloaded {self.config_file}: {len(started)} samplers started, {len(stopped)} stopped")
 
     def start(self):
         """
-        Starts reading from the attached sensors.
+        Starts reading from the attached sensors, and watching the configuration file if a reload interval is set.
+        """
+        if self._reload_interval > 0:
+            from .config_watcher import ConfigWatcher
+            ConfigWatcher(self.config_file, self.reload, self.exit_event, self._reload_interval).start()
+        if self.sampler == "scheduler":
+            self.start_scheduler()
+        else:
+            self.start_threads()
+
+    def start_sampler(self, sensorKey:str):
+        """
+        Starts sampling given sensor, while running.
+        :param sensorKey: The key of the sensor.
+        :type sensorKey: str
+        """
+        descriptor = self._descriptors[sensorKey]
+        if self._scheduler is not None:
+            self._scheduler.schedule(sensorKey, descriptor.pin, descriptor.period, descriptor.edge_detect)
+        else:
+            stop_event = threading.Event()
+            self._stop_events[sensorKey] = stop_event
+            thread = threading.Thread(target=self.read_sensor, args=(sensorKey, descriptor.pin, stop_event))
+            self._threads[sensorKey] = thread
+            thread.start()
+
+    def stop_sampler(self, sensorKey:str):
+        """
+        Stops sampling given sensor, while running, waiting for its thread to finish its last sample.
+        :param sensorKey: The key of the sensor.
+        :type sensorKey: str
+        """
+        if self._scheduler is not None:
+            self._scheduler.unschedule(sensorKey)
+        else:
+            stop_event = self._stop_events.pop(sensorKey, None)
+            if stop_event is not None:
+                stop_event.set()
+            thread = self._threads.pop(sensorKey, None)
+            if thread is not None and thread is not threading.current_thread():
+                thread.join()
+        self._last_samples.pop(sensorKey, None)
+
+    def start_scheduler(self):
+        """
+        Reads from the attached sensors using a single GpioScheduler.
+        """
+        from .gpio_scheduler import GpioScheduler
+        scheduler = GpioScheduler(self.gpio, self.sample, self.exit_event)
+        for sensor, descriptor in self.descriptors.items():
+            if descriptor.pin != -1:
+                try:
+                    scheduler.add(sensor, descriptor.pin, descriptor.period, descriptor.edge_detect)
+                except ValueError as error:
+                    logging.getLogger("a2sensor").error(f"Cannot sample {sensor}: {error}")
+        self._scheduler = scheduler
+        self._running = True
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            logging.getLogger("a2sensor").warning("Exiting")
+            self.exit_event.set()
+        finally:
+            self._running = False
+            self.gpio.cleanup()
+
+    def start_threads(self):
+        """
+        Reads from the attached sensors using a thread per sensor.
         """
         # Create and start a thread for each sensor
-        threads = []
-        for sensor in self.sensors:
-            pin = self.sensors[sensor].get('pin', -1)
-            if pin != -1:
-                thread = threading.Thread(target=self.read_sensor, args=(sensor, pin,))
-                threads.append(thread)
-                thread.start()
+        self._running = True
+        for sensor, descriptor in self.descriptors.items():
+            if descriptor.pin != -1:
+                self.start_sampler(sensor)
 
         # Keep the script running
         try:
-            for thread in threads:
-                thread.join()
+            self.exit_event.wait()
         except KeyboardInterrupt:
             logging.getLogger("a2sensor").warning("Exiting")
             self.exit_event.set()
-            for thread in threads:
-                thread.join()
         finally:
-            GPIO.cleanup()
+            self._running = False
+            for thread in list(self._threads.values()):
+                thread.join()
+            self.gpio.cleanup()
 
-    def read_sensor(self, sensorKey:str, pin:int):
+    def read_sensor(self, sensorKey:str, pin:int, stopEvent:threading.Event=None):
         """
         Reads from a sensor.
         :param sensorKey: The key of the sensor.
         :type sensorKey: str
         :param pin: The pin of the sensor.
         :type pin: int
+        :param stopEvent: The event to stop reading this sensor only. Optional.
+        :type stopEvent: threading.Event
         """
+        gpio = self.gpio
+        wait = self.descriptors[sensorKey].period
+        stop_event = stopEvent if stopEvent is not None else threading.Event()
         try:
-            GPIO.setmode(GPIO.BCM)
-            GPIO.setup(pin, GPIO.IN)
-            while not self.exit_event.is_set():
-                value = GPIO.input(pin)
-                previous_values = self.previous_measures[sensorKey]
-                previous_values.append(value)
-                self.callback(self.sensors[sensorKey].get('id', sensorKey), self.sensors[sensorKey].get('name', sensorKey), self.to_status(sensorKey, previous_values))
-                time.sleep(self.sensors[sensorKey].get('wait', 1))
+            gpio.setmode(gpio.BCM)
+            gpio.setup(pin, gpio.IN)
+            while not self.exit_event.is_set() and not stop_event.is_set():
+                self.sample(sensorKey, gpio.input(pin))
+                stop_event.wait(wait)
         except KeyboardInterrupt:
             logging.getLogger("a2sensor").warning("Exiting")
             self.exit_event.set()
 
+    def sample(self, sensorKey:str, value:int):
+        """
+        Processes a value read from a sensor.
+        :param sensorKey: The key of the sensor.
+        :type sensorKey: str
+        :param value: The value read.
+        :type value: int
+        """
+        descriptor = self._descriptors.get(sensorKey, None)
+        if descriptor is None:
+            # removed by a reload, while being sampled
+            return
+        now = time.monotonic()
+        labels = (("sensor", descriptor.id),)
+        metrics = self._metrics
+        metrics.increment("a2sensor_samples_total", labels)
+        last = self._last_samples.get(sensorKey, None)
+        if last is not None:
+            metrics.observe("a2sensor_sampling_jitter_seconds", abs(now - last - descriptor.period), labels)
+        self._last_samples[sensorKey] = now
+        if descriptor.sample_interval:
+            # sampled faster than reported: only the aggregated status, once per wait
+            status = descriptor.state.update(value, now)
+            if status is None:
+                return
+        else:
+            status = descriptor.state.update(value)
+        self._callback(descriptor.id, descriptor.name, status)
+
     def to_status(self, sensorKey:str, previousValues: List[bool]) -> str:
         """
         Converts given values from the sensors into a sensor status.
+        Sampling uses the equivalent, incremental SensorState instead.
         :param sensorKey: The sensor key.
         :type sensorKey: str
         :param previousValues: The previous values.
@@ -0,0 +1,58 @@
+"""
+a2sensor/sensor_collect/log_alert_sink.py
+
+This script defines the LogAlertSink class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from .alert_sink import AlertSink
+import logging
+from typing import Dict, List
+
+class LogAlertSink(AlertSink):
+    """
+    Logs alerts, with their fields as structured fields for the JSON formatter.
+
+    Class name: LogAlertSink
+
+    Responsibilities:
+        - Log alerts.
+
+    Collaborators:
+        - a2sensor.sensor_collect.RulesEngine
+    """
+
+    def __init__(self, level:str="warning"):
+        """
+        Creates a new LogAlertSink instance.
+        :param level: The level of the lines of firing alerts; resolved ones are logged as INFO.
+        :type level: str
+        """
+        super().__init__()
+        self._logger = logging.getLogger("a2sensor")
+        self._level = logging.getLevelName(level.upper())
+        if not isinstance(self._level, int):
+            raise ValueError(f"Unknown log level {level}")
+
+    def send(self, alerts:List[Dict]):
+        """
+        Logs given alerts.
+        :param alerts: The alerts.
+        :type alerts: List[Dict]
+        """
+        for alert in alerts:
+            level = self._level if alert["state"] == "firing" else logging.INFO
+            self._logger.log(level, f"Alert {alert['rule']} {alert['state']}: {alert['message']}", extra={ "alert": alert })
@@ -19,28 +19,44 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import logging
+import os
 import sys
+from typing import Dict
 
 class LoggingConfig:
     """
     Simple logging configuration utility.
 
+    Records go to stdout, either synchronously, or through a queue drained by a background
+    thread, so a slow terminal or journald never blocks the threads that log; and either as
+    text, or as one JSON object per line.
+
     Class name: LoggingConfig
 
     Responsibilities:
         - Configures logging.
 
     Collaborators:
-        - None
+        - a2sensor.sensor_collect.JsonLogFormatter
     """
     _instance = None
 
+    MODES = [ "sync", "queue" ]
+
+    FORMATS = [ "text", "json" ]
+
+    ENVIRONMENT_OPTIONS = [
+        ("LOG_MODE", "mode", str),
+        ("LOG_FORMAT", "logFormat", str),
+    ]
+
     def __init__(self, dateFormat:str="%Y-%m-%d %H:%M:%S %z"):
         """
         Creates a new LoggingConfig instance.
         """
         super().__init__()
         self._date_format = dateFormat
+        self._listener = None
 
     @property
     def date_format(self):
@@ -51,25 +67,49 @@ class LoggingConfig:
         """
         return self._date_format
 
-    def configure_logging(self):
+    @property
+    def listener(self):
+        """
+        Retrieves the thread writing queued records, in "queue" mode.
+        :return: Such listener, or None.
+        :rtype: logging.handlers.QueueListener
+        """
+        return self._listener
+
+    def configure_logging(self, mode:str="sync", logFormat:str="text"):
         """
         Configures the logging system.
+        :param mode: Either "sync", writing each record right away, or "queue", writing them from a background thread.
+        :type mode: str
+        :param logFormat: Either "text" or "json".
+        :type logFormat: str
         """
+        if mode not in self.__class__.MODES:
+            raise ValueError(f"Unknown logging mode {mode}: must be one of {', '.join(self.__class__.MODES)}")
+        if logFormat not in self.__class__.FORMATS:
+            raise ValueError(f"Unknown logging format {logFormat}: must be one of {', '.join(self.__class__.FORMATS)}")
+        from logging.handlers import QueueHandler
+
         level = logging.INFO
         default_logger = logging.getLogger()
         formatter = None
-        for handler in logging.getLogger("gunicorn").handlers:
-            formatter = handler.getFormatter()
-            break
+        if logFormat == "json":
+            from .json_log_formatter import JsonLogFormatter
+            formatter = JsonLogFormatter()
+        else:
+            for handler in logging.getLogger("gunicorn").handlers:
+                formatter = handler.getFormatter()
+                break
         if formatter is None:
             formatter = logging.Formatter(
                 "[%(asctime)s] [%(name)s] [%(levelname)s] %(message)s",
                 datefmt=self.date_format,
             )
 
+        self.stop_listener()
         handlers_to_remove = []
         for handler in default_logger.handlers:
-            if isinstance(handler, logging.StreamHandler):
+            if isinstance(handler, (logging.StreamHandler, QueueHandler)):
                 handlers_to_remove.append(handler)
         for handler in handlers_to_remove:
             default_logger.removeHandler(handler)
@@ -78,9 +118,35 @@ class LoggingConfig:
         console_handler.setLevel(level)
         console_handler.setFormatter(formatter)
         default_logger.setLevel(level)
-        default_logger.addHandler(console_handler)
+        if mode == "queue":
+            import atexit
+            import copy
+            from logging.handlers import QueueListener
+            import queue
+
+            class Handler(QueueHandler):
+                def prepare(self, record):
+                    # formatting is left to the listener thread: only the arguments and
+                    # the traceback, which may refer to objects that change, are resolved here
+                    result = copy.copy(record)
+                    result.msg = record.getMessage()
+                    result.args = None
+                    if record.exc_info and not record.exc_text:
+                        result.exc_text = formatter.formatException(record.exc_info)
+                    result.exc_info = None
+                    return result
+
+            records = queue.SimpleQueue()
+            self._listener = QueueListener(records, console_handler, respect_handler_level=True)
+            self._listener.start()
+            # written out at exit, after whatever logs while shutting down
+            atexit.register(self.stop_listener)
+            default_logger.addHandler(Handler(records))
+        else:
+            default_logger.addHandler(console_handler)
         for handler in default_logger.handlers:
-            handler.setFormatter(formatter)
+            if not isinstance(handler, QueueHandler):
+                handler.setFormatter(formatter)
         default_level = default_logger.getEffectiveLevel()
 
         a2sensor_logger = logging.getLogger("a2sensor")
@@ -88,6 +154,28 @@ class LoggingConfig:
         for handler in a2sensor_logger.handlers:
             handler.setFormatter(formatter)
 
+    def stop_listener(self):
+        """
+        Writes any queued record, and stops the background thread, if any.
+        """
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+    @classmethod
+    def options_from_environment(cls) -> Dict:
+        """
+        Retrieves the configure_logging() options from environment variables.
+        :return: The options found.
+        :rtype: Dict
+        """
+        result = {}
+        for variable, option, kind in cls.ENVIRONMENT_OPTIONS:
+            value = os.environ.get(variable, None)
+            if value is not None:
+                result[option] = kind(value)
+        return result
+
     @classmethod
     def instance(cls):
         """
@@ -98,5 +186,3 @@ class LoggingConfig:
         if cls._instance is None:
             cls._instance = cls()
         return cls._instance
-
-LoggingConfig.instance().configure_logging()
@@ -0,0 +1,205 @@
+"""
+a2sensor/sensor_collect/measure.py
+
+This script defines the Measure class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from datetime import datetime
+import math
+import time
+from .timestamp_formatter import TimestampFormatter
+from typing import Dict
+
+class Measure():
+    """
+    Represents a single reading of a sensor.
+
+    Class name: Measure
+
+    Responsibilities:
+        - Hold the sensor, the status and the time of a reading.
+        - Convert itself from and to the stored JSON layout.
+
+    Collaborators:
+        - None
+    """
+
+    # the index of each status is its compact code
+    STATUSES = [ "ok", "empty", "stuck" ]
+    STATUS_CODES = { status: code for code, status in enumerate(STATUSES) }
+
+    # the epochs, in microseconds, whose local dates have four-digit years: from 1970 to 9999-12-31
+    MIN_EPOCH = 0
+    MAX_EPOCH = 253402214400000000
+
+    __slots__ = ("_sensor_id", "_sensor_name", "_status", "_epoch", "_count")
+
+    def __init__(self, sensorId:str, sensorName:str, status:str, epoch:int=None, count:int=1):
+        """
+        Creates a new Measure instance.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :param sensorName: The name of the sensor.
+        :type sensorName: str
+        :param status: The status read.
+        :type status: str
+        :param epoch: The time of the reading, in microseconds since the epoch. Defaults to now.
+        :type epoch: int
+        :param count: The number of consecutive readings with the same status this measure stands for, starting at epoch.
+        :type count: int
+        """
+        super().__init__()
+        self._sensor_id = sensorId
+        self._sensor_name = sensorName
+        self._status = status
+        self._epoch = epoch if epoch is not None else time.time_ns() // 1000
+        self._count = count
+
+    @property
+    def sensor_id(self) -> str:
+        """
+        Retrieves the id of the sensor.
+        :return: Such id.
+        :rtype: str
+        """
+        return self._sensor_id
+
+    @property
+    def sensor_name(self) -> str:
+        """
+        Retrieves the name of the sensor.
+        :return: Such name.
+        :rtype: str
+        """
+        return self._sensor_name
+
+    @property
+    def status(self) -> str:
+        """
+        Retrieves the status.
+        :return: Such status.
+        :rtype: str
+        """
+        return self._status
+
+    @property
+    def epoch(self) -> int:
+        """
+        Retrieves the time of the reading, in microseconds since the epoch.
+        :return: Such time.
+        :rtype: int
+        """
+        return self._epoch
+
+    @property
+    def count(self) -> int:
+        """
+        Retrieves the number of consecutive readings this measure stands for.
+        :return: Such number.
+        :rtype: int
+        """
+        return self._count
+
+    @property
+    def timestamp(self) -> datetime:
+        """
+        Retrieves the time of the reading, as a local datetime.
+        :return: Such datetime.
+        :rtype: datetime
+        """
+        return datetime.fromtimestamp(self._epoch // 1000000).replace(microsecond=self._epoch % 1000000)
+
+    def to_dict(self, dateFormat:str) -> Dict:
+        """
+        Converts this measure to the stored JSON layout.
+        :param dateFormat: The format of the timestamp.
+        :type dateFormat: str
+        :return: The JSON-compatible dictionary.
+        :rtype: Dict
+        """
+        value = {}
+        value['status'] = self.status
+        value['timestamp'] = TimestampFormatter.for_format(dateFormat).format(self._epoch)
+        if self.count != 1:
+            value['count'] = self.count
+        data = {}
+        data['id'] = self.sensor_id
+        data['name'] = self.sensor_name
+        data['value'] = value
+
+        return data
+
+    @classmethod
+    def from_dict(cls, data:Dict, epoch:int=None):
+        """
+        Builds a Measure from the stored JSON layout.
+        :param data: The JSON-compatible dictionary.
+        :type data: Dict
+        :param epoch: The time of the reading, if it's not part of the dictionary.
+        :type epoch: int
+        :return: The measure.
+        :rtype: a2sensor.sensor_collect.Measure
+        """
+        value = data.get('value', {})
+        return cls(data.get('id', None), data.get('name', None), value.get('status', None), value.get('epoch', epoch), value.get('count', 1))
+
+    @classmethod
+    def epoch_of(cls, moment:datetime) -> int:
+        """
+        Converts given datetime to microseconds since the epoch.
+        :param moment: The datetime.
+        :type moment: datetime
+        :return: The number of microseconds.
+        :rtype: int
+        """
+        return int(moment.replace(microsecond=0).timestamp()) * 1000000 + moment.microsecond
+
+    @classmethod
+    def parse_epoch(cls, text:str) -> int:
+        """
+        Parses a point in time, either as seconds since the epoch or as an ISO 8601 date.
+        Times out of the range from MIN_EPOCH to MAX_EPOCH, infinities included, are clamped to it.
+        :param text: The text to parse.
+        :type text: str
+        :return: The time, in microseconds since the epoch.
+        :rtype: int
+        :raise ValueError: If the text is not valid, or NaN.
+        """
+        try:
+            seconds = float(text)
+        except ValueError:
+            moment = datetime.fromisoformat(text)
+            try:
+                result = cls.epoch_of(moment)
+            except (ValueError, OverflowError, OSError):
+                # too far in the past or future for the platform
+                return cls.MIN_EPOCH if moment.year < 1970 else cls.MAX_EPOCH
+        else:
+            if math.isnan(seconds):
+                raise ValueError(f"Invalid time: {text}")
+            if math.isinf(seconds):
+                return cls.MAX_EPOCH if seconds > 0 else cls.MIN_EPOCH
+            result = int(seconds * 1000000)
+        return min(max(result, cls.MIN_EPOCH), cls.MAX_EPOCH)
+
+    def __repr__(self) -> str:
+        """
+        Provides a textual representation of this instance.
+        :return: Such text.
+        :rtype: str
+        """
+        return f"Measure({self.sensor_id!r}, {self.sensor_name!r}, {self.status!r}, {self.epoch}, {self.count})"
@@ -0,0 +1,213 @@
+"""
+a2sensor/sensor_collect/measure_storage.py
+
+This script defines the MeasureStorage class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from .measure import Measure
+import os
+from typing import Dict, Iterator, List
+
+class MeasureStorage():
+    """
+    Base class of the storage engines behind the Server.
+
+    Class name: MeasureStorage
+
+    Responsibilities:
+        - Persist measures.
+        - Read persisted measures back.
+
+    Collaborators:
+        - a2sensor.sensor_collect.Measure
+    """
+
+    BACKENDS = [ "segmented", "binary", "json" ]
+
+    def __init__(self, folder:str, dateFormat:str):
+        """
+        Creates a new MeasureStorage instance.
+        :param folder: The root folder of the storage.
+        :type folder: str
+        :param dateFormat: The format of the timestamps in the stored records.
+        :type dateFormat: str
+        """
+        super().__init__()
+        self._folder = folder
+        self._date_format = dateFormat
+
+    @property
+    def folder(self) -> str:
+        """
+        Retrieves the root folder of the storage.
+        :return: Such folder.
+        :rtype: str
+        """
+        return self._folder
+
+    @property
+    def date_format(self) -> str:
+        """
+        Retrieves the format of the timestamps in the stored records.
+        :return: Such format.
+        :rtype: str
+        """
+        return self._date_format
+
+    def sensor_folder(self, sensorId:str) -> str:
+        """
+        Retrieves the folder of given sensor.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :return: The folder.
+        :rtype: str
+        """
+        return os.path.join(self.folder, sensorId)
+
+    def sensor_ids(self) -> List[str]:
+        """
+        Retrieves the ids of the sensors with stored measures.
+        :return: Such ids.
+        :rtype: List[str]
+        """
+        if not os.path.isdir(self.folder):
+            return []
+        return sorted(entry.name for entry in os.scandir(self.folder) if entry.is_dir() and not entry.name.startswith("."))
+
+    def register_sensors(self, sensors:Dict[str, Dict]):
+        """
+        Lets the storage know about the local sensors in advance.
+        :param sensors: The sensors, as in LocalSensors.sensors.
+        :type sensors: Dict[str, Dict]
+        """
+        pass
+
+    def append(self, measure:Measure):
+        """
+        Persists given measure.
+        :param measure: The measure.
+        :type measure: a2sensor.sensor_collect.Measure
+        """
+        raise NotImplementedError()
+
+    def append_all(self, measures:List[Measure]):
+        """
+        Persists given measures.
+        :param measures: The measures.
+        :type measures: List[a2sensor.sensor_collect.Measure]
+        """
+        for measure in measures:
+            self.append(measure)
+
+    def read(self, sensorId:str) -> Iterator[Measure]:
+        """
+        Reads the measures of given sensor, oldest first.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :return: The measures.
+        :rtype: Iterator[a2sensor.sensor_collect.Measure]
+        """
+        raise NotImplementedError()
+
+    def query(self, sensorId:str, start:int=None, end:int=None) -> Iterator[Measure]:
+        """
+        Reads the measures of given sensor within a time range, oldest first.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :param start: The first time to include, in microseconds since the epoch. Optional.
+        :type start: int
+        :param end: The first time to exclude, in microseconds since the epoch. Optional.
+        :type end: int
+        :return: The measures.
+        :rtype: Iterator[a2sensor.sensor_collect.Measure]
+        """
+        for measure in self.read(sensorId):
+            if start is not None and measure.epoch < start:
+                continue
+            if end is not None and measure.epoch >= end:
+                break
+            yield measure
+
+    def latest(self, sensorId:str) -> Measure:
+        """
+        Reads the last stored measure of given sensor.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :return: The measure, or None if there's none.
+        :rtype: a2sensor.sensor_collect.Measure
+        """
+        result = None
+        for result in self.read(sensorId):
+            pass
+        return result
+
+    def delete_before(self, sensorId:str, epoch:int) -> int:
+        """
+        Deletes the measures of given sensor older than given time, as far as the storage layout allows.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :param epoch: The time, in microseconds since the epoch.
+        :type epoch: int
+        :return: The number of files deleted.
+        :rtype: int
+        """
+        return 0
+
+    def flush(self):
+        """
+        Writes any pending measure to disk.
+        """
+        pass
+
+    def close(self):
+        """
+        Flushes pending measures and releases any resource.
+        """
+        self.flush()
+
+    @classmethod
+    def for_backend(cls, backend:str, folder:str, dateFormat:str, flushInterval:float=1.0, segmentMaxBytes:int=4194304, segmentMaxAge:float=3600.0):
+        """
+        Builds the storage for given backend.
+        :param backend: The backend: "segmented" (NDJSON segments), "binary" (binary segments) or "json" (legacy, one file per measure).
+        :type backend: str
+        :param folder: The root folder of the storage.
+        :type folder: str
+        :param dateFormat: The format of the timestamps in the stored records.
+        :type dateFormat: str
+        :param flushInterval: The seconds between flushes of the segmented backend.
+        :type flushInterval: float
+        :param segmentMaxBytes: The size after which the segmented backend rolls a segment.
+        :type segmentMaxBytes: int
+        :param segmentMaxAge: The seconds after which the segmented backend rolls a segment.
+        :type segmentMaxAge: float
+        :return: The storage.
+        :rtype: a2sensor.sensor_collect.MeasureStorage
+        """
+        if backend == "json":
+            from .json_file_storage import JsonFileStorage
+            return JsonFileStorage(folder, dateFormat)
+        if backend == "segmented":
+            from .segmented_storage import SegmentedStorage
+            return SegmentedStorage(folder, dateFormat, flushInterval, segmentMaxBytes, segmentMaxAge)
+        if backend == "binary":
+            from .binary_codec import BinaryCodec
+            from .segmented_storage import SegmentedStorage
+            from .sensor_dictionary import SensorDictionary
+            codec = BinaryCodec(SensorDictionary(os.path.join(folder, "sensors.json")))
+            return SegmentedStorage(folder, dateFormat, flushInterval, segmentMaxBytes, segmentMaxAge, codec=codec)
+        raise ValueError(f"Unknown storage backend {backend}: must be one of {', '.join(cls.BACKENDS)}")
@@ -0,0 +1,267 @@
+"""
+a2sensor/sensor_collect/measure_validator.py
+
+This script defines the MeasureValidator class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from .json_codec import JsonCodec
+from .measure import Measure
+from .metrics import Metrics
+import re
+from typing import Dict, List, Tuple
+import zlib
+
+class MeasureValidator():
+    """
+    Validates the measures sent by remote sensors.
+
+    Class name: MeasureValidator
+
+    The usual requests take fast paths: bodies of single measures with just a sensorName and
+    a valid sensorStatus are matched by precompiled expressions instead of being decoded, and
+    valid batch items are recognized with plain type checks. Anything else goes through the
+    full validation, which builds the error messages.
+
+    Responsibilities:
+        - Parse the body of a single measure.
+        - Check the sensorName and sensorStatus attributes of a measure.
+        - Check that sensor ids are safe to use as folder names.
+        - Check the items of a batch of measures.
+        - Decompress the body of a batch.
+        - Build the response to a batch.
+        - Count the failures by reason.
+
+    Collaborators:
+        - a2sensor.sensor_collect.JsonCodec
+        - a2sensor.sensor_collect.Metrics
+    """
+
+    STATUSES = [ "empty", "ok", "stuck" ]
+
+    VALID_STATUSES = frozenset(STATUSES)
+
+    # {"sensorName": "<no escapes nor control characters>", "sensorStatus": "<valid status>"}, in either order
+    _NAME = rb'"sensorName"[ \t\n\r]*:[ \t\n\r]*"(?P<name>[^"\\\x00-\x1f]*)"'
+    _STATUS = rb'"sensorStatus"[ \t\n\r]*:[ \t\n\r]*"(?P<status>empty|ok|stuck)"'
+    MEASURE_BODIES = (
+        re.compile(rb'[ \t\n\r]*\{[ \t\n\r]*' + _NAME + rb'[ \t\n\r]*,[ \t\n\r]*' + _STATUS + rb'[ \t\n\r]*\}[ \t\n\r]*\Z'),
+        re.compile(rb'[ \t\n\r]*\{[ \t\n\r]*' + _STATUS + rb'[ \t\n\r]*,[ \t\n\r]*' + _NAME + rb'[ \t\n\r]*\}[ \t\n\r]*\Z'),
+    )
+
+    # the largest count a record holds (uint32 in binary segments)
+    MAX_COUNT = 4294967295
+
+    # the result of each valid item of a batch
+    SUCCESS = { "status": "success" }
+
+    # the largest body accepted once decompressed
+    MAX_DECODED_SIZE = 16777216
+
+    @classmethod
+    def parse_measure(cls, body:bytes):
+        """
+        Parses the body of a single measure.
+        :param body: The body.
+        :type body: bytes
+        :return: The decoded JSON value, a dictionary unless the body is wrong.
+        :rtype: Any
+        :raise ValueError: If the body is not valid JSON.
+        """
+        for expression in cls.MEASURE_BODIES:
+            match = expression.match(body)
+            if match is not None:
+                try:
+                    return { "sensorName": match.group("name").decode("utf-8"), "sensorStatus": match.group("status").decode("ascii") }
+                except UnicodeDecodeError:
+                    break
+        return JsonCodec.instance().loads(body)
+
+    @classmethod
+    def validate(cls, sensorName:str, sensorStatus:str) -> List[str]:
+        """
+        Validates the attributes of a measure.
+        :param sensorName: The name of the sensor.
+        :type sensorName: str
+        :param sensorStatus: The status of the sensor.
+        :type sensorStatus: str
+        :return: The error messages, if any.
+        :rtype: List[str]
+        """
+        messages = []
+        if sensorName is None:
+            messages.append("Missing 'sensorName' attribute")
+            cls.count_failure("missing_sensor_name")
+        elif not isinstance(sensorName, str):
+            messages.append(f"Provided 'sensorName' is {sensorName} and must be a string")
+            cls.count_failure("invalid_sensor_name")
+        if sensorStatus is None:
+            messages.append("Missing 'sensorStatus' attribute")
+            cls.count_failure("missing_sensor_status")
+        elif not (isinstance(sensorStatus, str) and sensorStatus in cls.VALID_STATUSES):
+            messages.append(f"Provided 'sensorStatus' is {sensorStatus} and must be one of 'empty', 'ok' or 'stuck'")
+            cls.count_failure("invalid_sensor_status")
+        return messages
+
+    @classmethod
+    def is_valid_sensor_id(cls, sensorId) -> bool:
+        """
+        Checks whether given sensor id is safe to use as the name of its folder: not empty,
+        not starting with a dot (hidden folders like .uplink belong to the server), and without
+        separators, parent references nor NUL characters.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :return: True in such case.
+        :rtype: bool
+        """
+        return type(sensorId) is str and sensorId != "" and sensorId[0] != "." and ".." not in sensorId \
+            and "/" not in sensorId and "\\" not in sensorId and "\x00" not in sensorId
+
+    @classmethod
+    def validate_sensor_id(cls, sensorId) -> List[str]:
+        """
+        Validates the id of a sensor.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :return: The error messages, if any.
+        :rtype: List[str]
+        """
+        if not isinstance(sensorId, str):
+            cls.count_failure("missing_sensor_id")
+            return [ "Missing 'sensorId' attribute" ]
+        if not cls.is_valid_sensor_id(sensorId):
+            cls.count_failure("invalid_sensor_id")
+            return [ f"Provided 'sensorId' is {sensorId} and must be a non-empty name, not starting with '.' nor containing '/', '\\', '..' or NUL characters" ]
+        return []
+
+    @classmethod
+    def validate_item(cls, item:Dict) -> List[str]:
+        """
+        Validates an item of a batch, which also carries the sensorId and, optionally, its epoch and count.
+        :param item: The item.
+        :type item: Dict
+        :return: The error messages, if any.
+        :rtype: List[str]
+        """
+        if not isinstance(item, dict):
+            cls.count_failure("not_an_object")
+            return [ "Each measure must be a JSON object" ]
+        messages = cls.validate_sensor_id(item.get('sensorId', None))
+        messages.extend(cls.validate(item.get('sensorName', None), item.get('sensorStatus', None)))
+        epoch = item.get('epoch', None)
+        if epoch is not None and (not isinstance(epoch, int) or isinstance(epoch, bool) or not Measure.MIN_EPOCH <= epoch <= Measure.MAX_EPOCH):
+            messages.append(f"Provided 'epoch' is {epoch} and must be an integer number of microseconds, from {Measure.MIN_EPOCH} to {Measure.MAX_EPOCH}")
+            cls.count_failure("invalid_epoch")
+        count = item.get('count', None)
+        if count is not None and (not isinstance(count, int) or isinstance(count, bool) or not 1 <= count <= cls.MAX_COUNT):
+            messages.append(f"Provided 'count' is {count} and must be a positive integer, up to {cls.MAX_COUNT}")
+            cls.count_failure("invalid_count")
+        return messages
+
+    @classmethod
+    def is_valid_item(cls, item) -> bool:
+        """
+        Checks whether an item of a batch is valid, without building messages nor counting failures.
+        :param item: The item.
+        :type item: Dict
+        :return: True in such case.
+        :rtype: bool
+        """
+        if type(item) is not dict:
+            return False
+        status = item.get('sensorStatus', None)
+        epoch = item.get('epoch', None)
+        count = item.get('count', None)
+        return cls.is_valid_sensor_id(item.get('sensorId', None)) and type(item.get('sensorName', None)) is str \
+            and type(status) is str and status in cls.VALID_STATUSES \
+            and (epoch is None or (type(epoch) is int and Measure.MIN_EPOCH <= epoch <= Measure.MAX_EPOCH)) \
+            and (count is None or (type(count) is int and 1 <= count <= cls.MAX_COUNT))
+
+    @classmethod
+    def count_failure(cls, reason:str):
+        """
+        Counts a validation failure.
+        :param reason: The reason, e.g. "missing_sensor_name".
+        :type reason: str
+        """
+        Metrics.instance().increment("a2sensor_validation_failures_total", (("reason", reason),))
+
+    @classmethod
+    def decode_body(cls, body:bytes, contentEncoding:str, maxSize:int=None) -> Tuple[int, str, bytes]:
+        """
+        Decompresses the body of a batch, according to its Content-Encoding: either none (identity) or gzip.
+        :param body: The body.
+        :type body: bytes
+        :param contentEncoding: The Content-Encoding header, if any.
+        :type contentEncoding: str
+        :param maxSize: The largest body accepted once decompressed. Defaults to MAX_DECODED_SIZE.
+        :type maxSize: int
+        :return: The HTTP status code (200 if the body could be decoded), the error message if not, and the body.
+        :rtype: Tuple[int, str, bytes]
+        """
+        encoding = (contentEncoding or "identity").strip().lower()
+        if encoding == "identity":
+            return 200, None, body
+        if encoding not in [ "gzip", "x-gzip" ]:
+            cls.count_failure("invalid_encoding")
+            return 415, f"Unsupported Content-Encoding {contentEncoding}: must be gzip", None
+        limit = maxSize or cls.MAX_DECODED_SIZE
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            # one byte past the limit, to tell whether it's exceeded
+            result = decompressor.decompress(body, limit + 1)
+        except zlib.error:
+            cls.count_failure("invalid_encoding")
+            return 400, "Invalid gzip body", None
+        if len(result) > limit:
+            return 413, "The request body is too large", None
+        if not decompressor.eof:
+            cls.count_failure("invalid_encoding")
+            return 400, "Invalid gzip body", None
+        return 200, None, result
+
+    @classmethod
+    def validate_batch(cls, items:List) -> Tuple[int, Dict, List[Measure]]:
+        """
+        Validates the items of a batch, and builds the response: 200 if all are valid, 207 if some are, 400 otherwise.
+        :param items: The items.
+        :type items: List
+        :return: The HTTP status code, the response body with a result per item, and the valid measures.
+        :rtype: Tuple[int, Dict, List[a2sensor.sensor_collect.Measure]]
+        """
+        results = []
+        measures = []
+        for item in items:
+            messages = None if cls.is_valid_item(item) else cls.validate_item(item)
+            if messages:
+                results.append({"status": "invalid request", "messages": messages})
+            else:
+                results.append(cls.SUCCESS)
+                measures.append(Measure(item['sensorId'], item['sensorName'], item['sensorStatus'], item.get('epoch', None), item.get('count', 1)))
+
+        result = {}
+        if len(measures) == len(items):
+            status_code = 200
+            result["status"] = "success"
+        elif measures:
+            status_code = 207
+            result["status"] = "partial success"
+        else:
+            status_code = 400
+            result["status"] = "invalid request"
+        result["results"] = results
+
+        return status_code, result, measures
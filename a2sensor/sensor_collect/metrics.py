@@ -0,0 +1,252 @@
+"""
+a2sensor/sensor_collect/metrics.py
+
+This script defines the Metrics class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from bisect import bisect_left
+import threading
+from typing import Callable, List, Tuple
+
+class Metrics():
+    """
+    Keeps the counters, gauges and histograms of the collector, and renders them in the Prometheus text format.
+
+    Recording is a dictionary lookup and a few additions under a lock, cheap enough to leave on.
+    Labels are tuples of (name, value) pairs, and must have a bounded number of values:
+    sensor ids, routes or validation reasons, never raw paths.
+
+    Class name: Metrics
+
+    Responsibilities:
+        - Count events, and observe durations into fixed buckets.
+        - Render every metric in the Prometheus text exposition format.
+
+    Collaborators:
+        - None
+    """
+    _instance = None
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        """
+        Creates a new Metrics instance, with the collector metrics described.
+        """
+        super().__init__()
+        self._lock = threading.Lock()
+        # name -> (type, help, buckets)
+        self._descriptions = {}
+        # (name, labels) -> value, or [ bucket counts..., sum, count ] for histograms
+        self._values = {}
+        # name -> (help, function returning the value)
+        self._gauges = {}
+        self.describe("a2sensor_samples_total", "counter", "Samples read from local sensors.")
+        self.describe("a2sensor_sampling_jitter_seconds", "histogram", "Deviation of the time between samples of a local sensor from its configured wait.")
+        self.describe("a2sensor_sample_persist_seconds", "histogram", "Time from a measure being taken to being written to the storage.", (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+        self.describe("a2sensor_storage_write_seconds", "histogram", "Duration of storage writes.")
+        self.describe("a2sensor_storage_flush_seconds", "histogram", "Duration of storage flushes.")
+        self.describe("a2sensor_http_request_seconds", "histogram", "Duration of HTTP requests, by method, route and status code.")
+        self.describe("a2sensor_validation_failures_total", "counter", "Measures rejected, by reason.")
+        self.describe("a2sensor_uplink_sent_total", "counter", "Measures accepted by the upstream collector.")
+        self.describe("a2sensor_uplink_rejected_total", "counter", "Measures the upstream collector rejected as invalid.")
+        self.describe("a2sensor_uplink_failures_total", "counter", "Failed attempts to forward measures upstream.")
+        self.describe("a2sensor_alerts_total", "counter", "Alerts raised or resolved, by rule and state.")
+        self.describe("a2sensor_alert_sink_failures_total", "counter", "Failed deliveries of alerts, by sink.")
+        self.describe("a2sensor_rules_errors_total", "counter", "Errors evaluating the alert rules, by rule.")
+
+    def describe(self, name:str, kind:str, help:str, buckets:Tuple[float, ...]=None):
+        """
+        Declares a metric.
+        :param name: The metric name.
+        :type name: str
+        :param kind: Either "counter" or "histogram".
+        :type kind: str
+        :param help: The description.
+        :type help: str
+        :param buckets: The upper bounds of the buckets, for histograms. Defaults to LATENCY_BUCKETS.
+        :type buckets: Tuple[float, ...]
+        """
+        self._descriptions[name] = (kind, help, tuple(buckets or self.__class__.LATENCY_BUCKETS) if kind == "histogram" else None)
+
+    def gauge(self, name:str, help:str, function:Callable[[], float]):
+        """
+        Declares a gauge, whose value is retrieved when rendering.
+        :param name: The metric name.
+        :type name: str
+        :param help: The description.
+        :type help: str
+        :param function: The function retrieving the value.
+        :type function: Callable[[], float]
+        """
+        self._gauges[name] = (help, function)
+
+    def increment(self, name:str, labels:Tuple[Tuple[str, str], ...]=(), amount:float=1):
+        """
+        Increments a counter.
+        :param name: The metric name.
+        :type name: str
+        :param labels: The labels, as (name, value) pairs.
+        :type labels: Tuple[Tuple[str, str], ...]
+        :param amount: The increment.
+        :type amount: float
+        """
+        key = (name, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def observe(self, name:str, value:float, labels:Tuple[Tuple[str, str], ...]=()):
+        """
+        Adds a value to a histogram.
+        :param name: The metric name.
+        :type name: str
+        :param value: The value, usually in seconds.
+        :type value: float
+        :param labels: The labels, as (name, value) pairs.
+        :type labels: Tuple[Tuple[str, str], ...]
+        """
+        key = (name, labels)
+        with self._lock:
+            counts = self._values.get(key, None)
+            if counts is None:
+                counts = self._new_histogram(key)
+            # bucket counts are kept per bucket, and accumulated when rendering
+            counts[bisect_left(self._descriptions[name][2], value)] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def observe_all(self, name:str, values:List[float], labels:Tuple[Tuple[str, str], ...]=()):
+        """
+        Adds several values to a histogram, taking the lock once.
+        :param name: The metric name.
+        :type name: str
+        :param values: The values.
+        :type values: List[float]
+        :param labels: The labels, as (name, value) pairs.
+        :type labels: Tuple[Tuple[str, str], ...]
+        """
+        buckets = self._descriptions[name][2]
+        key = (name, labels)
+        with self._lock:
+            counts = self._values.get(key, None)
+            if counts is None:
+                counts = self._new_histogram(key)
+            for value in values:
+                counts[bisect_left(buckets, value)] += 1
+                counts[-2] += value
+            counts[-1] += len(values)
+
+    def _new_histogram(self, key:Tuple) -> List:
+        """
+        Adds the counts of a histogram. Must be called with the lock held.
+        :param key: The metric name and labels.
+        :type key: Tuple
+        :return: The bucket counts, including +Inf, followed by the sum and the count.
+        :rtype: List
+        """
+        result = [ 0 ] * (len(self._descriptions[key[0]][2]) + 3)
+        self._values[key] = result
+        return result
+
+    def value(self, name:str, labels:Tuple[Tuple[str, str], ...]=()):
+        """
+        Retrieves the current value of a counter, or the [ bucket counts..., sum, count ] of a histogram.
+        :param name: The metric name.
+        :type name: str
+        :param labels: The labels, as (name, value) pairs.
+        :type labels: Tuple[Tuple[str, str], ...]
+        :return: Such value, or None if never recorded.
+        :rtype: object
+        """
+        with self._lock:
+            result = self._values.get((name, labels), None)
+            return list(result) if isinstance(result, list) else result
+
+    @classmethod
+    def format_labels(cls, labels:Tuple[Tuple[str, str], ...]) -> str:
+        """
+        Formats labels for the text exposition format.
+        :param labels: The labels, as (name, value) pairs.
+        :type labels: Tuple[Tuple[str, str], ...]
+        :return: The labels between braces, or an empty string if none.
+        :rtype: str
+        """
+        if not labels:
+            return ""
+        escaped = (f'{name}="' + str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") + '"' for name, value in labels)
+        return "{" + ",".join(escaped) + "}"
+
+    @classmethod
+    def format_value(cls, value:float) -> str:
+        """
+        Formats a sample value.
+        :param value: The value.
+        :type value: float
+        :return: The formatted value.
+        :rtype: str
+        """
+        if value == float("inf"):
+            return "+Inf"
+        return repr(value) if isinstance(value, float) else str(value)
+
+    def render(self) -> str:
+        """
+        Renders every metric in the Prometheus text exposition format.
+        :return: The text.
+        :rtype: str
+        """
+        with self._lock:
+            values = { key: (list(value) if isinstance(value, list) else value) for key, value in self._values.items() }
+        by_name = {}
+        for (name, labels), value in sorted(values.items(), key=lambda item: item[0]):
+            by_name.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name, (kind, help, buckets) in sorted(self._descriptions.items()):
+            samples = by_name.get(name, [])
+            if not samples:
+                continue
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if kind != "histogram":
+                    lines.append(f"{name}{self.format_labels(labels)} {self.format_value(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + (float("inf"),), value):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{self.format_labels(labels + (('le', self.format_value(float(bound))),))} {cumulative}")
+                lines.append(f"{name}_sum{self.format_labels(labels)} {self.format_value(float(value[-2]))}")
+                lines.append(f"{name}_count{self.format_labels(labels)} {value[-1]}")
+        for name, (help, function) in sorted(self._gauges.items()):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {self.format_value(function())}")
+        return "\n".join(lines) + "\n"
+
+    @classmethod
+    def instance(cls):
+        """
+        Retrieves the singleton instance.
+        :return: Such instance.
+        :rtype: a2sensor.sensor_collect.Metrics
+        """
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
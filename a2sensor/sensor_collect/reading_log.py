@@ -0,0 +1,159 @@
+"""
+a2sensor/sensor_collect/reading_log.py
+
+This script defines the ReadingLog class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import logging
+from .measure import Measure
+import threading
+import time
+from typing import Callable, List
+
+class ReadingLog():
+    """
+    Decides which readings get an INFO line, so per-reading logging stays cheap at high rates.
+
+    Readings can be restricted to status transitions, sampled (one in every N), and rate-limited
+    to a number of lines per second; readings left out by the rate limit are counted, and
+    reported in a single line at most once a second. Each line carries the sensor_id,
+    sensor_name and status as structured fields, for the JSON formatter.
+
+    Class name: ReadingLog
+
+    Responsibilities:
+        - Log the readings worth logging.
+
+    Collaborators:
+        - a2sensor.sensor_collect.Server
+    """
+
+    def __init__(self, logger:logging.Logger, transitionsOnly:bool=False, rate:float=0, sample:int=1, clock:Callable[[], float]=time.monotonic):
+        """
+        Creates a new ReadingLog instance.
+        :param logger: The logger.
+        :type logger: logging.Logger
+        :param transitionsOnly: Whether to log only readings whose status differs from the previous one of the sensor.
+        :type transitionsOnly: bool
+        :param rate: The most lines per second. Zero means no limit.
+        :type rate: float
+        :param sample: Log one in every this many readings.
+        :type sample: int
+        :param clock: The monotonic clock, in seconds.
+        :type clock: Callable[[], float]
+        """
+        super().__init__()
+        self._logger = logger
+        self._transitions_only = transitionsOnly
+        self._rate = rate
+        self._sample = max(1, sample)
+        self._clock = clock
+        self._statuses = {}
+        self._seen = 0
+        # a bucket of one second worth of lines, or a single one
+        self._capacity = max(1, rate)
+        self._tokens = self._capacity
+        self._refilled = clock()
+        self._suppressed = 0
+        self._reported = self._refilled
+        self._lock = threading.Lock()
+
+    @property
+    def transitions_only(self) -> bool:
+        """
+        Retrieves whether only status transitions are logged.
+        :return: Such flag.
+        :rtype: bool
+        """
+        return self._transitions_only
+
+    @property
+    def rate(self) -> float:
+        """
+        Retrieves the most lines per second, or zero if unlimited.
+        :return: Such rate.
+        :rtype: float
+        """
+        return self._rate
+
+    @property
+    def sample(self) -> int:
+        """
+        Retrieves how many readings there are for each one logged.
+        :return: Such number.
+        :rtype: int
+        """
+        return self._sample
+
+    @property
+    def suppressed(self) -> int:
+        """
+        Retrieves the readings left out by the rate limit, not reported yet.
+        :return: Such number.
+        :rtype: int
+        """
+        return self._suppressed
+
+    def _allow(self) -> bool:
+        """
+        Takes a token of the rate limit, if any is left. Must be called with the lock held.
+        :return: True if a line can be logged.
+        :rtype: bool
+        """
+        now = self._clock()
+        self._tokens = min(self._capacity, self._tokens + (now - self._refilled) * self._rate)
+        self._refilled = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        self._suppressed += 1
+        return False
+
+    def log(self, measures:List[Measure]):
+        """
+        Logs the readings worth logging among given ones.
+        :param measures: The measures.
+        :type measures: List[a2sensor.sensor_collect.Measure]
+        """
+        logger = self._logger
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        lines = []
+        with self._lock:
+            for measure in measures:
+                if self._transitions_only:
+                    if self._statuses.get(measure.sensor_id, None) == measure.status:
+                        continue
+                    self._statuses[measure.sensor_id] = measure.status
+                if self._sample > 1:
+                    self._seen += 1
+                    if self._seen % self._sample != 0:
+                        continue
+                if self._rate > 0:
+                    allowed = self._allow()
+                    if self._suppressed and self._refilled - self._reported >= 1:
+                        lines.append(self._suppressed)
+                        self._suppressed = 0
+                        self._reported = self._refilled
+                    if not allowed:
+                        continue
+                lines.append(measure)
+        for line in lines:
+            if isinstance(line, int):
+                logger.info("%d readings not logged due to the rate limit", line, extra={ "suppressed": line })
+            else:
+                logger.info("%s: %s", line.sensor_id, line.status, extra={ "sensor_id": line.sensor_id, "sensor_name": line.sensor_name, "status": line.status })
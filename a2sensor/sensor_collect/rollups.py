@@ -0,0 +1,339 @@
+"""
+a2sensor/sensor_collect/rollups.py
+
+This script defines the Rollups class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from itertools import islice
+import json
+from .json_codec import JsonCodec
+import logging
+from .measure import Measure
+import os
+import threading
+from .time_index import TimeIndex
+import time
+from typing import Dict, Iterator, List
+
+class Rollups():
+    """
+    Computes per-minute and per-hour aggregates of the raw measures, and enforces the retention of the raw ones.
+
+    Each aggregate row covers a bucket of a tier and holds, per status, the number of readings
+    ("ok", "empty", "stuck"), the microseconds spent in it ("ok_time", "empty_time", "stuck_time"),
+    and the number of status "transitions". Rows are appended to
+    <folder>/.rollups/<tier>/<sensorId>.ndjson once their bucket is closed, and a checkpoint
+    remembers how far each sensor has been processed, so each run only reads new raw measures.
+
+    Class name: Rollups
+
+    Responsibilities:
+        - Aggregate new raw measures, in batches.
+        - Delete raw measures older than the retention, once aggregated.
+        - Answer long time ranges from the coarsest adequate tier.
+
+    Collaborators:
+        - a2sensor.sensor_collect.MeasureStorage
+        - a2sensor.sensor_collect.TimeIndex
+    """
+
+    TIERS = [ ("minute", 60 * 1000000), ("hour", 3600 * 1000000) ]
+
+    def __init__(self, storage, rawRetention:float=0, lag:float=5.0, maxGap:float=600.0, batchSize:int=10000):
+        """
+        Creates a new Rollups instance.
+        :param storage: The storage of the raw measures.
+        :type storage: a2sensor.sensor_collect.MeasureStorage
+        :param rawRetention: The seconds raw measures are kept. Zero keeps them forever.
+        :type rawRetention: float
+        :param lag: The seconds to wait for late measures before closing a bucket.
+        :type lag: float
+        :param maxGap: The maximum seconds a status is assumed to hold without new readings.
+        :type maxGap: float
+        :param batchSize: The number of raw measures aggregated at once.
+        :type batchSize: int
+        """
+        super().__init__()
+        self._storage = storage
+        self._raw_retention = int(rawRetention * 1000000)
+        self._lag = int(lag * 1000000)
+        self._max_gap = int(maxGap * 1000000)
+        self._batch_size = batchSize
+        self._folder = os.path.join(storage.folder, ".rollups")
+        self._state_file = os.path.join(self._folder, "state.json")
+        self._states = self._load_states()
+        self._time_index = TimeIndex(lambda record: JsonCodec.instance().loads(record)["start"])
+        self._lock = threading.Lock()
+
+    @property
+    def folder(self) -> str:
+        """
+        Retrieves the folder of the aggregates.
+        :return: Such folder.
+        :rtype: str
+        """
+        return self._folder
+
+    @property
+    def raw_retention(self) -> int:
+        """
+        Retrieves the microseconds raw measures are kept, or zero if forever.
+        :return: Such retention.
+        :rtype: int
+        """
+        return self._raw_retention
+
+    def tier_file(self, tier:str, sensorId:str) -> str:
+        """
+        Retrieves the file with the aggregates of given tier and sensor.
+        :param tier: The tier.
+        :type tier: str
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :return: The path of the file.
+        :rtype: str
+        """
+        return os.path.join(self._folder, tier, f"{sensorId}.ndjson")
+
+    def run_once(self, now:int=None):
+        """
+        Aggregates the raw measures of every sensor up to the last closed minute, and enforces the raw retention.
+        :param now: The current time, in microseconds since the epoch. Defaults to the actual one.
+        :type now: int
+        """
+        if now is None:
+            now = time.time_ns() // 1000
+        minute = self.__class__.TIERS[0][1]
+        cutoff = (now - self._lag) // minute * minute
+        with self._lock:
+            for sensor_id in self._storage.sensor_ids():
+                self._roll_up(sensor_id, cutoff)
+                self._save_states()
+                if self._raw_retention > 0:
+                    self._storage.delete_before(sensor_id, min(now - self._raw_retention, self._states[sensor_id]["until"]))
+
+    def _roll_up(self, sensorId:str, cutoff:int):
+        """
+        Aggregates the raw measures of given sensor, up to given time.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :param cutoff: The time, in microseconds since the epoch, when the last closed minute ends.
+        :type cutoff: int
+        """
+        state = self._states.get(sensorId, None)
+        if state is None:
+            state = { "until": None, "status": None, "last": None, "accounted": None, "pending": {} }
+            self._states[sensorId] = state
+        if state["until"] is not None and state["until"] >= cutoff:
+            return
+        rows = { tier: [] for tier, width in self.__class__.TIERS }
+        measures = self._storage.query(sensorId, state["until"], cutoff)
+        while True:
+            batch = list(islice(measures, self._batch_size))
+            if not batch:
+                break
+            self._aggregate(state, batch, rows)
+        if state["last"] is not None:
+            self._add_time(state, state["status"], min(cutoff, state["last"] + self._max_gap), rows)
+        for tier, width in self.__class__.TIERS:
+            pending = state["pending"].get(tier, None)
+            if pending is not None and pending["start"] + width <= cutoff:
+                rows[tier].append(pending)
+                state["pending"][tier] = None
+            if rows[tier]:
+                self._append_rows(tier, sensorId, rows[tier])
+        state["until"] = cutoff
+
+    def _aggregate(self, state:Dict, batch:List[Measure], rows:Dict[str, List[Dict]]):
+        """
+        Adds a batch of raw measures to the pending buckets.
+        :param state: The state of the sensor.
+        :type state: Dict
+        :param batch: The measures, oldest first.
+        :type batch: List[a2sensor.sensor_collect.Measure]
+        :param rows: The closed rows of each tier, to append to.
+        :type rows: Dict[str, List[Dict]]
+        """
+        tiers = self.__class__.TIERS
+        max_gap = self._max_gap
+        for measure in batch:
+            epoch = measure.epoch
+            status = measure.status
+            if state["last"] is not None:
+                self._add_time(state, state["status"], min(epoch, state["last"] + max_gap), rows)
+            state["accounted"] = epoch
+            for tier, width in tiers:
+                bucket = self._bucket(state, tier, width, epoch, rows)
+                bucket[status] += measure.count
+                if state["status"] is not None and state["status"] != status:
+                    bucket["transitions"] += 1
+            state["status"] = status
+            state["last"] = epoch
+
+    def _add_time(self, state:Dict, status:str, until:int, rows:Dict[str, List[Dict]]):
+        """
+        Accounts the time a status held, from the last accounted time until given one, across buckets.
+        :param state: The state of the sensor.
+        :type state: Dict
+        :param status: The status.
+        :type status: str
+        :param until: The end of the time span, in microseconds since the epoch.
+        :type until: int
+        :param rows: The closed rows of each tier, to append to.
+        :type rows: Dict[str, List[Dict]]
+        """
+        key = f"{status}_time"
+        for tier, width in self.__class__.TIERS:
+            moment = state["accounted"]
+            while moment < until:
+                bucket = self._bucket(state, tier, width, moment, rows)
+                end = min(until, bucket["start"] + width)
+                bucket[key] += end - moment
+                moment = end
+        if until > state["accounted"]:
+            state["accounted"] = until
+
+    def _bucket(self, state:Dict, tier:str, width:int, epoch:int, rows:Dict[str, List[Dict]]) -> Dict:
+        """
+        Retrieves the pending bucket of given tier for given time, closing the previous one if needed.
+        :param state: The state of the sensor.
+        :type state: Dict
+        :param tier: The tier.
+        :type tier: str
+        :param width: The width of the buckets of the tier, in microseconds.
+        :type width: int
+        :param epoch: The time, in microseconds since the epoch.
+        :type epoch: int
+        :param rows: The closed rows of each tier, to append to.
+        :type rows: Dict[str, List[Dict]]
+        :return: The bucket.
+        :rtype: Dict
+        """
+        start = epoch // width * width
+        pending = state["pending"].get(tier, None)
+        if pending is None or pending["start"] != start:
+            if pending is not None:
+                rows[tier].append(pending)
+            pending = { "start": start, "transitions": 0 }
+            for status in Measure.STATUSES:
+                pending[status] = 0
+                pending[f"{status}_time"] = 0
+            state["pending"][tier] = pending
+        return pending
+
+    def _append_rows(self, tier:str, sensorId:str, rows:List[Dict]):
+        """
+        Appends closed rows to the file of their tier.
+        :param tier: The tier.
+        :type tier: str
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :param rows: The rows.
+        :type rows: List[Dict]
+        """
+        path = self.tier_file(tier, sensorId)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        codec = JsonCodec.instance()
+        with open(path, 'ab') as file:
+            file.write(b"".join(codec.dumps(row) + b"\n" for row in rows))
+
+    def query(self, sensorId:str, start:int=None, end:int=None, maxRows:int=1000) -> Iterator[Dict]:
+        """
+        Reads the aggregates of given sensor within a time range, from the finest tier
+        that needs at most maxRows rows, or the coarsest one.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :param start: The first time to include, in microseconds since the epoch. Optional.
+        :type start: int
+        :param end: The first time to exclude, in microseconds since the epoch. Optional.
+        :type end: int
+        :param maxRows: The maximum number of rows wanted.
+        :type maxRows: int
+        :return: The rows, each one including its "tier".
+        :rtype: Iterator[Dict]
+        """
+        chosen = self.tier_for(start, end, maxRows)
+        path = self.tier_file(chosen, sensorId)
+        if not os.path.exists(path):
+            return
+        offset = self._time_index.seek(path, start) if start is not None else 0
+        codec = JsonCodec.instance()
+        with open(path, 'rb') as file:
+            file.seek(offset)
+            for record in file:
+                row = codec.loads(record)
+                if start is not None and row["start"] < start:
+                    continue
+                if end is not None and row["start"] >= end:
+                    break
+                row["tier"] = chosen
+                yield row
+
+    def tier_for(self, start:int, end:int, maxRows:int) -> str:
+        """
+        Retrieves the finest tier that covers given time range with at most maxRows rows, or the coarsest one.
+        :param start: The first time to include, in microseconds since the epoch. Optional.
+        :type start: int
+        :param end: The first time to exclude, in microseconds since the epoch. Optional.
+        :type end: int
+        :param maxRows: The maximum number of rows wanted.
+        :type maxRows: int
+        :return: The tier.
+        :rtype: str
+        """
+        tiers = self.__class__.TIERS
+        if start is not None:
+            span = (end if end is not None else time.time_ns() // 1000) - start
+            for tier, width in tiers:
+                if span // width <= maxRows:
+                    return tier
+        return tiers[-1][0]
+
+    def _load_states(self) -> Dict[str, Dict]:
+        """
+        Loads the checkpoint of each sensor.
+        :return: The states.
+        :rtype: Dict[str, Dict]
+        """
+        if not os.path.exists(self._state_file):
+            return {}
+        with open(self._state_file, 'r') as file:
+            return json.load(file)
+
+    def _save_states(self):
+        """
+        Writes the checkpoint of each sensor atomically.
+        """
+        os.makedirs(self._folder, exist_ok=True)
+        temporary = f"{self._state_file}.tmp"
+        with open(temporary, 'w') as file:
+            json.dump(self._states, file)
+        os.replace(temporary, self._state_file)
+
+    def run_periodically(self, interval:float, stopEvent:threading.Event):
+        """
+        Runs the aggregation every few seconds, until stopped.
+        :param interval: The seconds between runs.
+        :type interval: float
+        :param stopEvent: The event to stop.
+        :type stopEvent: threading.Event
+        """
+        while not stopEvent.wait(interval):
+            try:
+                self.run_once()
+            except Exception as error:
+                logging.getLogger("a2sensor").error(f"Cannot roll up measures: {error}")
@@ -0,0 +1,281 @@
+"""
+a2sensor/sensor_collect/rules_engine.py
+
+This script defines the RulesEngine class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from .alert_rule import AlertRule
+from .alert_sink import AlertSink
+from collections import deque
+import logging
+from .measure import Measure
+from .metrics import Metrics
+import threading
+import time
+from typing import Dict, List
+
+class RulesEngine():
+    """
+    Evaluates alert rules on the stream of measures, in a background thread.
+
+    The Server hands it every measure it ingests, before the write-behind queue and any
+    change-only filtering. Handing them over is just an append to a bounded queue, so the
+    write path never waits for the rules or the sinks; if the queue is full, measures are
+    dropped and counted. The evaluation thread feeds each measure to every rule, ticks them
+    every tick interval so they can fire on silent sensors, and delivers the alerts to every
+    sink, logging the sinks that fail. A rule failing is logged and counted as well, and the
+    other rules and the next measures are still evaluated.
+
+    Class name: RulesEngine
+
+    Responsibilities:
+        - Queue measures without blocking.
+        - Feed them to the rules.
+        - Deliver the alerts to the sinks.
+
+    Collaborators:
+        - a2sensor.sensor_collect.AlertRule
+        - a2sensor.sensor_collect.AlertSink
+        - a2sensor.sensor_collect.Server
+    """
+
+    def __init__(self, rules:List[AlertRule], sinks:List[AlertSink], maxSize:int=10000, tickInterval:float=1.0):
+        """
+        Creates a new RulesEngine instance.
+        :param rules: The rules.
+        :type rules: List[a2sensor.sensor_collect.AlertRule]
+        :param sinks: The destinations of the alerts.
+        :type sinks: List[a2sensor.sensor_collect.AlertSink]
+        :param maxSize: The most measures waiting to be evaluated.
+        :type maxSize: int
+        :param tickInterval: The seconds between ticks of the rules.
+        :type tickInterval: float
+        """
+        super().__init__()
+        self._rules = rules
+        self._sinks = sinks
+        self._max_size = maxSize
+        self._tick_interval = tickInterval
+        self._pending = deque()
+        self._dropped = 0
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._logger = logging.getLogger("a2sensor")
+        self._metrics = Metrics.instance()
+        self._evaluator = threading.Thread(target=self._run, name="rules", daemon=True)
+        self._evaluator.start()
+
+    @property
+    def rules(self) -> List[AlertRule]:
+        """
+        Retrieves the rules.
+        :return: Such rules.
+        :rtype: List[a2sensor.sensor_collect.AlertRule]
+        """
+        return self._rules
+
+    @property
+    def sinks(self) -> List[AlertSink]:
+        """
+        Retrieves the destinations of the alerts.
+        :return: Such sinks.
+        :rtype: List[a2sensor.sensor_collect.AlertSink]
+        """
+        return self._sinks
+
+    @property
+    def depth(self) -> int:
+        """
+        Retrieves the number of measures waiting to be evaluated.
+        :return: Such number.
+        :rtype: int
+        """
+        return len(self._pending)
+
+    @property
+    def dropped(self) -> int:
+        """
+        Retrieves the number of measures dropped because the queue was full.
+        :return: Such number.
+        :rtype: int
+        """
+        return self._dropped
+
+    def put(self, measure:Measure):
+        """
+        Queues given measure for evaluation, without blocking.
+        :param measure: The measure.
+        :type measure: a2sensor.sensor_collect.Measure
+        """
+        if len(self._pending) >= self._max_size:
+            self._dropped += 1
+            return
+        self._pending.append(measure)
+        if not self._wakeup.is_set():
+            self._wakeup.set()
+
+    def put_all(self, measures:List[Measure]):
+        """
+        Queues given measures for evaluation, without blocking.
+        :param measures: The measures.
+        :type measures: List[a2sensor.sensor_collect.Measure]
+        """
+        room = self._max_size - len(self._pending)
+        if room < len(measures):
+            self._dropped += len(measures) - max(0, room)
+            measures = measures[:max(0, room)]
+        self._pending.extend(measures)
+        if not self._wakeup.is_set():
+            self._wakeup.set()
+
+    def evaluate(self, measures:List[Measure]) -> List[Dict]:
+        """
+        Feeds given measures to every rule. A rule failing on a measure is logged and counted,
+        without affecting the other rules nor the next measures.
+        :param measures: The measures.
+        :type measures: List[a2sensor.sensor_collect.Measure]
+        :return: The alerts raised or resolved.
+        :rtype: List[Dict]
+        """
+        result = []
+        updates = [ (rule, rule.update) for rule in self._rules ]
+        for measure in measures:
+            for rule, update in updates:
+                try:
+                    alerts = update(measure)
+                except Exception as error:
+                    self._rule_failed(rule, error)
+                    continue
+                if alerts:
+                    result.extend(alerts)
+        return result
+
+    def tick(self, now:int=None) -> List[Dict]:
+        """
+        Lets every rule react to the passing of time. A rule failing is logged and counted,
+        without affecting the other rules.
+        :param now: The current time, in microseconds since the epoch. Defaults to now.
+        :type now: int
+        :return: The alerts raised or resolved.
+        :rtype: List[Dict]
+        """
+        if now is None:
+            now = time.time_ns() // 1000
+        result = []
+        for rule in self._rules:
+            try:
+                result.extend(rule.tick(now))
+            except Exception as error:
+                self._rule_failed(rule, error)
+        return result
+
+    def deliver(self, alerts:List[Dict]):
+        """
+        Hands given alerts to every sink.
+        :param alerts: The alerts.
+        :type alerts: List[Dict]
+        """
+        for alert in alerts:
+            self._metrics.increment("a2sensor_alerts_total", (("rule", alert["rule"]), ("state", alert["state"])))
+        for sink in self._sinks:
+            try:
+                sink.send(alerts)
+            except Exception as error:
+                self._metrics.increment("a2sensor_alert_sink_failures_total", (("sink", type(sink).__name__),))
+                self._logger.warning(f"Cannot deliver {len(alerts)} alerts to {type(sink).__name__}: {error}")
+
+    def _rule_failed(self, rule:AlertRule, error:Exception):
+        """
+        Logs and counts an error of given rule.
+        :param rule: The rule.
+        :type rule: a2sensor.sensor_collect.AlertRule
+        :param error: The error.
+        :type error: Exception
+        """
+        self._metrics.increment("a2sensor_rules_errors_total", (("rule", rule.name),))
+        self._logger.error(f"Cannot evaluate the alert rule {rule.name}: {error}")
+
+    def _drain(self) -> List[Measure]:
+        """
+        Takes every queued measure.
+        :return: The measures.
+        :rtype: List[a2sensor.sensor_collect.Measure]
+        """
+        pending = self._pending
+        return [ pending.popleft() for _ in range(len(pending)) ]
+
+    def _run(self):
+        """
+        Evaluates queued measures, and ticks the rules, until stopped.
+        """
+        next_tick = time.monotonic() + self._tick_interval
+        while not self._stopped:
+            self._wakeup.wait(max(0, next_tick - time.monotonic()))
+            self._wakeup.clear()
+            tick = time.monotonic() >= next_tick
+            if tick:
+                next_tick = time.monotonic() + self._tick_interval
+            self._process(tick)
+        self._process(False)
+
+    def _process(self, tick:bool):
+        """
+        Evaluates the queued measures, ticks the rules if asked to, and delivers the alerts.
+        Errors of the rules are handled by evaluate() and tick(); any other error is logged and
+        counted too, so it doesn't stop the evaluation thread.
+        :param tick: Whether to tick the rules.
+        :type tick: bool
+        """
+        try:
+            alerts = self.evaluate(self._drain())
+            if tick:
+                alerts.extend(self.tick())
+            if alerts:
+                self.deliver(alerts)
+        except Exception as error:
+            self._metrics.increment("a2sensor_rules_errors_total", (("rule", ""),))
+            self._logger.error(f"Cannot evaluate the alert rules: {error}")
+
+    def close(self):
+        """
+        Evaluates the measures still queued, stops the evaluation thread, and closes the sinks.
+        """
+        self._stopped = True
+        self._wakeup.set()
+        self._evaluator.join()
+        for sink in self._sinks:
+            sink.close()
+
+    @classmethod
+    def from_file(cls, path:str, maxSize:int=10000, tickInterval:float=1.0):
+        """
+        Builds an engine with the rules and sinks of given rules file: a TOML file with a [[rule]]
+        table per rule and a [[sink]] table per sink. Without sinks, alerts are logged.
+        :param path: The path of the rules file.
+        :type path: str
+        :param maxSize: The most measures waiting to be evaluated.
+        :type maxSize: int
+        :param tickInterval: The seconds between ticks of the rules.
+        :type tickInterval: float
+        :return: The engine.
+        :rtype: a2sensor.sensor_collect.RulesEngine
+        """
+        import toml
+        config = toml.load(path)
+        rules = [ AlertRule.from_config(rule) for rule in config.get('rule', []) ]
+        sinks = [ AlertSink.from_config(sink) for sink in config.get('sink', [ { "type": "log" } ]) ]
+        return cls(rules, sinks, maxSize, tickInterval)
@@ -0,0 +1,69 @@
+"""
+a2sensor/sensor_collect/scheduled_pin.py
+
+This script defines the ScheduledPin class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+class ScheduledPin():
+    """
+    A pin sampled periodically by the GpioScheduler.
+
+    Class name: ScheduledPin
+
+    Responsibilities:
+        - Remember when the pin is due next.
+        - Keep the last level reported by edge detection, if enabled.
+
+    Collaborators:
+        - None
+    """
+
+    __slots__ = ("sensor_key", "pin", "period", "due", "edge_detect", "level", "skipped")
+
+    def __init__(self, sensorKey:str, pin:int, period:float, due:float, edgeDetect:bool=False):
+        """
+        Creates a new ScheduledPin instance.
+        :param sensorKey: The key of the sensor.
+        :type sensorKey: str
+        :param pin: The pin.
+        :type pin: int
+        :param period: The seconds between samples.
+        :type period: float
+        :param due: The time of the first sample, according to the scheduler clock.
+        :type due: float
+        :param edgeDetect: Whether the level is tracked with edge-detection callbacks instead of polling.
+        :type edgeDetect: bool
+        """
+        super().__init__()
+        self.sensor_key = sensorKey
+        self.pin = pin
+        self.period = period
+        self.due = due
+        self.edge_detect = edgeDetect
+        self.level = None
+        self.skipped = 0
+
+    def __lt__(self, other) -> bool:
+        """
+        Orders pins by the time they are due.
+        :param other: The other pin.
+        :type other: a2sensor.sensor_collect.ScheduledPin
+        :return: True if this pin is due first.
+        :rtype: bool
+        """
+        return self.due < other.due
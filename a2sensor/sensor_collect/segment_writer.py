@@ -0,0 +1,137 @@
+"""
+a2sensor/sensor_collect/segment_writer.py
+
+This script defines the SegmentWriter class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import os
+
+class SegmentWriter():
+    """
+    Appends encoded records to a segment file.
+
+    Class name: SegmentWriter
+
+    Responsibilities:
+        - Buffer records in memory until flushed.
+        - Track the size and the age of the segment, and the time of its last record.
+
+    Collaborators:
+        - None
+    """
+
+    def __init__(self, path:str, startEpoch:int):
+        """
+        Creates a new SegmentWriter instance.
+        :param path: The path of the segment file.
+        :type path: str
+        :param startEpoch: The time of the first record, in microseconds since the epoch.
+        :type startEpoch: int
+        """
+        super().__init__()
+        self._path = path
+        self._start_epoch = startEpoch
+        self._last_epoch = startEpoch
+        self._file = open(path, 'ab')
+        self._size = self._file.tell()
+        self._pending = []
+
+    @property
+    def path(self) -> str:
+        """
+        Retrieves the path of the segment file.
+        :return: Such path.
+        :rtype: str
+        """
+        return self._path
+
+    @property
+    def start_epoch(self) -> int:
+        """
+        Retrieves the time of the first record, in microseconds since the epoch.
+        :return: Such time.
+        :rtype: int
+        """
+        return self._start_epoch
+
+    @property
+    def last_epoch(self) -> int:
+        """
+        Retrieves the time of the last record, in microseconds since the epoch.
+        :return: Such time.
+        :rtype: int
+        """
+        return self._last_epoch
+
+    @property
+    def size(self) -> int:
+        """
+        Retrieves the size of the segment, including pending records.
+        :return: Such size.
+        :rtype: int
+        """
+        return self._size
+
+    def is_full(self, epoch:int, maxBytes:int, maxAge:int) -> bool:
+        """
+        Checks whether a record at given time should go to a new segment: when this one is too
+        large or spans too long, or the record is older than the last one, so that the records of
+        each segment stay in chronological order.
+        :param epoch: The time of the record, in microseconds since the epoch.
+        :type epoch: int
+        :param maxBytes: The maximum size of a segment.
+        :type maxBytes: int
+        :param maxAge: The maximum time span of a segment, in microseconds.
+        :type maxAge: int
+        :return: True in such case.
+        :rtype: bool
+        """
+        return self._size >= maxBytes or epoch - self._start_epoch >= maxAge or epoch < self._last_epoch
+
+    def append(self, record:bytes, epoch:int):
+        """
+        Appends given record.
+        :param record: The encoded record.
+        :type record: bytes
+        :param epoch: The time of the record, in microseconds since the epoch.
+        :type epoch: int
+        """
+        self._pending.append(record)
+        self._size += len(record)
+        self._last_epoch = epoch
+
+    def flush(self, fsync:bool=False):
+        """
+        Writes the pending records to the segment file.
+        :param fsync: Whether to force the data to reach the disk.
+        :type fsync: bool
+        """
+        if self._pending:
+            self._file.write(b"".join(self._pending))
+            self._pending = []
+            self._file.flush()
+            if fsync:
+                os.fsync(self._file.fileno())
+
+    def close(self, fsync:bool=False):
+        """
+        Flushes the pending records and closes the segment file.
+        :param fsync: Whether to force the data to reach the disk.
+        :type fsync: bool
+        """
+        self.flush(fsync)
+        self._file.close()
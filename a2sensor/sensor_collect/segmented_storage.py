@@ -0,0 +1,371 @@
+"""
+a2sensor/sensor_collect/segmented_storage.py
+
+This script defines the SegmentedStorage class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from datetime import datetime
+import heapq
+from .json_lines_codec import JsonLinesCodec
+import logging
+from .measure import Measure
+from .measure_storage import MeasureStorage
+from .metrics import Metrics
+from operator import attrgetter
+import os
+from .segment_writer import SegmentWriter
+import threading
+import time
+from .timestamp_formatter import TimestampFormatter
+from typing import Dict, Iterator, List
+
+class SegmentedStorage(MeasureStorage):
+    """
+    Storage appending measures to per-sensor segment files.
+
+    Class name: SegmentedStorage
+
+    Responsibilities:
+        - Append measures to <folder>/<sensorId>/<YYYYmmddHHMMSSffffff><extension> segments, encoded by its codec.
+        - Roll segments by size or time span, and on measures older than the last one, so each segment is in chronological order.
+        - Batch writes, flushing them every few seconds.
+
+    Collaborators:
+        - a2sensor.sensor_collect.SegmentWriter
+        - a2sensor.sensor_collect.JsonLinesCodec
+        - a2sensor.sensor_collect.BinaryCodec
+    """
+
+    def __init__(self, folder:str, dateFormat:str, flushInterval:float=1.0, segmentMaxBytes:int=4194304, segmentMaxAge:float=3600.0, fsync:bool=False, codec=None):
+        """
+        Creates a new SegmentedStorage instance.
+        :param folder: The root folder of the storage.
+        :type folder: str
+        :param dateFormat: The format of the timestamps in the stored records.
+        :type dateFormat: str
+        :param flushInterval: The seconds between flushes. Zero or less means flushing on every append.
+        :type flushInterval: float
+        :param segmentMaxBytes: The size after which a segment is rolled.
+        :type segmentMaxBytes: int
+        :param segmentMaxAge: The time span, in seconds, after which a segment is rolled.
+        :type segmentMaxAge: float
+        :param fsync: Whether to fsync segments on each flush.
+        :type fsync: bool
+        :param codec: The codec of the segment records. Defaults to a JsonLinesCodec.
+        :type codec: a2sensor.sensor_collect.JsonLinesCodec
+        """
+        super().__init__(folder, dateFormat)
+        self._codec = codec if codec is not None else JsonLinesCodec(dateFormat)
+        self._flush_interval = flushInterval
+        self._segment_max_bytes = segmentMaxBytes
+        self._segment_max_age = int(segmentMaxAge * 1000000)
+        self._fsync = fsync
+        self._writers = {}
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._flusher = None
+        if flushInterval > 0:
+            self._flusher = threading.Thread(target=self._flush_periodically, name="segment-flusher", daemon=True)
+            self._flusher.start()
+
+    @property
+    def flush_interval(self) -> float:
+        """
+        Retrieves the seconds between flushes.
+        :return: Such interval.
+        :rtype: float
+        """
+        return self._flush_interval
+
+    @property
+    def segment_max_bytes(self) -> int:
+        """
+        Retrieves the size after which a segment is rolled.
+        :return: Such size.
+        :rtype: int
+        """
+        return self._segment_max_bytes
+
+    @property
+    def segment_max_age(self) -> int:
+        """
+        Retrieves the time span, in microseconds, after which a segment is rolled.
+        :return: Such time span.
+        :rtype: int
+        """
+        return self._segment_max_age
+
+    @property
+    def codec(self):
+        """
+        Retrieves the codec of the segment records.
+        :return: Such codec.
+        :rtype: a2sensor.sensor_collect.JsonLinesCodec
+        """
+        return self._codec
+
+    def register_sensors(self, sensors:Dict[str, Dict]):
+        """
+        Lets the storage know about the local sensors in advance.
+        :param sensors: The sensors, as in LocalSensors.sensors.
+        :type sensors: Dict[str, Dict]
+        """
+        dictionary = getattr(self._codec, 'dictionary', None)
+        if dictionary is not None:
+            dictionary.seed(sensors)
+
+    def append(self, measure:Measure):
+        """
+        Persists given measure.
+        :param measure: The measure.
+        :type measure: a2sensor.sensor_collect.Measure
+        """
+        record = self._codec.encode(measure)
+        with self._lock:
+            self._writer_for(measure.sensor_id, measure.epoch).append(record, measure.epoch)
+            if self._flusher is None:
+                self._flush_writers()
+
+    def append_all(self, measures:List[Measure]):
+        """
+        Persists given measures.
+        :param measures: The measures.
+        :type measures: List[a2sensor.sensor_collect.Measure]
+        """
+        records = [ (measure, self._codec.encode(measure)) for measure in measures ]
+        with self._lock:
+            for measure, record in records:
+                self._writer_for(measure.sensor_id, measure.epoch).append(record, measure.epoch)
+            if self._flusher is None:
+                self._flush_writers()
+
+    def _writer_for(self, sensorId:str, epoch:int) -> SegmentWriter:
+        """
+        Retrieves the writer of the current segment of given sensor, rolling it if needed.
+        New segments never reuse the name of an existing one, which could hold later records.
+        Must be called with the lock held.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :param epoch: The time of the record to append.
+        :type epoch: int
+        :return: The writer.
+        :rtype: a2sensor.sensor_collect.SegmentWriter
+        """
+        writer = self._writers.get(sensorId, None)
+        if writer is None or writer.is_full(epoch, self.segment_max_bytes, self.segment_max_age):
+            if writer is not None:
+                writer.close(self._fsync)
+            folder = self.sensor_folder(sensorId)
+            os.makedirs(folder, exist_ok=True)
+            path = os.path.join(folder, self.segment_name(epoch))
+            suffix = 0
+            while os.path.exists(path):
+                suffix += 1
+                path = os.path.join(folder, self.segment_name(epoch, suffix))
+            writer = SegmentWriter(path, epoch)
+            self._writers[sensorId] = writer
+        return writer
+
+    def write_segment(self, sensorId:str, measures:List[Measure]) -> str:
+        """
+        Writes given measures as a new, complete segment, atomically. Used to import measures in bulk.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :param measures: The measures, oldest first.
+        :type measures: List[a2sensor.sensor_collect.Measure]
+        :return: The path of the segment.
+        :rtype: str
+        """
+        folder = self.sensor_folder(sensorId)
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, self.segment_name(measures[0].epoch))
+        temporary = f"{path}.tmp"
+        with open(temporary, 'wb') as file:
+            file.write(b"".join(self._codec.encode(measure) for measure in measures))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, path)
+        self._codec.forget(path)
+        return path
+
+    def segment_name(self, epoch:int, suffix:int=0) -> str:
+        """
+        Builds the name of a segment starting at given time.
+        :param epoch: The time of its first record, in microseconds since the epoch.
+        :type epoch: int
+        :param suffix: The number telling apart segments starting at the same time, if not zero.
+        :type suffix: int
+        :return: The file name.
+        :rtype: str
+        """
+        name = TimestampFormatter.for_format("%Y%m%d%H%M%S%f").format(epoch)
+        return (f"{name}-{suffix}" if suffix else name) + self._codec.extension
+
+    def segments(self, sensorId:str) -> List[str]:
+        """
+        Retrieves the segment files of given sensor, oldest first.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :return: The paths of the segments.
+        :rtype: List[str]
+        """
+        folder = self.sensor_folder(sensorId)
+        if not os.path.isdir(folder):
+            return []
+        extension = self._codec.extension
+        return [ os.path.join(folder, name) for name in sorted(os.listdir(folder)) if name.endswith(extension) ]
+
+    def read(self, sensorId:str) -> Iterator[Measure]:
+        """
+        Reads the measures of given sensor, oldest first.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :return: The measures.
+        :rtype: Iterator[a2sensor.sensor_collect.Measure]
+        """
+        self.flush()
+        for path in self.segments(sensorId):
+            yield from self._codec.read(path)
+
+    def segment_start(self, path:str) -> int:
+        """
+        Retrieves the time of the first record of given segment, from its name.
+        :param path: The path of the segment.
+        :type path: str
+        :return: The time, in microseconds since the epoch.
+        :rtype: int
+        """
+        return Measure.epoch_of(datetime.strptime(os.path.basename(path)[:20], "%Y%m%d%H%M%S%f"))
+
+    def query(self, sensorId:str, start:int=None, end:int=None) -> Iterator[Measure]:
+        """
+        Reads the measures of given sensor within a time range, oldest first.
+        Each segment is in chronological order, from the time in its name to its last record, but
+        measures arriving out of order, e.g. batches with old epochs, start segments overlapping
+        others. So the segments overlapping the range are selected by those times, each codec seeks
+        within them (binary records directly, NDJSON records through a sparse time index), and
+        overlapping segments are merged.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :param start: The first time to include, in microseconds since the epoch. Optional.
+        :type start: int
+        :param end: The first time to exclude, in microseconds since the epoch. Optional.
+        :type end: int
+        :return: The measures.
+        :rtype: Iterator[a2sensor.sensor_collect.Measure]
+        """
+        self.flush()
+        parts = []
+        overlapping = False
+        highest = None
+        for path in self.segments(sensorId):
+            lowest = self.segment_start(path)
+            if end is not None and lowest >= end:
+                # segments are sorted by their start times
+                break
+            last = self._codec.last_epoch(path)
+            if last is None or (start is not None and last < start):
+                continue
+            if highest is not None and lowest < highest:
+                overlapping = True
+            highest = last if highest is None else max(highest, last)
+            parts.append(self._codec.query(path, start, end))
+        if overlapping:
+            yield from heapq.merge(*parts, key=attrgetter("epoch"))
+        else:
+            for part in parts:
+                yield from part
+
+    def latest(self, sensorId:str) -> Measure:
+        """
+        Reads the most recent measure of given sensor, from the segment with the latest last record.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :return: The measure, or None if there's none.
+        :rtype: a2sensor.sensor_collect.Measure
+        """
+        self.flush()
+        latest = None
+        for path in self.segments(sensorId):
+            last = self._codec.last_epoch(path)
+            if last is not None and (latest is None or last >= latest[0]):
+                latest = (last, path)
+        result = None
+        if latest is not None:
+            for result in self._codec.read(latest[1]):
+                pass
+        return result
+
+    def delete_before(self, sensorId:str, epoch:int) -> int:
+        """
+        Deletes the segments of given sensor whose records are all older than given time, i.e.
+        whose last record is. The current segment, and the one with the latest record, are always kept.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :param epoch: The time, in microseconds since the epoch.
+        :type epoch: int
+        :return: The number of segments deleted.
+        :rtype: int
+        """
+        result = 0
+        with self._lock:
+            writer = self._writers.get(sensorId, None)
+            current = writer.path if writer is not None else None
+            lasts = [ (self._codec.last_epoch(path), path) for path in self.segments(sensorId) ]
+            latest = max((last for last in lasts if last[0] is not None), default=(None, None))[1]
+            for last, path in lasts:
+                if path != current and path != latest and (last is None or last < epoch):
+                    os.remove(path)
+                    self._codec.forget(path)
+                    result += 1
+        return result
+
+    def _flush_writers(self):
+        """
+        Flushes all writers. Must be called with the lock held.
+        """
+        for writer in self._writers.values():
+            writer.flush(self._fsync)
+
+    def flush(self):
+        """
+        Writes any pending measure to disk.
+        """
+        started = time.perf_counter()
+        with self._lock:
+            self._flush_writers()
+        Metrics.instance().observe("a2sensor_storage_flush_seconds", time.perf_counter() - started)
+
+    def _flush_periodically(self):
+        """
+        Flushes pending measures every flush_interval seconds, until closed.
+        """
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError as error:
+                logging.getLogger("a2sensor").error(f"Cannot flush segments: {error}")
+
+    def close(self):
+        """
+        Flushes pending measures and closes all segments.
+        """
+        self._closed.set()
+        with self._lock:
+            for writer in self._writers.values():
+                writer.close(self._fsync)
+            self._writers = {}
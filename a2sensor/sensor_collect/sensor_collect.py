@@ -18,14 +18,20 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
+from .measure_storage import MeasureStorage
 from .server import Server
 import os
+import sys
+from .write_behind_queue import WriteBehindQueue
 
 def configure_from_cli():
     """
     Configures the Server based on the CLI arguments.
     """
     import argparse
+    from .json_codec import JsonCodec
+    from .local_sensors import LocalSensors
+    from .logging_config import LoggingConfig
 
     parser = argparse.ArgumentParser(
         description="Runs this server to read values from attached sensors"
@@ -37,11 +43,176 @@ def configure_from_cli():
         required=True,
         help="The configuration file for the attached sensors",
     )
+    parser.add_argument(
+        "-s",
+        "--storage-backend",
+        choices=MeasureStorage.BACKENDS,
+        default="segmented",
+        help="The storage backend: NDJSON segments, binary segments, or the legacy one JSON file per measure",
+    )
+    parser.add_argument("--flush-interval", type=float, default=1.0, help="The seconds between flushes of the segments")
+    parser.add_argument("--segment-max-bytes", type=int, default=4194304, help="The size after which segments are rolled")
+    parser.add_argument("--segment-max-age", type=float, default=3600.0, help="The seconds after which segments are rolled")
+    parser.add_argument("--queue-size", type=int, default=10000, help="The size of the write-behind queue (0 writes synchronously)")
+    parser.add_argument(
+        "--queue-policy",
+        choices=WriteBehindQueue.POLICIES,
+        default="block",
+        help="What to do when the write-behind queue is full",
+    )
+    parser.add_argument("--change-only", action="store_true", help="Persist only status transitions, plus a heartbeat")
+    parser.add_argument("--heartbeat", type=float, default=300.0, help="The seconds between keep-alive records with --change-only")
+    parser.add_argument(
+        "--sampler",
+        choices=[ "threads", "scheduler" ],
+        default="threads",
+        help="How to sample the local sensors: one thread per sensor, or a single drift-free scheduler",
+    )
+    parser.add_argument(
+        "--gpio-backend",
+        choices=LocalSensors.GPIO_BACKENDS,
+        default="rpi",
+        help="Where to read the local sensors from: RPi.GPIO, or simulated random traces",
+    )
+    parser.add_argument("--reload-interval", type=float, default=2.0, help="The seconds between checks of the sensors file for changes (0 disables reloading)")
+    parser.add_argument("-u", "--udp-port", type=int, default=None, help="The port to ingest measures over UDP")
+    parser.add_argument("--udp-ack", action="store_true", help="Acknowledge each UDP datagram")
+    parser.add_argument("--http-port", type=int, default=None, help="The port to ingest measures with the asyncio HTTP server")
+    parser.add_argument("--http-host", default="0.0.0.0", help="The address the asyncio HTTP server binds to")
+    parser.add_argument("--rollup-interval", type=float, default=60.0, help="The seconds between runs of the per-minute and per-hour aggregation (0 disables it)")
+    parser.add_argument("--raw-retention", type=float, default=0, help="The seconds raw measures are kept once aggregated (0 keeps them forever)")
+    parser.add_argument("--log-mode", choices=LoggingConfig.MODES, default="sync", help="Write log lines right away, or from a background thread")
+    parser.add_argument("--log-format", choices=LoggingConfig.FORMATS, default="text", help="The format of log lines")
+    parser.add_argument("--log-transitions-only", action="store_true", help="Log only the readings that change the status of a sensor")
+    parser.add_argument("--log-rate", type=float, default=0, help="The most reading lines logged per second (0 means no limit)")
+    parser.add_argument("--log-sample", type=int, default=1, help="Log one in every this many readings")
+    parser.add_argument("--uplink-url", default=None, help="The base URL of an upstream sensor-collect to forward measures to")
+    parser.add_argument("--uplink-batch-size", type=int, default=500, help="The most measures forwarded per request")
+    parser.add_argument("--uplink-interval", type=float, default=1.0, help="The most seconds a measure waits before being forwarded")
+    parser.add_argument("--uplink-spool-max-bytes", type=int, default=268435456, help="The size of the spool after which the oldest measures not forwarded yet are dropped")
+    parser.add_argument("--rules-file", default=None, help="The TOML file with the alert rules to evaluate on the ingested measures, and their sinks")
+    parser.add_argument("--json-codec", choices=JsonCodec.BACKENDS, default="auto", help="The JSON library to parse requests and persist measures with: auto uses orjson if installed")
     args, unknown_args = parser.parse_known_args()
-    Server.configure(args.data_folder, args.local_sensors_config_file)
+    LoggingConfig.instance().configure_logging(args.log_mode, args.log_format)
+    Server.configure(
+        args.data_folder,
+        args.local_sensors_config_file,
+        storageBackend=args.storage_backend,
+        flushInterval=args.flush_interval,
+        segmentMaxBytes=args.segment_max_bytes,
+        segmentMaxAge=args.segment_max_age,
+        queueSize=args.queue_size,
+        queuePolicy=args.queue_policy,
+        changeOnly=args.change_only,
+        heartbeat=args.heartbeat,
+        sampler=args.sampler,
+        gpioBackend=args.gpio_backend,
+        reloadInterval=args.reload_interval,
+        udpPort=args.udp_port,
+        udpAck=args.udp_ack,
+        httpPort=args.http_port,
+        httpHost=args.http_host,
+        rollupInterval=args.rollup_interval,
+        rawRetention=args.raw_retention,
+        logTransitionsOnly=args.log_transitions_only,
+        logRate=args.log_rate,
+        logSample=args.log_sample,
+        uplinkUrl=args.uplink_url,
+        uplinkBatchSize=args.uplink_batch_size,
+        uplinkInterval=args.uplink_interval,
+        uplinkSpoolMaxBytes=args.uplink_spool_max_bytes,
+        jsonCodec=args.json_codec,
+        rulesFile=args.rules_file,
+    )
+
+def compact_from_cli(argv):
+    """
+    Migrates the legacy one-JSON-file-per-measure layout of a data folder to segments.
+    :param argv: The CLI arguments after the "compact" subcommand.
+    :type argv: List[str]
+    """
+    import argparse
+    from .legacy_compactor import LegacyCompactor
+    from .logging_config import LoggingConfig
+
+    parser = argparse.ArgumentParser(
+        prog="sensor_collect compact",
+        description="Migrates legacy <sensorId>/<timestamp>.json files to time-sorted segments, resuming any interrupted run"
+    )
+    parser.add_argument("-d", "--data-folder", required=True, help="The data folder")
+    parser.add_argument(
+        "-s",
+        "--storage-backend",
+        choices=[ "segmented", "binary" ],
+        default="segmented",
+        help="The segment format to migrate to",
+    )
+    parser.add_argument("-w", "--workers", type=int, default=None, help="The number of parsing processes (defaults to the number of CPUs)")
+    parser.add_argument("--keep-sources", action="store_true", help="Keep the legacy files once migrated")
+    args = parser.parse_args(argv)
+    storage = MeasureStorage.for_backend(args.storage_backend, args.data_folder, LoggingConfig.instance().date_format, flushInterval=0)
+    try:
+        result = LegacyCompactor(storage, args.workers, keepSources=args.keep_sources).run()
+    finally:
+        storage.close()
+    print(f"Compacted {result['measures']} measures in {result['days']} sensor days, deleting {result['files']} files")
+
+def export_from_cli(argv):
+    """
+    Exports the measures stored in a data folder as memory-mappable columns, and optionally as Parquet or Arrow IPC.
+    :param argv: The CLI arguments after the "export" subcommand.
+    :type argv: List[str]
+    """
+    import argparse
+    import importlib.util
+    from .columnar_export import ColumnarExport
+    from .logging_config import LoggingConfig
+
+    parser = argparse.ArgumentParser(
+        prog="sensor_collect export",
+        description="Appends the measures stored since the last export to per-sensor columnar files, for analytics"
+    )
+    parser.add_argument("-d", "--data-folder", required=True, help="The data folder")
+    parser.add_argument(
+        "-s",
+        "--storage-backend",
+        choices=MeasureStorage.BACKENDS,
+        default="segmented",
+        help="The storage backend of the data folder",
+    )
+    parser.add_argument("-o", "--output-folder", default=None, help="The folder of the columns (defaults to <data-folder>/.columns)")
+    parser.add_argument("--sensor", action="append", default=None, help="The id of a sensor to export (defaults to all of them); can be repeated")
+    parser.add_argument("--full", action="store_true", help="Export everything again, instead of the measures stored since the last export")
+    parser.add_argument("--parquet", default=None, help="Also write the exported columns of the sensors to this Parquet file (requires pyarrow)")
+    parser.add_argument("--arrow", default=None, help="Also write the exported columns of the sensors to this Arrow IPC file (requires pyarrow)")
+    args = parser.parse_args(argv)
+    if (args.parquet or args.arrow) and importlib.util.find_spec("pyarrow") is None:
+        parser.error("--parquet and --arrow require pyarrow: pip install pyarrow")
+    storage = MeasureStorage.for_backend(args.storage_backend, args.data_folder, LoggingConfig.instance().date_format, flushInterval=0)
+    try:
+        export = ColumnarExport(storage, args.output_folder)
+        result = export.export(args.sensor, args.full)
+    finally:
+        storage.close()
+    print(f"Exported {sum(result.values())} measures of {len(result)} sensors to {export.folder}")
+    for path, fileFormat in [ (args.parquet, "parquet"), (args.arrow, "arrow") ]:
+        if path:
+            export.write(path, fileFormat, args.sensor)
+            print(f"Wrote {path}")
 
-if __name__ == "__main__":
+if __name__ == "__main__" and sys.argv[1:2] == [ "compact" ]:
+    from .logging_config import LoggingConfig
+    LoggingConfig.instance().configure_logging(**LoggingConfig.options_from_environment())
+    compact_from_cli(sys.argv[2:])
+elif __name__ == "__main__" and sys.argv[1:2] == [ "export" ]:
+    from .logging_config import LoggingConfig
+    LoggingConfig.instance().configure_logging(**LoggingConfig.options_from_environment())
+    export_from_cli(sys.argv[2:])
+elif __name__ == "__main__":
     configure_from_cli()
-    Server.instance().local_sensors.start()
-else:
-    Server.configure()
+    Server.instance().start_udp_server()
+    Server.instance().start_http_server()
+    try:
+        Server.instance().local_sensors.start()
+    finally:
+        Server.instance().close()
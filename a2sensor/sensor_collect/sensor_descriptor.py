@@ -0,0 +1,135 @@
+"""
+a2sensor/sensor_collect/sensor_descriptor.py
+
+This script defines the SensorDescriptor class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from .debounced_sensor_state import DebouncedSensorState
+from .sensor_state import SensorState
+from typing import Dict
+
+class SensorDescriptor():
+    """
+    The settings of a local sensor, resolved once from the sensors file, so sampling doesn't look them up.
+
+    Class name: SensorDescriptor
+
+    Responsibilities:
+        - Hold the resolved id, name, pin, period and thresholds of a sensor.
+        - Hold the state computing its status.
+
+    Collaborators:
+        - a2sensor.sensor_collect.SensorState
+        - a2sensor.sensor_collect.DebouncedSensorState
+    """
+
+    __slots__ = ("key", "id", "name", "index", "pin", "wait", "edge_detect", "times_active_until_considered_stuck", "times_inactive_until_considered_empty", "sample_interval", "debounce", "period", "state")
+
+    def __init__(self, key:str, sensorId:str, sensorName:str, index:int, pin:int=-1, wait:float=1, edgeDetect:bool=False, timesActiveUntilConsideredStuck:int=5, timesInactiveUntilConsideredEmpty:int=5, sampleInterval:float=0, debounce:float=0.05):
+        """
+        Creates a new SensorDescriptor instance.
+        :param key: The key of the sensor in the sensors file.
+        :type key: str
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :param sensorName: The name of the sensor.
+        :type sensorName: str
+        :param index: The position of the sensor in the sensors file.
+        :type index: int
+        :param pin: The GPIO pin, or -1 if none.
+        :type pin: int
+        :param wait: The seconds between samples, or between reports if sampled faster.
+        :type wait: float
+        :param edgeDetect: Whether to track the level with edge detection instead of polling.
+        :type edgeDetect: bool
+        :param timesActiveUntilConsideredStuck: The setting with the same name in the sensors file.
+        :type timesActiveUntilConsideredStuck: int
+        :param timesInactiveUntilConsideredEmpty: The setting with the same name in the sensors file.
+        :type timesInactiveUntilConsideredEmpty: int
+        :param sampleInterval: The seconds between samples, if shorter than wait: the status is then debounced, and computed over time windows. Zero samples every wait.
+        :type sampleInterval: float
+        :param debounce: The seconds a new level must hold to be taken into account, when sampling faster than wait.
+        :type debounce: float
+        :raise ValueError: If wait is not a number of seconds, zero (as fast as possible) or more.
+        """
+        super().__init__()
+        if isinstance(wait, bool) or not isinstance(wait, (int, float)) or not wait >= 0:
+            raise ValueError(f"Sensor {key} must have a 'wait' of zero or more seconds, not {wait}")
+        self.key = key
+        self.id = sensorId
+        self.name = sensorName
+        self.index = index
+        self.pin = pin
+        self.wait = wait
+        self.edge_detect = edgeDetect
+        self.times_active_until_considered_stuck = timesActiveUntilConsideredStuck
+        self.times_inactive_until_considered_empty = timesInactiveUntilConsideredEmpty
+        self.sample_interval = sampleInterval if 0 < sampleInterval < wait else 0
+        self.debounce = debounce
+        self.period = self.sample_interval or wait
+        if self.sample_interval:
+            self.state = DebouncedSensorState(timesActiveUntilConsideredStuck * wait, timesInactiveUntilConsideredEmpty * wait, debounce, wait, self.sample_interval)
+        else:
+            self.state = SensorState(timesActiveUntilConsideredStuck, timesInactiveUntilConsideredEmpty)
+
+    def samples_like(self, other) -> bool:
+        """
+        Checks whether given descriptor is sampled the same way, i.e. same pin, periods and edge detection.
+        :param other: The other descriptor.
+        :type other: a2sensor.sensor_collect.SensorDescriptor
+        :return: True in such case.
+        :rtype: bool
+        """
+        return self.pin == other.pin and self.wait == other.wait and self.sample_interval == other.sample_interval and self.edge_detect == other.edge_detect
+
+    def has_thresholds_of(self, other) -> bool:
+        """
+        Checks whether given descriptor has the same thresholds, so their states are interchangeable.
+        :param other: The other descriptor.
+        :type other: a2sensor.sensor_collect.SensorDescriptor
+        :return: True in such case.
+        :rtype: bool
+        """
+        return self.times_active_until_considered_stuck == other.times_active_until_considered_stuck \
+            and self.times_inactive_until_considered_empty == other.times_inactive_until_considered_empty \
+            and self.sample_interval == other.sample_interval \
+            and (not self.sample_interval or (self.wait == other.wait and self.debounce == other.debounce))
+
+    @classmethod
+    def for_sensor(cls, key:str, attributes:Dict):
+        """
+        Builds the descriptor of a sensor, from its settings.
+        :param key: The key of the sensor in the sensors file.
+        :type key: str
+        :param attributes: The settings of the sensor, including its 'index'.
+        :type attributes: Dict
+        :return: The descriptor.
+        :rtype: a2sensor.sensor_collect.SensorDescriptor
+        :raise ValueError: If the settings are not valid.
+        """
+        return cls(
+            key,
+            attributes.get('id', key),
+            attributes.get('name', key),
+            attributes.get('index', -1),
+            attributes.get('pin', -1),
+            attributes.get('wait', 1),
+            attributes.get('edge_detect', False),
+            attributes.get('times_active_until_considered_stuck', 5),
+            attributes.get('times_inactive_until_considered_empty', 5),
+            attributes.get('sample_interval', 0),
+            attributes.get('debounce', 0.05))
@@ -0,0 +1,169 @@
+"""
+a2sensor/sensor_collect/sensor_dictionary.py
+
+This script defines the SensorDictionary class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import json
+import os
+import threading
+from typing import Dict, Tuple
+
+class SensorDictionary():
+    """
+    Sidecar file mapping the compact sensor indexes used in binary records to sensor ids and names.
+
+    Class name: SensorDictionary
+
+    Responsibilities:
+        - Assign a stable index to each sensor.
+        - Persist the mapping in a JSON sidecar file.
+
+    Collaborators:
+        - None
+    """
+
+    def __init__(self, path:str):
+        """
+        Creates a new SensorDictionary instance, loading the sidecar file if it exists.
+        :param path: The path of the sidecar file.
+        :type path: str
+        """
+        super().__init__()
+        self._path = path
+        self._entries = {}
+        self._indexes = {}
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._load()
+
+    @property
+    def path(self) -> str:
+        """
+        Retrieves the path of the sidecar file.
+        :return: Such path.
+        :rtype: str
+        """
+        return self._path
+
+    @property
+    def entries(self) -> Dict[int, Tuple[str, str]]:
+        """
+        Retrieves the id and name of each index.
+        :return: Such mapping.
+        :rtype: Dict[int, Tuple[str, str]]
+        """
+        return dict(self._entries)
+
+    def seed(self, sensors:Dict[str, Dict]):
+        """
+        Registers the local sensors, preferring the index LocalSensors.configure assigned to each one.
+        :param sensors: The sensors, as in LocalSensors.sensors.
+        :type sensors: Dict[str, Dict]
+        """
+        with self._lock:
+            changed = False
+            for key, attributes in sensors.items():
+                sensor_id = attributes.get('id', key)
+                if sensor_id not in self._indexes:
+                    index = attributes.get('index', None)
+                    if index is None or index in self._entries:
+                        index = self._next_index()
+                    self._register(index, sensor_id, attributes.get('name', key))
+                    changed = True
+            if changed:
+                self._save()
+
+    def index_of(self, sensorId:str, sensorName:str) -> int:
+        """
+        Retrieves the index of given sensor, assigning a new one if it's unknown.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :param sensorName: The name of the sensor.
+        :type sensorName: str
+        :return: The index.
+        :rtype: int
+        """
+        result = self._indexes.get(sensorId, None)
+        if result is None:
+            with self._lock:
+                result = self._indexes.get(sensorId, None)
+                if result is None:
+                    result = self._next_index()
+                    self._register(result, sensorId, sensorName)
+                    self._save()
+        return result
+
+    def lookup(self, index:int) -> Tuple[str, str]:
+        """
+        Retrieves the id and name of the sensor with given index.
+        :param index: The index.
+        :type index: int
+        :return: The id and the name, or (None, None) if unknown.
+        :rtype: Tuple[str, str]
+        """
+        result = self._entries.get(index, None)
+        if result is None:
+            # maybe registered by another process
+            with self._lock:
+                self._load()
+                result = self._entries.get(index, (None, None))
+        return result
+
+    def _load(self):
+        """
+        Reads the sidecar file, if it changed since the last time.
+        """
+        try:
+            mtime = os.stat(self._path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime:
+            return
+        with open(self._path, 'r') as file:
+            for index, entry in json.load(file).items():
+                self._entries[int(index)] = (entry['id'], entry['name'])
+                self._indexes[entry['id']] = int(index)
+        self._mtime = mtime
+
+    def _next_index(self) -> int:
+        """
+        Retrieves the first free index. Must be called with the lock held.
+        :return: Such index.
+        :rtype: int
+        """
+        return max(self._entries.keys(), default=-1) + 1
+
+    def _register(self, index:int, sensorId:str, sensorName:str):
+        """
+        Registers a sensor. Must be called with the lock held.
+        """
+        self._entries[index] = (sensorId, sensorName)
+        self._indexes[sensorId] = index
+
+    def _save(self):
+        """
+        Writes the sidecar file atomically. Must be called with the lock held.
+        """
+        folder = os.path.dirname(self._path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        temporary = f"{self._path}.tmp"
+        with open(temporary, 'w') as file:
+            json.dump({ str(index): { 'id': sensor_id, 'name': name } for index, (sensor_id, name) in sorted(self._entries.items()) }, file, indent=2)
+        os.replace(temporary, self._path)
+        self._mtime = os.stat(self._path).st_mtime_ns
@@ -0,0 +1,87 @@
+"""
+a2sensor/sensor_collect/sensor_state.py
+
+This script defines the SensorState class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+class SensorState():
+    """
+    Computes the status of a sensor incrementally, in constant time per sample.
+
+    It's equivalent to keeping the last max(active, inactive) samples and checking whether the
+    most recent ones are all active ("empty") or all inactive ("stuck"), as LocalSensors.to_status
+    does, but it only tracks how many samples have been seen and the length of the current run.
+
+    Class name: SensorState
+
+    Responsibilities:
+        - Track the consecutive active and inactive samples of a sensor.
+        - Derive its status.
+
+    Collaborators:
+        - None
+    """
+
+    __slots__ = ("active_threshold", "inactive_threshold", "window", "samples", "active_needed", "inactive_needed", "active_run", "inactive_run", "status")
+
+    def __init__(self, timesActiveUntilConsideredStuck:int=5, timesInactiveUntilConsideredEmpty:int=5):
+        """
+        Creates a new SensorState instance.
+        :param timesActiveUntilConsideredStuck: The setting with the same name in the sensors file.
+        :type timesActiveUntilConsideredStuck: int
+        :param timesInactiveUntilConsideredEmpty: The setting with the same name in the sensors file.
+        :type timesInactiveUntilConsideredEmpty: int
+        """
+        super().__init__()
+        self.active_threshold = timesActiveUntilConsideredStuck
+        self.inactive_threshold = timesInactiveUntilConsideredEmpty
+        self.window = max(timesActiveUntilConsideredStuck, timesInactiveUntilConsideredEmpty)
+        self.samples = 0
+        self.active_needed = 0
+        self.inactive_needed = 0
+        self.active_run = 0
+        self.inactive_run = 0
+        self.status = None
+
+    def update(self, value) -> str:
+        """
+        Processes a new sample.
+        :param value: The value read from the sensor.
+        :type value: int
+        :return: The resulting status: "empty", "stuck" or "ok".
+        :rtype: str
+        """
+        if self.samples < self.window:
+            self.samples += 1
+            self.active_needed = min(self.active_threshold, self.samples)
+            self.inactive_needed = min(self.inactive_threshold, self.samples)
+        if value:
+            self.active_run += 1
+            self.inactive_run = 0
+        else:
+            self.inactive_run += 1
+            self.active_run = 0
+
+        if self.active_run >= self.active_needed:
+            self.status = "empty"
+        elif self.inactive_run >= self.inactive_needed:
+            self.status = "stuck"
+        else:
+            self.status = "ok"
+
+        return self.status
@@ -18,11 +18,20 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
-from datetime import datetime
-import json
+from .change_only_filter import ChangeOnlyFilter
+from .json_codec import JsonCodec
 import logging
+from .measure import Measure
+from .measure_storage import MeasureStorage
+from .metrics import Metrics
 import os
+from .reading_log import ReadingLog
+from .status_cache import StatusCache
 import sys
+import threading
+import time
+from typing import Dict, Iterator, List
+from .write_behind_queue import WriteBehindQueue
 
 class Server():
     """
@@ -38,24 +47,159 @@ class Server():
     """
     _instance = None
 
-    def __init__(self, storageFolder:str, localSensorsConfig:str=None):
+    ENVIRONMENT_OPTIONS = [
+        ("STORAGE_BACKEND", "storageBackend", str),
+        ("FLUSH_INTERVAL", "flushInterval", float),
+        ("SEGMENT_MAX_BYTES", "segmentMaxBytes", int),
+        ("SEGMENT_MAX_AGE", "segmentMaxAge", float),
+        ("QUEUE_SIZE", "queueSize", int),
+        ("QUEUE_POLICY", "queuePolicy", str),
+        ("CHANGE_ONLY", "changeOnly", lambda value: value.lower() in [ "1", "true", "yes", "on" ]),
+        ("HEARTBEAT", "heartbeat", float),
+        ("SAMPLER", "sampler", str),
+        ("GPIO_BACKEND", "gpioBackend", str),
+        ("RELOAD_INTERVAL", "reloadInterval", float),
+        ("UDP_PORT", "udpPort", int),
+        ("UDP_ACK", "udpAck", lambda value: value.lower() in [ "1", "true", "yes", "on" ]),
+        ("HTTP_PORT", "httpPort", int),
+        ("HTTP_HOST", "httpHost", str),
+        ("ROLLUP_INTERVAL", "rollupInterval", float),
+        ("RAW_RETENTION", "rawRetention", float),
+        ("LOG_TRANSITIONS_ONLY", "logTransitionsOnly", lambda value: value.lower() in [ "1", "true", "yes", "on" ]),
+        ("LOG_RATE", "logRate", float),
+        ("LOG_SAMPLE", "logSample", int),
+        ("UPLINK_URL", "uplinkUrl", str),
+        ("UPLINK_BATCH_SIZE", "uplinkBatchSize", int),
+        ("UPLINK_INTERVAL", "uplinkInterval", float),
+        ("UPLINK_SPOOL_MAX_BYTES", "uplinkSpoolMaxBytes", int),
+        ("JSON_CODEC", "jsonCodec", str),
+        ("RULES_FILE", "rulesFile", str),
+    ]
+
+    def __init__(self, storageFolder:str, localSensorsConfig:str=None, storageBackend:str="segmented", flushInterval:float=1.0, segmentMaxBytes:int=4194304, segmentMaxAge:float=3600.0, queueSize:int=10000, queuePolicy:str="block", changeOnly:bool=False, heartbeat:float=300.0, sampler:str="threads", gpioBackend:str="rpi", reloadInterval:float=2.0, udpPort:int=None, udpAck:bool=False, httpPort:int=None, httpHost:str="0.0.0.0", rollupInterval:float=60.0, rawRetention:float=0, logTransitionsOnly:bool=False, logRate:float=0, logSample:int=1, uplinkUrl:str=None, uplinkBatchSize:int=500, uplinkInterval:float=1.0, uplinkSpoolMaxBytes:int=268435456, jsonCodec:str="auto", rulesFile:str=None):
         """
         Creates a new Server instance.
         :param storageFolder: The folder to store measures.
         :type storageFolder: str
         :param localSensorsConfig: The configuration file specifying the local sensors. Optional
         :type localSensorsConfig: bool
+        :param storageBackend: The storage backend: "segmented", "binary", or "json" for the legacy one-file-per-measure layout.
+        :type storageBackend: str
+        :param flushInterval: The seconds between flushes of the segmented storage.
+        :type flushInterval: float
+        :param segmentMaxBytes: The size after which segments are rolled.
+        :type segmentMaxBytes: int
+        :param segmentMaxAge: The seconds after which segments are rolled.
+        :type segmentMaxAge: float
+        :param queueSize: The size of the write-behind queue. Zero writes synchronously.
+        :type queueSize: int
+        :param queuePolicy: The policy when the write-behind queue is full: "block", "drop-oldest" or "coalesce".
+        :type queuePolicy: str
+        :param changeOnly: Whether to persist only status transitions, plus a heartbeat.
+        :type changeOnly: bool
+        :param heartbeat: The seconds between keep-alive records when persisting only transitions.
+        :type heartbeat: float
+        :param sampler: How local sensors are sampled: one "threads" per sensor, or a single "scheduler".
+        :type sampler: str
+        :param gpioBackend: Where local sensors are read from: "rpi" (RPi.GPIO), or "simulated" random traces.
+        :type gpioBackend: str
+        :param reloadInterval: The seconds between checks of the local sensors file for changes. Zero disables reloading.
+        :type reloadInterval: float
+        :param udpPort: The port to ingest measures over UDP. Optional.
+        :type udpPort: int
+        :param udpAck: Whether to acknowledge each UDP datagram.
+        :type udpAck: bool
+        :param httpPort: The port to ingest measures with the asyncio HTTP server. Optional.
+        :type httpPort: int
+        :param httpHost: The address the asyncio HTTP server binds to.
+        :type httpHost: str
+        :param rollupInterval: The seconds between runs of the per-minute and per-hour aggregation. Zero disables it.
+        :type rollupInterval: float
+        :param rawRetention: The seconds raw measures are kept once aggregated. Zero keeps them forever.
+        :type rawRetention: float
+        :param logTransitionsOnly: Whether to log only the readings that change the status of a sensor.
+        :type logTransitionsOnly: bool
+        :param logRate: The most reading lines logged per second. Zero means no limit.
+        :type logRate: float
+        :param logSample: Log one in every this many readings.
+        :type logSample: int
+        :param uplinkUrl: The base URL of an upstream sensor-collect to forward measures to. Optional.
+        :type uplinkUrl: str
+        :param uplinkBatchSize: The most measures forwarded per request.
+        :type uplinkBatchSize: int
+        :param uplinkInterval: The most seconds a measure waits before being forwarded.
+        :type uplinkInterval: float
+        :param uplinkSpoolMaxBytes: The size after which the oldest measures not forwarded yet are dropped.
+        :type uplinkSpoolMaxBytes: int
+        :param jsonCodec: The JSON library: "json", "orjson", or "auto" to use orjson if installed.
+        :type jsonCodec: str
+        :param rulesFile: The TOML file with the alert rules to evaluate on the ingested measures, and their sinks. Optional.
+        :type rulesFile: str
         """
         super().__init__()
+        JsonCodec.configure(jsonCodec)
         self._storage_folder = storageFolder
         self._local_sensors_config = localSensorsConfig
+        self._local_sensors = None
+        self._udp_port = udpPort
+        self._udp_ack = udpAck
+        self._udp_server = None
+        self._http_port = httpPort
+        self._http_host = httpHost
+        self._http_server = None
+        self._logger = logging.getLogger("a2sensor")
+        self._metrics = Metrics.instance()
+        self._reading_log = ReadingLog(self._logger, logTransitionsOnly, logRate, logSample)
 
         if not os.path.exists(self._storage_folder):
             os.makedirs(self._storage_folder)  # create the folder if it doesn't exist
 
+        from .logging_config import LoggingConfig
+        self._storage = MeasureStorage.for_backend(storageBackend, storageFolder, LoggingConfig.instance().date_format, flushInterval, segmentMaxBytes, segmentMaxAge)
+
         if localSensorsConfig:
             from .local_sensors import LocalSensors
-            self._local_sensors = LocalSensors(localSensorsConfig, self.save_to_file)
+            self._local_sensors = LocalSensors(localSensorsConfig, self.save_to_file, sampler, LocalSensors.gpio_for_backend(gpioBackend), reloadInterval)
+            self._storage.register_sensors(self._local_sensors.sensors)
+
+        self._status_cache = StatusCache()
+        self._status_cache.warm(self._storage)
+
+        self._change_only_filter = ChangeOnlyFilter(heartbeat) if changeOnly else None
+
+        self._write_behind = None
+        if queueSize > 0:
+            exit_event = self._local_sensors.exit_event if self._local_sensors else threading.Event()
+            self._write_behind = WriteBehindQueue(self.write, exit_event, queueSize, queuePolicy)
+            write_behind = self._write_behind
+            self._metrics.gauge("a2sensor_write_behind_depth", "Measures waiting in the write-behind queue.", lambda: write_behind.depth)
+            self._metrics.gauge("a2sensor_write_behind_dropped", "Measures dropped by the write-behind queue.", lambda: write_behind.dropped)
+            self._metrics.gauge("a2sensor_write_behind_coalesced", "Measures coalesced by the write-behind queue.", lambda: write_behind.coalesced)
+
+        self._uplink = None
+        if uplinkUrl:
+            from .uplink import Uplink
+            from .uplink_spool import UplinkSpool
+            self._uplink = Uplink(uplinkUrl, UplinkSpool(os.path.join(storageFolder, ".uplink"), maxBytes=uplinkSpoolMaxBytes), uplinkBatchSize, uplinkInterval)
+            spool = self._uplink.spool
+            self._metrics.gauge("a2sensor_uplink_backlog_bytes", "Bytes of measures spooled and not forwarded yet.", lambda: spool.backlog)
+
+        self._rules_engine = None
+        if rulesFile:
+            from .rules_engine import RulesEngine
+            self._rules_engine = RulesEngine.from_file(rulesFile)
+            rules_engine = self._rules_engine
+            self._metrics.gauge("a2sensor_rules_queue_depth", "Measures waiting to be evaluated by the alert rules.", lambda: rules_engine.depth)
+            self._metrics.gauge("a2sensor_rules_dropped", "Measures dropped by the alert rules queue.", lambda: rules_engine.dropped)
+
+        self._rollups = None
+        self._rollups_stop = threading.Event()
+        self._rollups_thread = None
+        if rollupInterval > 0:
+            from .rollups import Rollups
+            self._rollups = Rollups(self._storage, rawRetention)
+            self._rollups_thread = threading.Thread(target=self._rollups.run_periodically, args=(rollupInterval, self._rollups_stop), name="rollups", daemon=True)
+            self._rollups_thread.start()
 
     @property
     def storage_folder(self):
@@ -66,6 +210,114 @@ class Server():
         """
         return self._storage_folder
 
+    @property
+    def storage(self) -> MeasureStorage:
+        """
+        Retrieves the storage engine.
+        :return: Such storage.
+        :rtype: a2sensor.sensor_collect.MeasureStorage
+        """
+        return self._storage
+
+    @property
+    def write_behind(self) -> WriteBehindQueue:
+        """
+        Retrieves the write-behind queue, if any.
+        :return: Such queue, or None if measures are written synchronously.
+        :rtype: a2sensor.sensor_collect.WriteBehindQueue
+        """
+        return self._write_behind
+
+    @property
+    def status_cache(self) -> StatusCache:
+        """
+        Retrieves the cache with the current status of each sensor.
+        :return: Such cache.
+        :rtype: a2sensor.sensor_collect.StatusCache
+        """
+        return self._status_cache
+
+    @property
+    def change_only_filter(self) -> ChangeOnlyFilter:
+        """
+        Retrieves the filter reducing measures to status transitions, if any.
+        :return: Such filter, or None if every measure is persisted.
+        :rtype: a2sensor.sensor_collect.ChangeOnlyFilter
+        """
+        return self._change_only_filter
+
+    @property
+    def rollups(self):
+        """
+        Retrieves the per-minute and per-hour aggregates, if enabled.
+        :return: Such aggregates, or None.
+        :rtype: a2sensor.sensor_collect.Rollups
+        """
+        return self._rollups
+
+    @property
+    def udp_port(self) -> int:
+        """
+        Retrieves the port to ingest measures over UDP, if any.
+        :return: Such port.
+        :rtype: int
+        """
+        return self._udp_port
+
+    @property
+    def udp_ack(self) -> bool:
+        """
+        Retrieves whether each UDP datagram gets acknowledged.
+        :return: Such flag.
+        :rtype: bool
+        """
+        return self._udp_ack
+
+    @property
+    def http_port(self) -> int:
+        """
+        Retrieves the port of the asyncio HTTP server, if any.
+        :return: Such port.
+        :rtype: int
+        """
+        return self._http_port
+
+    @property
+    def uplink(self):
+        """
+        Retrieves what forwards measures upstream, if any.
+        :return: Such instance, or None.
+        :rtype: a2sensor.sensor_collect.Uplink
+        """
+        return self._uplink
+
+    @property
+    def rules_engine(self):
+        """
+        Retrieves what evaluates the alert rules, if any.
+        :return: Such instance, or None.
+        :rtype: a2sensor.sensor_collect.RulesEngine
+        """
+        return self._rules_engine
+
+    @property
+    def reading_log(self) -> ReadingLog:
+        """
+        Retrieves what decides which readings get logged.
+        :return: Such instance.
+        :rtype: a2sensor.sensor_collect.ReadingLog
+        """
+        return self._reading_log
+
+    @property
+    def metrics(self) -> Metrics:
+        """
+        Retrieves the metrics.
+        :return: Such metrics.
+        :rtype: a2sensor.sensor_collect.Metrics
+        """
+        return self._metrics
+
     @property
     def local_sensors_config(self) -> str:
         """
@@ -94,38 +346,158 @@ class Server():
         :param status: The status the sensor has read.
         :type status: str
         """
-        now = datetime.now()
-        from .logging_config import LoggingConfig
-        timestamp = now.strftime(LoggingConfig.instance().date_format)
-        data = {}
-        data['id'] = sensorId
-        data['name'] = sensorName
-        value = {}
-        value['status'] = status
-        value['timestamp'] = timestamp
-        data['value'] = value
-
-        logging.getLogger("a2sensor").info(f"{sensorId}: {data['value']['status']}")
-        folder = os.path.join(self.storage_folder, sensorId)
-        if not os.path.exists(folder):
-            os.makedirs(folder)
-
-        basename = now.strftime("%Y%m%d%H%M%S%f")
-        filepath = os.path.join(folder, f"{basename}.json")
-
-        with open(filepath, 'w') as file:
-            json.dump(data, file)
+        measure = Measure(sensorId, sensorName, status)
+        self._status_cache.update(measure)
+        if self._rules_engine is not None:
+            self._rules_engine.put(measure)
+        if self._change_only_filter is None:
+            self.persist([ measure ])
+        else:
+            measures = self._change_only_filter.filter(measure)
+            if measures:
+                self.persist(measures)
+
+    def save_all(self, measures:List[Measure]):
+        """
+        Saves given measures to disk, as a single write.
+        :param measures: The measures.
+        :type measures: List[a2sensor.sensor_collect.Measure]
+        """
+        for measure in measures:
+            self._status_cache.update(measure)
+        if self._rules_engine is not None:
+            self._rules_engine.put_all(measures)
+        if self._change_only_filter is not None:
+            measures = [ persisted for measure in measures for persisted in self._change_only_filter.filter(measure) ]
+        if measures:
+            self.persist(measures)
+
+    def persist(self, measures:List[Measure]):
+        """
+        Hands given measures to the write-behind queue, or writes them if there's none.
+        :param measures: The measures.
+        :type measures: List[a2sensor.sensor_collect.Measure]
+        """
+        if self._write_behind is None:
+            self.write(measures)
+        else:
+            self._write_behind.put_all(measures)
+
+    def write(self, measures:List[Measure]):
+        """
+        Writes given measures to the storage.
+        :param measures: The measures.
+        :type measures: List[a2sensor.sensor_collect.Measure]
+        """
+        self._reading_log.log(measures)
+        started = time.perf_counter()
+        self._storage.append_all(measures)
+        if self._uplink is not None:
+            self._uplink.put_all(measures)
+        metrics = self._metrics
+        metrics.observe("a2sensor_storage_write_seconds", time.perf_counter() - started)
+        # the count of the persist histogram is the number of measures written
+        now = time.time_ns() // 1000
+        if len(measures) == 1:
+            # the sampling path writes one measure at a time
+            metrics.observe("a2sensor_sample_persist_seconds", (now - measures[0].epoch) / 1000000)
+        else:
+            metrics.observe_all("a2sensor_sample_persist_seconds", [ (now - measure.epoch) / 1000000 for measure in measures ])
+
+    def query(self, sensorId:str, start:int=None, end:int=None) -> Iterator[Measure]:
+        """
+        Reads the stored measures of given sensor within a time range, oldest first, lazily.
+        :param sensorId: The id of the sensor.
+        :type sensorId: str
+        :param start: The first time to include, in microseconds since the epoch. Optional.
+        :type start: int
+        :param end: The first time to exclude, in microseconds since the epoch. Optional.
+        :type end: int
+        :return: The measures.
+        :rtype: Iterator[a2sensor.sensor_collect.Measure]
+        """
+        return self.storage.query(sensorId, start, end)
+
+    def start_udp_server(self):
+        """
+        Starts ingesting measures over UDP in the background, if an UDP port is configured.
+        """
+        if self._udp_port is not None and self._udp_server is None:
+            from .udp_server import UdpServer
+            self._udp_server = UdpServer(self, self._udp_port, ack=self._udp_ack)
+            self._udp_server.start()
+
+    def start_http_server(self):
+        """
+        Starts ingesting measures with the asyncio HTTP server in the background, if an HTTP port is configured.
+        """
+        if self._http_port is not None and self._http_server is None:
+            from .async_http_server import AsyncHttpServer
+            self._http_server = AsyncHttpServer(self, self._http_port, self._http_host)
+            self._http_server.start()
+
+    def close(self):
+        """
+        Ends the status long-polls and streams, drains the write-behind queue, and flushes and closes the storage.
+        """
+        if self._udp_server is not None:
+            self._udp_server.stop()
+        if self._http_server is not None:
+            self._http_server.stop()
+        self._status_cache.close()
+        if self._rollups_thread is not None:
+            self._rollups_stop.set()
+            self._rollups_thread.join()
+        if self._change_only_filter is not None:
+            self.persist(self._change_only_filter.flush())
+        if self._write_behind is not None:
+            self._write_behind.close()
+        if self._uplink is not None:
+            self._uplink.close()
+        if self._rules_engine is not None:
+            self._rules_engine.close()
+        self.storage.close()
 
     @classmethod
-    def configure(cls, dataFolder:str=None, localSensorsFile:str=None):
+    def configure(cls, dataFolder:str=None, localSensorsFile:str=None, **options):
         """
         Configures the server to use that folder.
         :param dataFolder: The storage folder.
         :type dataFolder: str
         :param localSensorsFile: The sensor definition file.
         :type localSensorsFile: str
+        :param options: Any other keyword argument accepted by the constructor.
+        :type options: Dict
+        """
+        cls._instance = Server(dataFolder, localSensorsFile, **options)
+
+    @classmethod
+    def connect(cls, socketPath:str, dataFolder:str, **options):
+        """
+        Configures this process to forward measures to an aggregator, instead of storing them.
+        :param socketPath: The path of the aggregator's Unix socket.
+        :type socketPath: str
+        :param dataFolder: The storage folder, to read measures from.
+        :type dataFolder: str
+        :param options: Any other keyword argument accepted by the constructor.
+        :type options: Dict
+        """
+        from .aggregator_client import AggregatorClient
+        cls._instance = AggregatorClient(socketPath, dataFolder, **options)
+
+    @classmethod
+    def options_from_environment(cls) -> Dict:
+        """
+        Retrieves the constructor options from environment variables.
+        :return: The options found.
+        :rtype: Dict
         """
-        cls._instance = Server(dataFolder, localSensorsFile)
+        result = {}
+        for variable, option, kind in cls.ENVIRONMENT_OPTIONS:
+            value = os.environ.get(variable, None)
+            if value is not None:
+                result[option] = kind(value)
+        return result
 
     @classmethod
     def instance(cls):
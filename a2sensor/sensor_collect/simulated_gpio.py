@@ -0,0 +1,228 @@
+"""
+a2sensor/sensor_collect/simulated_gpio.py
+
+This script defines the SimulatedGpio class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import random
+import threading
+from typing import Callable, Dict, List
+
+class SimulatedGpio():
+    """
+    Stands for RPi.GPIO off a Raspberry Pi, replaying scripted or random pin traces.
+
+    Pins with a scripted trace cycle through it; any other pin follows a random trace where
+    each level is kept with the "stickiness" probability, so both short and long runs show up.
+    Random traces are seeded per pin, so they don't depend on the order pins are read in.
+    Each input() reads the next level of the trace, except on pins with edge detection, whose
+    level only changes with step() or set_level(), which fire the edge callbacks.
+
+    Class name: SimulatedGpio
+
+    Responsibilities:
+        - Implement the part of the RPi.GPIO interface the samplers use.
+        - Produce reproducible pin traces.
+
+    Collaborators:
+        - a2sensor.sensor_collect.LocalSensors
+        - a2sensor.sensor_collect.GpioScheduler
+    """
+
+    BOARD = 10
+    BCM = 11
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self, traces:Dict[int, List[int]]=None, seed:int=0, stickiness:float=0.9):
+        """
+        Creates a new SimulatedGpio instance.
+        :param traces: The scripted levels of some pins. Optional.
+        :type traces: Dict[int, List[int]]
+        :param seed: The seed of the random traces. None makes them irreproducible.
+        :type seed: int
+        :param stickiness: The probability of a random trace keeping its level on each step.
+        :type stickiness: float
+        """
+        super().__init__()
+        self._traces = { pin: list(trace) for pin, trace in (traces or {}).items() }
+        self._seed = seed
+        self._stickiness = stickiness
+        self._mode = None
+        self._positions = {}
+        self._generators = {}
+        self._levels = {}
+        # pin -> (edge, callback)
+        self._edge_callbacks = {}
+        self._reads = 0
+        self._lock = threading.Lock()
+
+    @property
+    def mode(self) -> int:
+        """
+        Retrieves the pin numbering mode, once set.
+        :return: Such mode.
+        :rtype: int
+        """
+        return self._mode
+
+    @property
+    def reads(self) -> int:
+        """
+        Retrieves the number of input() calls so far.
+        :return: Such number.
+        :rtype: int
+        """
+        return self._reads
+
+    def setmode(self, mode:int):
+        """
+        Sets the pin numbering mode.
+        :param mode: Either BCM or BOARD.
+        :type mode: int
+        """
+        self._mode = mode
+
+    def setup(self, channel:int, direction:int, pull_up_down:int=None, initial:int=None):
+        """
+        Sets up a pin.
+        :param channel: The pin.
+        :type channel: int
+        :param direction: Either IN or OUT.
+        :type direction: int
+        :param pull_up_down: Ignored.
+        :type pull_up_down: int
+        :param initial: The initial level of an output pin. Optional.
+        :type initial: int
+        """
+        if initial is not None:
+            self._levels[channel] = initial
+
+    def _next_level(self, channel:int) -> int:
+        """
+        Advances the trace of a pin. Must be called with the lock held.
+        :param channel: The pin.
+        :type channel: int
+        :return: The new level.
+        :rtype: int
+        """
+        trace = self._traces.get(channel, None)
+        if trace:
+            position = self._positions.get(channel, 0)
+            self._positions[channel] = position + 1
+            return trace[position % len(trace)]
+        generator = self._generators.get(channel, None)
+        if generator is None:
+            generator = random.Random(None if self._seed is None else self._seed * 65536 + channel)
+            self._generators[channel] = generator
+            return generator.randint(0, 1)
+        level = self._levels.get(channel, 0)
+        return level if generator.random() < self._stickiness else 1 - level
+
+    def input(self, channel:int) -> int:
+        """
+        Reads a pin.
+        :param channel: The pin.
+        :type channel: int
+        :return: The level.
+        :rtype: int
+        """
+        with self._lock:
+            self._reads += 1
+            if channel not in self._edge_callbacks:
+                self._levels[channel] = self._next_level(channel)
+            return self._levels.get(channel, 0)
+
+    def output(self, channel:int, value:int):
+        """
+        Drives a pin.
+        :param channel: The pin.
+        :type channel: int
+        :param value: The level.
+        :type value: int
+        """
+        self.set_level(channel, value)
+
+    def set_level(self, channel:int, value:int):
+        """
+        Changes the level of a pin, firing its edge callback if the change matches.
+        :param channel: The pin.
+        :type channel: int
+        :param value: The level.
+        :type value: int
+        """
+        with self._lock:
+            previous = self._levels.get(channel, 0)
+            self._levels[channel] = value
+            edge, callback = self._edge_callbacks.get(channel, (None, None))
+        if callback is not None and previous != value:
+            if edge == self.__class__.BOTH or (edge == self.__class__.RISING) == (value == 1):
+                callback(channel)
+
+    def step(self, channel:int) -> int:
+        """
+        Advances the trace of a pin, as if its signal changed.
+        :param channel: The pin.
+        :type channel: int
+        :return: The new level.
+        :rtype: int
+        """
+        with self._lock:
+            level = self._next_level(channel)
+        self.set_level(channel, level)
+        return level
+
+    def add_event_detect(self, channel:int, edge:int, callback:Callable[[int], None]=None, bouncetime:int=None):
+        """
+        Calls given function on the edges of a pin.
+        :param channel: The pin.
+        :type channel: int
+        :param edge: Either RISING, FALLING or BOTH.
+        :type edge: int
+        :param callback: The function, receiving the pin.
+        :type callback: Callable[[int], None]
+        :param bouncetime: Ignored.
+        :type bouncetime: int
+        """
+        with self._lock:
+            self._edge_callbacks[channel] = (edge, callback)
+
+    def remove_event_detect(self, channel:int):
+        """
+        Stops calling the edge callback of a pin.
+        :param channel: The pin.
+        :type channel: int
+        """
+        with self._lock:
+            self._edge_callbacks.pop(channel, None)
+
+    def cleanup(self, channel:int=None):
+        """
+        Releases one or every pin.
+        :param channel: The pin. Optional.
+        :type channel: int
+        """
+        with self._lock:
+            if channel is None:
+                self._edge_callbacks = {}
+            else:
+                self._edge_callbacks.pop(channel, None)
@@ -0,0 +1,270 @@
+"""
+a2sensor/sensor_collect/status_cache.py
+
+This script defines the StatusCache class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from .measure import Measure
+import threading
+import time
+from typing import Dict, Tuple
+
+class StatusCache():
+    """
+    Thread-safe cache of the current status of every sensor.
+
+    Its version only changes when the status of a sensor does, so it doubles as an ETag
+    and lets clients wait for the next change. A cache can also mirror another one, i.e. in
+    another process, sharing its nonce and versions so their entity tags are interchangeable.
+
+    Class name: StatusCache
+
+    Responsibilities:
+        - Keep the last status of each sensor, and since when it holds.
+        - Notify waiting clients when a status changes, or when the cache is closed.
+
+    Collaborators:
+        - a2sensor.sensor_collect.Measure
+        - a2sensor.sensor_collect.MeasureStorage
+    """
+
+    def __init__(self, nonce:str=None):
+        """
+        Creates a new StatusCache instance.
+        :param nonce: The nonce of the cache being mirrored, if any.
+        :type nonce: str
+        """
+        super().__init__()
+        # sensorId -> { "name", "status", "since", "last" (epoch of the newest measure), "version" }
+        self._entries = {}
+        self._version = 0
+        # distinguishes the versions of different runs
+        self._nonce = nonce if nonce is not None else format(time.time_ns() // 1000, "x")
+        self._condition = threading.Condition()
+        # (event loop, future) of each client waiting in an event loop
+        self._waiters = set()
+        self._closed = False
+
+    @property
+    def version(self) -> int:
+        """
+        Retrieves the current version, increased on each status change.
+        :return: Such version.
+        :rtype: int
+        """
+        return self._version
+
+    @property
+    def closed(self) -> bool:
+        """
+        Retrieves whether the cache is closed, i.e. the server is stopping.
+        :return: Such flag.
+        :rtype: bool
+        """
+        return self._closed
+
+    @property
+    def nonce(self) -> str:
+        """
+        Retrieves the nonce distinguishing the versions of this cache from other runs.
+        :return: Such nonce.
+        :rtype: str
+        """
+        return self._nonce
+
+    @property
+    def etag(self) -> str:
+        """
+        Retrieves the entity tag of the current version.
+        :return: Such tag, quoted.
+        :rtype: str
+        """
+        return self.etag_of(self._version)
+
+    def etag_of(self, version:int) -> str:
+        """
+        Retrieves the entity tag of given version.
+        :param version: The version.
+        :type version: int
+        :return: Such tag, quoted.
+        :rtype: str
+        """
+        return f'"{self._nonce}-{version}"'
+
+    def version_of(self, etag:str) -> int:
+        """
+        Retrieves the version of given entity tag.
+        :param etag: The entity tag, quoted or not.
+        :type etag: str
+        :return: The version, or None if the tag doesn't belong to this cache.
+        :rtype: int
+        """
+        nonce, separator, version = etag.strip().strip('"').partition("-")
+        if nonce != self._nonce or not version.isdigit():
+            return None
+        return int(version)
+
+    def update(self, measure:Measure) -> bool:
+        """
+        Updates the cache with given measure, unless it's older than the newest one of its sensor,
+        i.e. it arrived late, as storage's latest() does.
+        :param measure: The measure.
+        :type measure: a2sensor.sensor_collect.Measure
+        :return: True if the status of the sensor changed.
+        :rtype: bool
+        """
+        entry = self._entries.get(measure.sensor_id, None)
+        if entry is not None and entry["status"] == measure.status:
+            if measure.epoch > entry["last"]:
+                entry["last"] = measure.epoch
+            return False
+        with self._condition:
+            entry = self._entries.get(measure.sensor_id, None)
+            if entry is not None and (entry["status"] == measure.status or measure.epoch < entry["last"]):
+                if measure.epoch > entry["last"]:
+                    entry["last"] = measure.epoch
+                return False
+            self._version += 1
+            self._entries[measure.sensor_id] = { "name": measure.sensor_name, "status": measure.status, "since": measure.epoch, "last": measure.epoch, "version": self._version }
+            self._notify_all()
+        return True
+
+    def snapshot(self, sinceVersion:int=0) -> Tuple[int, Dict[str, Dict]]:
+        """
+        Retrieves the status of the sensors that changed after given version.
+        :param sinceVersion: The version. Zero means all sensors.
+        :type sinceVersion: int
+        :return: The current version, and the name, status and since (epoch in microseconds) of each sensor.
+        :rtype: Tuple[int, Dict[str, Dict]]
+        """
+        with self._condition:
+            return self._version, { sensor_id: { "name": entry["name"], "status": entry["status"], "since": entry["since"] }
+                                    for sensor_id, entry in self._entries.items() if entry["version"] > sinceVersion }
+
+    def apply(self, version:int, sensors:Dict[str, Dict]):
+        """
+        Applies a snapshot of the mirrored cache.
+        :param version: The version of the snapshot.
+        :type version: int
+        :param sensors: The sensors that changed, as returned by snapshot().
+        :type sensors: Dict[str, Dict]
+        """
+        with self._condition:
+            for sensor_id, entry in sensors.items():
+                self._entries[sensor_id] = { "name": entry["name"], "status": entry["status"], "since": entry["since"], "last": entry["since"], "version": version }
+            if version != self._version:
+                self._version = version
+                self._notify_all()
+
+    def wait_for_change(self, version:int, timeout:float) -> bool:
+        """
+        Waits until the cache moves past given version, gets reset, or gets closed.
+        :param version: The version known by the caller.
+        :type version: int
+        :param timeout: The maximum number of seconds to wait.
+        :type timeout: float
+        :return: True if the version changed, or the cache was reset.
+        :rtype: bool
+        """
+        with self._condition:
+            nonce = self._nonce
+            self._condition.wait_for(lambda: self._version != version or self._nonce != nonce or self._closed, timeout)
+            return self._version != version or self._nonce != nonce
+
+    async def wait_for_change_async(self, version:int, timeout:float) -> bool:
+        """
+        Waits in the running event loop, without blocking it nor any thread, until the cache
+        moves past given version, gets reset, or gets closed.
+        :param version: The version known by the caller.
+        :type version: int
+        :param timeout: The maximum number of seconds to wait.
+        :type timeout: float
+        :return: True if the version changed, or the cache was reset.
+        :rtype: bool
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        with self._condition:
+            nonce = self._nonce
+            if self._version != version or self._nonce != nonce or self._closed:
+                return self._version != version
+            future = loop.create_future()
+            waiter = (loop, future)
+            self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._condition:
+                self._waiters.discard(waiter)
+        with self._condition:
+            return self._version != version or self._nonce != nonce
+
+    def reset(self, nonce:str):
+        """
+        Forgets every entry and starts over with given nonce, waking up every waiting client.
+        :param nonce: The new nonce.
+        :type nonce: str
+        """
+        with self._condition:
+            self._entries = {}
+            self._version = 0
+            self._nonce = nonce
+            self._notify_all()
+
+    def close(self):
+        """
+        Wakes up every waiting client, and lets the ones streaming changes know they must stop.
+        """
+        with self._condition:
+            self._closed = True
+            self._notify_all()
+
+    def warm(self, storage):
+        """
+        Loads the last stored status of each sensor.
+        :param storage: The storage.
+        :type storage: a2sensor.sensor_collect.MeasureStorage
+        """
+        for sensor_id in storage.sensor_ids():
+            measure = storage.latest(sensor_id)
+            if measure is not None:
+                self.update(measure)
+
+    def _notify_all(self):
+        """
+        Wakes up every waiting client, either in a thread or in an event loop. The condition must be held.
+        """
+        self._condition.notify_all()
+        for loop, future in self._waiters:
+            try:
+                loop.call_soon_threadsafe(self._wake, future)
+            except RuntimeError:
+                # its event loop is already closed
+                pass
+        self._waiters.clear()
+
+    @staticmethod
+    def _wake(future):
+        """
+        Resolves given future, in its event loop, unless it timed out already.
+        :param future: The future.
+        :type future: asyncio.Future
+        """
+        if not future.done():
+            future.set_result(None)
@@ -0,0 +1,113 @@
+"""
+a2sensor/sensor_collect/time_index.py
+
+This script defines the TimeIndex class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from bisect import bisect_left
+import os
+import threading
+from typing import Callable
+
+class TimeIndex():
+    """
+    Sparse index of the byte offsets of variable-length records in segment files, by time.
+
+    Every `stride` records, it remembers the offset of the next record, and the highest epoch
+    seen before it. Since such epochs never decrease, a binary search finds where to start
+    reading to get the records from a given time on. Indexes are built on first use, and
+    extended incrementally as segments grow.
+
+    Class name: TimeIndex
+
+    Responsibilities:
+        - Find the offset to start reading a segment from, for a given time.
+
+    Collaborators:
+        - None
+    """
+
+    def __init__(self, epochOf:Callable[[bytes], int], stride:int=256):
+        """
+        Creates a new TimeIndex instance.
+        :param epochOf: The function extracting the epoch of a record, or None if it's not valid.
+        :type epochOf: Callable[[bytes], int]
+        :param stride: The number of records between index entries.
+        :type stride: int
+        """
+        super().__init__()
+        self._epoch_of = epochOf
+        self._stride = stride
+        # path -> [ indexed size, highest epochs, offsets, records since last entry, highest epoch ]
+        self._segments = {}
+        self._lock = threading.Lock()
+
+    def seek(self, path:str, start:int) -> int:
+        """
+        Retrieves the offset to read given segment from, to get the records at or after given time.
+        :param path: The path of the segment.
+        :type path: str
+        :param start: The time, in microseconds since the epoch.
+        :type start: int
+        :return: The offset.
+        :rtype: int
+        """
+        with self._lock:
+            entry = self._update(path)
+            position = bisect_left(entry[1], start)
+            return entry[2][position - 1] if position > 0 else 0
+
+    def forget(self, path:str):
+        """
+        Drops the index of given segment, i.e. when it gets removed.
+        :param path: The path of the segment.
+        :type path: str
+        """
+        with self._lock:
+            self._segments.pop(path, None)
+
+    def _update(self, path:str):
+        """
+        Indexes the records appended to given segment since the last time. Must be called with the lock held.
+        :param path: The path of the segment.
+        :type path: str
+        :return: The index entry of the segment.
+        :rtype: List
+        """
+        entry = self._segments.get(path, None)
+        if entry is None:
+            entry = [ 0, [], [], 0, -1 ]
+            self._segments[path] = entry
+        if os.path.getsize(path) > entry[0]:
+            with open(path, 'rb') as file:
+                file.seek(entry[0])
+                offset = entry[0]
+                for record in file:
+                    if not record.endswith(b"\n"):
+                        # still being written
+                        break
+                    if entry[3] >= self._stride:
+                        entry[1].append(entry[4])
+                        entry[2].append(offset)
+                        entry[3] = 0
+                    epoch = self._epoch_of(record)
+                    if epoch is not None and epoch > entry[4]:
+                        entry[4] = epoch
+                    entry[3] += 1
+                    offset += len(record)
+                entry[0] = offset
+        return entry
@@ -0,0 +1,93 @@
+"""
+a2sensor/sensor_collect/timestamp_formatter.py
+
+This script defines the TimestampFormatter class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from datetime import datetime
+
+class TimestampFormatter():
+    """
+    Formats epochs as local timestamps, calling strftime at most once per second.
+
+    Microseconds ("%f") are formatted apart, so formats including them benefit as well.
+
+    Class name: TimestampFormatter
+
+    Responsibilities:
+        - Format epochs with a date format, reusing the text of the last second.
+
+    Collaborators:
+        - None
+    """
+
+    _formatters = {}
+
+    def __init__(self, dateFormat:str):
+        """
+        Creates a new TimestampFormatter instance.
+        :param dateFormat: The date format, as understood by strftime.
+        :type dateFormat: str
+        """
+        super().__init__()
+        self._date_format = dateFormat
+        # the text around the microseconds is what gets cached
+        self._parts = dateFormat.split("%f")
+        # (second, texts), replaced as a whole so concurrent readers see a consistent pair
+        self._last = (None, None)
+
+    @property
+    def date_format(self) -> str:
+        """
+        Retrieves the date format.
+        :return: Such format.
+        :rtype: str
+        """
+        return self._date_format
+
+    def format(self, epoch:int) -> str:
+        """
+        Formats given time.
+        :param epoch: The time, in microseconds since the epoch.
+        :type epoch: int
+        :return: The formatted timestamp.
+        :rtype: str
+        """
+        second, microsecond = divmod(epoch, 1000000)
+        last_second, texts = self._last
+        if last_second != second:
+            moment = datetime.fromtimestamp(second)
+            texts = [ moment.strftime(part) for part in self._parts ]
+            self._last = (second, texts)
+        if len(texts) == 1:
+            return texts[0]
+        return f"{microsecond:06d}".join(texts)
+
+    @classmethod
+    def for_format(cls, dateFormat:str):
+        """
+        Retrieves the shared formatter of given date format.
+        :param dateFormat: The date format.
+        :type dateFormat: str
+        :return: The formatter.
+        :rtype: a2sensor.sensor_collect.TimestampFormatter
+        """
+        result = cls._formatters.get(dateFormat, None)
+        if result is None:
+            result = cls(dateFormat)
+            cls._formatters[dateFormat] = result
+        return result
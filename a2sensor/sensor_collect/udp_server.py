@@ -1,7 +1,7 @@
 """
 a2sensor/sensor_collect/udp_server.py
 
-This script defines an UDP server.
+This script defines the UdpServer class.
 
 Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
 
@@ -18,26 +18,197 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
+import errno
 import logging
+from .measure import Measure
+from .measure_validator import MeasureValidator
+import selectors
 import socket
+import threading
+from typing import List, Tuple
+
+class UdpServer():
+    """
+    Ingests measures sent by constrained sensors over UDP.
+
+    Each datagram carries one or more ASCII records separated by newlines, each one being
+    <sensorId>=<code>, where the code is the index of the status in Measure.STATUSES:
+    0 for "ok", 1 for "empty" and 2 for "stuck". For example: b"tank-1=0\\ntank-2=2".
+    Sensor ids are checked as in the HTTP endpoints, and datagrams are read whole, up to the
+    largest UDP payload.
+
+    Class name: UdpServer
+
+    Responsibilities:
+        - Receive datagrams in batches from a non-blocking socket.
+        - Parse them into measures, and hand each batch to the Server as a single write.
+        - Optionally acknowledge each datagram.
+
+    Collaborators:
+        - a2sensor.sensor_collect.MeasureValidator
+        - a2sensor.sensor_collect.Server
+    """
+
+    # the largest UDP payload
+    MAX_DATAGRAM_SIZE = 65535
+
+    def __init__(self, server, port:int, host:str="0.0.0.0", ack:bool=False, batchSize:int=1024):
+        """
+        Creates a new UdpServer instance.
+        :param server: The server storing the measures.
+        :type server: a2sensor.sensor_collect.Server
+        :param port: The UDP port.
+        :type port: int
+        :param host: The address to bind to.
+        :type host: str
+        :param ack: Whether to answer each datagram with b"ACK".
+        :type ack: bool
+        :param batchSize: The maximum number of datagrams read before handing the measures to the Server.
+        :type batchSize: int
+        """
+        super().__init__()
+        self._server = server
+        self._port = port
+        self._host = host
+        self._ack = ack
+        self._batch_size = batchSize
+        self._received = 0
+        self._invalid = 0
+        self._buffer = None
+        self._stop_event = threading.Event()
+        self._socket = None
+
+    @property
+    def port(self) -> int:
+        """
+        Retrieves the UDP port.
+        :return: Such port.
+        :rtype: int
+        """
+        return self._port
+
+    @property
+    def ack(self) -> bool:
+        """
+        Retrieves whether each datagram is acknowledged.
+        :return: Such flag.
+        :rtype: bool
+        """
+        return self._ack
+
+    @property
+    def received(self) -> int:
+        """
+        Retrieves the number of datagrams received.
+        :return: Such number.
+        :rtype: int
+        """
+        return self._received
+
+    @property
+    def invalid(self) -> int:
+        """
+        Retrieves the number of records that couldn't be parsed.
+        :return: Such number.
+        :rtype: int
+        """
+        return self._invalid
+
+    def parse(self, datagram:bytes) -> List[Measure]:
+        """
+        Parses the records of given datagram.
+        :param datagram: The datagram.
+        :type datagram: bytes
+        :return: The measures.
+        :rtype: List[a2sensor.sensor_collect.Measure]
+        """
+        result = []
+        statuses = Measure.STATUSES
+        for record in datagram.split(b"\n"):
+            sensor_id, separator, code = record.strip().rpartition(b"=")
+            if not separator or not sensor_id or not code.isdigit() or int(code) >= len(statuses):
+                if record.strip():
+                    self._invalid += 1
+                continue
+            name = sensor_id.decode("utf-8", "replace")
+            if not MeasureValidator.is_valid_sensor_id(name):
+                self._invalid += 1
+                continue
+            result.append(Measure(name, name, statuses[int(code)]))
+        return result
+
+    def receive_batch(self, sock:socket.socket) -> Tuple[List[Measure], int]:
+        """
+        Reads the datagrams already waiting in the socket, up to batch_size.
+        :param sock: The non-blocking socket.
+        :type sock: socket.socket
+        :return: The measures, and the number of datagrams read.
+        :rtype: Tuple[List[a2sensor.sensor_collect.Measure], int]
+        """
+        measures = []
+        count = 0
+        if self._buffer is None:
+            self._buffer = bytearray(self.__class__.MAX_DATAGRAM_SIZE)
+        buffer = memoryview(self._buffer)
+        recvfrom_into = sock.recvfrom_into
+        while count < self._batch_size:
+            try:
+                size, address = recvfrom_into(buffer)
+            except (BlockingIOError, InterruptedError):
+                break
+            count += 1
+            measures.extend(self.parse(bytes(buffer[:size])))
+            if self._ack:
+                try:
+                    sock.sendto(b"ACK", address)
+                except OSError as error:
+                    if error.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                        logging.getLogger("a2sensor").warning(f"Cannot acknowledge datagram from {address}: {error}")
+        self._received += count
+        return measures, count
+
+    def run(self):
+        """
+        Receives datagrams until stopped.
+        """
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+            sock.bind((self._host, self._port))
+            sock.setblocking(False)
+            self._socket = sock
+            logging.getLogger("a2sensor").info(f"UDP server running at port {self._port}")
+            with selectors.DefaultSelector() as selector:
+                selector.register(sock, selectors.EVENT_READ)
+                while not self._stop_event.is_set():
+                    if not selector.select(0.5):
+                        continue
+                    measures, count = self.receive_batch(sock)
+                    while count:
+                        if measures:
+                            self._server.save_all(measures)
+                        measures, count = self.receive_batch(sock)
+
+    def start(self) -> threading.Thread:
+        """
+        Runs this server in a daemon thread.
+        :return: The thread.
+        :rtype: threading.Thread
+        """
+        thread = threading.Thread(target=self.run, name="udp-server", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        """
+        Stops receiving datagrams.
+        """
+        self._stop_event.set()
 
 def udp_server():
     """
-    Creates an UDP server.
+    Runs an UDP server for the configured Server.
     """
-    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
-        logging.getLogger("a2sensor").info(
-            f"UDP server running at port {Server.instance().udp_port}"
-        )
-        # Bind the socket to a specific address and port
-        from .server import Server
-
-        s.bind(("0.0.0.0", Server.instance().udp_port))
-
-        while True:
-            # Receive data from the client
-            data, address = s.recvfrom(1024)
-            print(f"Received data: {data.decode()} from {address}")
-
-            # Optionally, send a response
-            s.sendto(b"ACK", address)
+    from .server import Server
+
+    server = Server.instance()
+    UdpServer(server, server.udp_port, ack=server.udp_ack).run()
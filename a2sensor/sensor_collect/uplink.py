@@ -0,0 +1,244 @@
+"""
+a2sensor/sensor_collect/uplink.py
+
+This script defines the Uplink class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import gzip
+import http.client
+from .json_codec import JsonCodec
+import logging
+from .measure import Measure
+from .metrics import Metrics
+import threading
+import time
+from typing import List
+from urllib.parse import urlsplit
+from .uplink_spool import UplinkSpool
+
+class Uplink():
+    """
+    Forwards measures to an upstream sensor-collect, storing them first in a durable spool.
+
+    A sender thread reads batches from the spool and POSTs them to /v1/measures of the
+    upstream collector, as gzip-compressed NDJSON, over a single keep-alive connection.
+    A batch is acknowledged in the spool only once the upstream collector accepts it, so
+    while the link is down measures pile up in the spool, and forwarding resumes from the
+    first unacknowledged one, with exponential backoff between attempts. Delivery is
+    at-least-once: a batch whose response is lost is sent again.
+
+    Class name: Uplink
+
+    Responsibilities:
+        - Spool measures.
+        - Forward them upstream in compressed batches.
+        - Retry until they are accepted.
+
+    Collaborators:
+        - a2sensor.sensor_collect.UplinkSpool
+        - a2sensor.sensor_collect.Server
+    """
+
+    def __init__(self, url:str, spool:UplinkSpool, batchSize:int=500, interval:float=1.0, timeout:float=10.0, maxBackoff:float=60.0):
+        """
+        Creates a new Uplink instance.
+        :param url: The base URL of the upstream collector, e.g. http://central:8000.
+        :type url: str
+        :param spool: The spool.
+        :type spool: a2sensor.sensor_collect.UplinkSpool
+        :param batchSize: The most measures per request.
+        :type batchSize: int
+        :param interval: The most seconds a measure waits for the batch to fill.
+        :type interval: float
+        :param timeout: The seconds to wait for the upstream collector on each request.
+        :type timeout: float
+        :param maxBackoff: The most seconds between attempts while the upstream collector is unreachable.
+        :type maxBackoff: float
+        """
+        super().__init__()
+        parts = urlsplit(url)
+        if parts.scheme not in [ "http", "https" ] or not parts.hostname:
+            raise ValueError(f"Invalid uplink URL {url}: must be http:// or https:// and include the host")
+        self._url = url
+        self._scheme = parts.scheme
+        self._host = parts.hostname
+        self._port = parts.port
+        self._path = parts.path.rstrip("/") + "/v1/measures"
+        self._spool = spool
+        self._batch_size = batchSize
+        self._interval = interval
+        self._timeout = timeout
+        self._max_backoff = maxBackoff
+        self._connection = None
+        self._metrics = Metrics.instance()
+        self._logger = logging.getLogger("a2sensor")
+        # measures spooled since the last batch was read, to send full batches right away
+        self._pending = 0
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._sender = threading.Thread(target=self._run, name="uplink", daemon=True)
+        self._sender.start()
+
+    @property
+    def url(self) -> str:
+        """
+        Retrieves the base URL of the upstream collector.
+        :return: Such URL.
+        :rtype: str
+        """
+        return self._url
+
+    @property
+    def spool(self) -> UplinkSpool:
+        """
+        Retrieves the spool.
+        :return: Such spool.
+        :rtype: a2sensor.sensor_collect.UplinkSpool
+        """
+        return self._spool
+
+    @classmethod
+    def encode(cls, measure:Measure) -> bytes:
+        """
+        Encodes given measure as an item of a POST /v1/measures NDJSON body.
+        :param measure: The measure.
+        :type measure: a2sensor.sensor_collect.Measure
+        :return: The line.
+        :rtype: bytes
+        """
+        item = { "sensorId": measure.sensor_id, "sensorName": measure.sensor_name, "sensorStatus": measure.status, "epoch": measure.epoch }
+        if measure.count != 1:
+            item["count"] = measure.count
+        return JsonCodec.instance().dumps(item) + b"\n"
+
+    def put_all(self, measures:List[Measure]):
+        """
+        Spools given measures for forwarding.
+        :param measures: The measures.
+        :type measures: List[a2sensor.sensor_collect.Measure]
+        """
+        self._spool.append([ self.__class__.encode(measure) for measure in measures ])
+        with self._condition:
+            self._pending += len(measures)
+            if self._pending >= self._batch_size:
+                self._condition.notify_all()
+
+    def _connect(self) -> http.client.HTTPConnection:
+        """
+        Retrieves the connection to the upstream collector, opening it if needed.
+        :return: The connection.
+        :rtype: http.client.HTTPConnection
+        """
+        if self._connection is None:
+            kind = http.client.HTTPSConnection if self._scheme == "https" else http.client.HTTPConnection
+            self._connection = kind(self._host, self._port, timeout=self._timeout)
+        return self._connection
+
+    def _disconnect(self):
+        """
+        Closes the connection to the upstream collector, if any.
+        """
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def send(self, lines:List[bytes]) -> bool:
+        """
+        POSTs given lines upstream.
+        :param lines: The NDJSON lines.
+        :type lines: List[bytes]
+        :return: True if they are done with, either accepted or rejected as invalid; False if they must be sent again.
+        :rtype: bool
+        """
+        body = gzip.compress(b"".join(lines), 6)
+        headers = { "Content-Type": "application/x-ndjson", "Content-Encoding": "gzip", "Content-Length": str(len(body)) }
+        for attempt in range(2):
+            reused = self._connection is not None
+            try:
+                connection = self._connect()
+                connection.request("POST", self._path, body, headers)
+                response = connection.getresponse()
+                data = response.read()
+                break
+            except (OSError, http.client.HTTPException) as error:
+                self._disconnect()
+                if not reused or attempt > 0:
+                    self._logger.warning(f"Cannot forward {len(lines)} measures to {self._url}: {error}")
+                    return False
+                # the upstream collector may have closed the idle connection: retry once with a new one
+        if response.status in [ 200, 207 ]:
+            rejected = 0
+            if response.status == 207:
+                try:
+                    rejected = sum(1 for result in JsonCodec.instance().loads(data)["results"] if result.get("status") != "success")
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    pass
+                self._metrics.increment("a2sensor_uplink_rejected_total", amount=rejected)
+                self._logger.error(f"The upstream collector rejected {rejected} of {len(lines)} measures as invalid")
+            self._metrics.increment("a2sensor_uplink_sent_total", amount=len(lines) - rejected)
+            return True
+        if 400 <= response.status < 500 and response.status not in [ 408, 429 ]:
+            # sending them again wouldn't change the outcome
+            self._metrics.increment("a2sensor_uplink_rejected_total", amount=len(lines))
+            self._logger.error(f"The upstream collector rejected {len(lines)} measures: {response.status} {data[:200]!r}")
+            return True
+        self._logger.warning(f"Cannot forward {len(lines)} measures to {self._url}: {response.status}")
+        return False
+
+    def _run(self):
+        """
+        Forwards spooled batches until stopped.
+        """
+        backoff = 0
+        last_sent = time.monotonic()
+        while True:
+            with self._condition:
+                if self._stopped:
+                    break
+                self._pending = 0
+            lines, position = self._spool.read(self._batch_size)
+            if len(lines) < self._batch_size:
+                # wait for the batch to fill, or for the interval to pass
+                wait = last_sent + self._interval - time.monotonic() if lines else self._interval
+                if wait > 0:
+                    with self._condition:
+                        if not self._stopped and self._pending < self._batch_size:
+                            self._condition.wait(wait)
+                    continue
+            last_sent = time.monotonic()
+            if self.send(lines):
+                self._spool.ack(position)
+                backoff = 0
+            else:
+                self._metrics.increment("a2sensor_uplink_failures_total")
+                backoff = min(self._max_backoff, max(1.0, backoff * 2))
+                # measures spooled meanwhile notify the condition, but mustn't cut the backoff short
+                deadline = time.monotonic() + backoff
+                with self._condition:
+                    while not self._stopped and time.monotonic() < deadline:
+                        self._condition.wait(deadline - time.monotonic())
+        self._disconnect()
+
+    def close(self):
+        """
+        Stops forwarding, once the request in flight is done. Measures not forwarded yet stay in the spool, for the next run.
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        self._sender.join()
+        self._spool.close()
@@ -0,0 +1,269 @@
+"""
+a2sensor/sensor_collect/uplink_spool.py
+
+This script defines the UplinkSpool class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import json
+import logging
+import os
+import threading
+from typing import List, Tuple
+
+class UplinkSpool():
+    """
+    Durable queue of the lines waiting to be forwarded upstream.
+
+    Lines are appended to numbered segment files, and a reader position (segment and byte
+    offset) is stored in offset.json once the lines before it are acknowledged, so forwarding
+    resumes from there after a restart. Each append, new segments and the position are synced
+    to disk, so neither survives a power loss half-written. Acknowledged segments are deleted,
+    and so are the oldest ones if the spool outgrows its maximum size.
+
+    Class name: UplinkSpool
+
+    Responsibilities:
+        - Append lines durably.
+        - Read lines from the acknowledged position on.
+        - Remember the acknowledged position.
+
+    Collaborators:
+        - a2sensor.sensor_collect.Uplink
+    """
+
+    EXTENSION = ".ndjson"
+
+    def __init__(self, folder:str, segmentMaxBytes:int=4194304, maxBytes:int=268435456):
+        """
+        Creates a new UplinkSpool instance.
+        :param folder: The folder of the spool.
+        :type folder: str
+        :param segmentMaxBytes: The size after which segments are rolled.
+        :type segmentMaxBytes: int
+        :param maxBytes: The size after which the oldest segments are dropped.
+        :type maxBytes: int
+        """
+        super().__init__()
+        self._folder = folder
+        self._segment_max_bytes = segmentMaxBytes
+        self._max_bytes = maxBytes
+        self._offset_file = os.path.join(folder, "offset.json")
+        self._lock = threading.Lock()
+        self._dropped = 0
+        os.makedirs(folder, exist_ok=True)
+        # segment number -> size
+        self._sizes = {}
+        for name in os.listdir(folder):
+            if name.endswith(self.__class__.EXTENSION):
+                self._sizes[int(name[:-len(self.__class__.EXTENSION)])] = os.path.getsize(os.path.join(folder, name))
+        self._read_segment, self._read_offset = self._load_offset()
+        self._writer = None
+        self._write_segment = max(self._sizes) if self._sizes else 0
+        self._open_writer()
+
+    @property
+    def folder(self) -> str:
+        """
+        Retrieves the folder of the spool.
+        :return: Such folder.
+        :rtype: str
+        """
+        return self._folder
+
+    @property
+    def backlog(self) -> int:
+        """
+        Retrieves the bytes not acknowledged yet.
+        :return: Such size.
+        :rtype: int
+        """
+        with self._lock:
+            return sum(size for segment, size in self._sizes.items() if segment >= self._read_segment) - self._read_offset
+
+    @property
+    def dropped(self) -> int:
+        """
+        Retrieves the bytes dropped because the spool was full.
+        :return: Such size.
+        :rtype: int
+        """
+        return self._dropped
+
+    def path_of(self, segment:int) -> str:
+        """
+        Retrieves the path of given segment.
+        :param segment: The segment number.
+        :type segment: int
+        :return: Such path.
+        :rtype: str
+        """
+        return os.path.join(self._folder, f"{segment:020d}{self.__class__.EXTENSION}")
+
+    def _load_offset(self) -> Tuple[int, int]:
+        """
+        Reads the acknowledged position, falling back to the start of the oldest segment.
+        :return: The segment number and the byte offset within it.
+        :rtype: Tuple[int, int]
+        """
+        first = min(self._sizes) if self._sizes else 0
+        try:
+            with open(self._offset_file, 'r') as file:
+                data = json.load(file)
+            segment, offset = int(data['segment']), int(data['offset'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return first, 0
+        if segment not in self._sizes:
+            # its segment was deleted
+            return first, 0
+        return segment, min(offset, self._sizes[segment])
+
+    def _open_writer(self):
+        """
+        Opens the last segment for appending, discarding any line cut short by a crash. Must be called with the lock held, or from the constructor.
+        """
+        path = self.path_of(self._write_segment)
+        created = not os.path.exists(path)
+        self._writer = open(path, 'ab+')
+        if created:
+            self._sync_folder()
+        size = self._writer.tell()
+        if size > 0:
+            # lines are far shorter than the tail read
+            self._writer.seek(max(0, size - 65536))
+            tail = self._writer.read()
+            if not tail.endswith(b"\n"):
+                size -= len(tail) - tail.rfind(b"\n") - 1
+                self._writer.truncate(size)
+        self._sizes[self._write_segment] = size
+
+    def append(self, lines:List[bytes]):
+        """
+        Appends given lines, each one ending with a newline.
+        :param lines: The lines.
+        :type lines: List[bytes]
+        """
+        data = b"".join(lines)
+        with self._lock:
+            if self._sizes[self._write_segment] >= self._segment_max_bytes:
+                self._writer.close()
+                self._write_segment += 1
+                self._open_writer()
+            self._writer.write(data)
+            self._writer.flush()
+            os.fsync(self._writer.fileno())
+            self._sizes[self._write_segment] += len(data)
+            self._drop_oldest()
+
+    def _drop_oldest(self):
+        """
+        Deletes the oldest segments while the spool is over its maximum size. Must be called with the lock held.
+        """
+        while len(self._sizes) > 1 and sum(self._sizes.values()) > self._max_bytes:
+            segment = min(self._sizes)
+            size = self._sizes.pop(segment)
+            os.remove(self.path_of(segment))
+            if segment >= self._read_segment:
+                self._dropped += size - (self._read_offset if segment == self._read_segment else 0)
+                self._read_segment, self._read_offset = min(self._sizes), 0
+                self._save_offset()
+            logging.getLogger("a2sensor").warning(f"The uplink spool is full: dropped {size} bytes of measures not forwarded yet")
+
+    def read(self, maxLines:int) -> Tuple[List[bytes], Tuple[int, int]]:
+        """
+        Reads complete lines from the acknowledged position on.
+        :param maxLines: The most lines to read.
+        :type maxLines: int
+        :return: The lines, and the position right after them, to acknowledge once forwarded.
+        :rtype: Tuple[List[bytes], Tuple[int, int]]
+        """
+        with self._lock:
+            segment, offset = self._read_segment, self._read_offset
+            last = self._write_segment
+            size = self._sizes.get(segment, 0)
+        lines = []
+        while True:
+            if offset < size:
+                try:
+                    with open(self.path_of(segment), 'rb') as file:
+                        file.seek(offset)
+                        while len(lines) < maxLines and offset < size:
+                            line = file.readline(size - offset)
+                            if not line.endswith(b"\n"):
+                                break
+                            lines.append(line)
+                            offset += len(line)
+                except FileNotFoundError:
+                    # dropped because the spool was full: start over from the new position
+                    return self.read(maxLines)
+            if lines or segment >= last:
+                return lines, (segment, offset)
+            # the segment is exhausted: move on to the next one
+            with self._lock:
+                following = [ number for number in self._sizes if number > segment ]
+                if not following:
+                    return lines, (segment, offset)
+                segment, offset = min(following), 0
+                size = self._sizes[segment]
+                last = self._write_segment
+
+    def ack(self, position:Tuple[int, int]):
+        """
+        Acknowledges the lines before given position, deleting the segments left behind.
+        :param position: The position returned by read().
+        :type position: Tuple[int, int]
+        """
+        segment, offset = position
+        with self._lock:
+            if segment < self._read_segment:
+                # dropped meanwhile
+                return
+            self._read_segment, self._read_offset = segment, offset
+            for number in [ number for number in self._sizes if number < segment ]:
+                del self._sizes[number]
+                os.remove(self.path_of(number))
+            self._save_offset()
+
+    def _save_offset(self):
+        """
+        Stores the acknowledged position atomically. Must be called with the lock held.
+        """
+        temporary = self._offset_file + ".tmp"
+        with open(temporary, 'w') as file:
+            json.dump({ "segment": self._read_segment, "offset": self._read_offset }, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self._offset_file)
+        self._sync_folder()
+
+    def _sync_folder(self):
+        """
+        Syncs the entries of the folder, so files created or renamed in it survive a power loss.
+        """
+        descriptor = os.open(self._folder, os.O_RDONLY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+    def close(self):
+        """
+        Closes the segment being appended to.
+        """
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
@@ -0,0 +1,76 @@
+"""
+a2sensor/sensor_collect/webhook_alert_sink.py
+
+This script defines the WebhookAlertSink class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from .alert_sink import AlertSink
+import http.client
+from .json_codec import JsonCodec
+from typing import Dict, List
+import urllib.request
+
+class WebhookAlertSink(AlertSink):
+    """
+    POSTs alerts to a URL, as a JSON object with an "alerts" array.
+
+    Class name: WebhookAlertSink
+
+    Responsibilities:
+        - Send alerts to a webhook.
+
+    Collaborators:
+        - a2sensor.sensor_collect.JsonCodec
+        - a2sensor.sensor_collect.RulesEngine
+    """
+
+    def __init__(self, url:str, timeout:float=5.0):
+        """
+        Creates a new WebhookAlertSink instance.
+        :param url: The URL of the webhook.
+        :type url: str
+        :param timeout: The seconds to wait for it.
+        :type timeout: float
+        """
+        super().__init__()
+        if not url.startswith(("http://", "https://")):
+            raise ValueError(f"Invalid webhook URL {url}: must be http:// or https://")
+        self._url = url
+        self._timeout = timeout
+
+    @property
+    def url(self) -> str:
+        """
+        Retrieves the URL of the webhook.
+        :return: Such URL.
+        :rtype: str
+        """
+        return self._url
+
+    def send(self, alerts:List[Dict]):
+        """
+        POSTs given alerts.
+        :param alerts: The alerts.
+        :type alerts: List[Dict]
+        :raise OSError: If the webhook cannot be reached, or doesn't answer with a 2xx status.
+        """
+        request = urllib.request.Request(self._url, JsonCodec.instance().dumps({ "alerts": alerts }), { "Content-Type": "application/json" }, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=self._timeout) as response:
+                response.read()
+        except http.client.HTTPException as error:
+            raise OSError(f"Invalid response from {self._url}: {error!r}") from error
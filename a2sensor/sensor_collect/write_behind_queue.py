@@ -0,0 +1,214 @@
+"""
+a2sensor/sensor_collect/write_behind_queue.py
+
+This script defines the WriteBehindQueue class.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from collections import deque
+import logging
+from .measure import Measure
+import threading
+from typing import Callable, List
+
+class WriteBehindQueue():
+    """
+    Bounded in-memory queue of measures, drained in batches by a dedicated writer thread.
+
+    Class name: WriteBehindQueue
+
+    Responsibilities:
+        - Accept measures without blocking on disk.
+        - Apply a backpressure policy when full.
+        - Hand measures to the sink in batches, and drain them all on shutdown.
+
+    Collaborators:
+        - a2sensor.sensor_collect.Measure
+    """
+
+    POLICIES = [ "block", "drop-oldest", "coalesce" ]
+
+    def __init__(self, sink:Callable[[List[Measure]], None], exitEvent:threading.Event, maxSize:int=10000, policy:str="block", batchSize:int=500):
+        """
+        Creates a new WriteBehindQueue instance.
+        :param sink: The function persisting a batch of measures.
+        :type sink: Callable[[List[a2sensor.sensor_collect.Measure]], None]
+        :param exitEvent: The event signalling the writer to drain the queue and stop.
+        :type exitEvent: threading.Event
+        :param maxSize: The maximum number of pending measures.
+        :type maxSize: int
+        :param policy: What to do when full: "block" the caller, "drop-oldest" pending measure, or "coalesce" with the pending measure of the same sensor.
+        :type policy: str
+        :param batchSize: The maximum number of measures handed to the sink at once.
+        :type batchSize: int
+        """
+        super().__init__()
+        if policy not in self.__class__.POLICIES:
+            raise ValueError(f"Unknown queue policy {policy}: must be one of {', '.join(self.__class__.POLICIES)}")
+        self._sink = sink
+        self._exit_event = exitEvent
+        self._max_size = maxSize
+        self._policy = policy
+        self._batch_size = batchSize
+        # each pending measure lives in a one-item list, so coalescing can replace it in place
+        self._pending = deque()
+        self._latest = {}
+        self._condition = threading.Condition()
+        self._dropped = 0
+        self._coalesced = 0
+        self._written = 0
+        self._writer = threading.Thread(target=self._drain, name="write-behind", daemon=True)
+        self._writer.start()
+
+    @property
+    def policy(self) -> str:
+        """
+        Retrieves the backpressure policy.
+        :return: Such policy.
+        :rtype: str
+        """
+        return self._policy
+
+    @property
+    def max_size(self) -> int:
+        """
+        Retrieves the maximum number of pending measures.
+        :return: Such number.
+        :rtype: int
+        """
+        return self._max_size
+
+    @property
+    def depth(self) -> int:
+        """
+        Retrieves the number of pending measures.
+        :return: Such number.
+        :rtype: int
+        """
+        return len(self._pending)
+
+    @property
+    def dropped(self) -> int:
+        """
+        Retrieves the number of measures dropped because the queue was full.
+        :return: Such number.
+        :rtype: int
+        """
+        return self._dropped
+
+    @property
+    def coalesced(self) -> int:
+        """
+        Retrieves the number of measures replaced by a newer one of the same sensor.
+        :return: Such number.
+        :rtype: int
+        """
+        return self._coalesced
+
+    @property
+    def written(self) -> int:
+        """
+        Retrieves the number of measures handed to the sink.
+        :return: Such number.
+        :rtype: int
+        """
+        return self._written
+
+    def put(self, measure:Measure):
+        """
+        Enqueues given measure.
+        :param measure: The measure.
+        :type measure: a2sensor.sensor_collect.Measure
+        """
+        self.put_all([ measure ])
+
+    def put_all(self, measures:List[Measure]):
+        """
+        Enqueues given measures.
+        :param measures: The measures.
+        :type measures: List[a2sensor.sensor_collect.Measure]
+        """
+        if not self._writer.is_alive():
+            # the writer is gone: write through rather than lose data
+            self._sink(measures)
+            self._written += len(measures)
+            return
+        with self._condition:
+            for measure in measures:
+                if len(self._pending) >= self._max_size:
+                    if self._policy == "block":
+                        while len(self._pending) >= self._max_size and self._writer.is_alive():
+                            self._condition.wait(0.1)
+                    elif self._policy == "coalesce" and measure.sensor_id in self._latest:
+                        self._latest[measure.sensor_id][0] = measure
+                        self._coalesced += 1
+                        continue
+                    else:
+                        self._discard_oldest()
+                slot = [ measure ]
+                self._pending.append(slot)
+                self._latest[measure.sensor_id] = slot
+            self._condition.notify_all()
+
+    def _discard_oldest(self):
+        """
+        Drops the oldest pending measure. Must be called with the lock held.
+        """
+        slot = self._pending.popleft()
+        if self._latest.get(slot[0].sensor_id, None) is slot:
+            del self._latest[slot[0].sensor_id]
+        self._dropped += 1
+
+    def _take_batch(self) -> List[Measure]:
+        """
+        Removes up to batch_size pending measures. Must be called with the lock held.
+        :return: The measures.
+        :rtype: List[a2sensor.sensor_collect.Measure]
+        """
+        result = []
+        while self._pending and len(result) < self._batch_size:
+            slot = self._pending.popleft()
+            if self._latest.get(slot[0].sensor_id, None) is slot:
+                del self._latest[slot[0].sensor_id]
+            result.append(slot[0])
+        return result
+
+    def _drain(self):
+        """
+        Hands pending measures to the sink until the exit event is set and the queue is empty.
+        """
+        while True:
+            with self._condition:
+                while not self._pending and not self._exit_event.is_set():
+                    self._condition.wait(0.5)
+                if not self._pending:
+                    break
+                batch = self._take_batch()
+                self._condition.notify_all()
+            try:
+                self._sink(batch)
+            except Exception as error:
+                logging.getLogger("a2sensor").error(f"Cannot persist {len(batch)} measures: {error}")
+            self._written += len(batch)
+
+    def close(self):
+        """
+        Signals the writer to stop, and waits until every pending measure is written.
+        """
+        self._exit_event.set()
+        with self._condition:
+            self._condition.notify_all()
+        self._writer.join()
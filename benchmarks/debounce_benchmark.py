@@ -0,0 +1,134 @@
+"""
+benchmarks/debounce_benchmark.py
+
+This script compares the status reported by sampling at the wait interval with the debounced, high-rate sampling, over a glitchy simulated signal, and prints the results as JSON.
+Run it from the root of the repository, as a module, so it imports the package of the checkout: `python -m benchmarks.debounce_benchmark`.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from a2sensor.sensor_collect.debounced_sensor_state import DebouncedSensorState
+from a2sensor.sensor_collect.sensor_state import SensorState
+from bisect import bisect_right
+import json
+import random
+import sys
+import time
+
+def signal(duration:float, seed:int, glitchesPerSecond:float, glitchLength:float):
+    """
+    Builds a signal whose true level changes every 20 to 120 seconds, with short glitches to the other level.
+    :return: The times the true level changes and the level from each one on, and the sorted glitch intervals.
+    """
+    generator = random.Random(seed)
+    changes = [ 0.0 ]
+    levels = [ 1 ]
+    while changes[-1] < duration:
+        changes.append(changes[-1] + generator.uniform(20, 120))
+        levels.append(1 - levels[-1])
+    glitches = []
+    moment = 0.0
+    while moment < duration:
+        moment += generator.expovariate(glitchesPerSecond)
+        glitches.append((moment, moment + glitchLength))
+    return changes, levels, glitches
+
+def level_at(moment:float, changes, levels, glitches) -> int:
+    """
+    Reads the signal at given time.
+    :return: The level, flipped within a glitch.
+    """
+    level = levels[bisect_right(changes, moment) - 1]
+    index = bisect_right(glitches, (moment, float("inf"))) - 1
+    if index >= 0 and glitches[index][0] <= moment < glitches[index][1]:
+        return 1 - level
+    return level
+
+def expected_status(moment:float, changes, levels, activeWindow:float, inactiveWindow:float) -> str:
+    """
+    Computes the status of the glitch-free signal at given time.
+    :return: The status.
+    """
+    index = bisect_right(changes, moment) - 1
+    held = moment - changes[index]
+    if levels[index]:
+        return "empty" if held >= activeWindow or index == 0 else "ok"
+    return "stuck" if held >= inactiveWindow else "ok"
+
+def run(mode:str, duration:float, wait:float, sampleInterval:float, changes, levels, glitches) -> dict:
+    """
+    Samples the signal with given mode, and compares each report with the status of the glitch-free signal.
+    :return: The samples, the reports, the share of wrong ones, the status changes, and the mean delay detecting "empty" and "stuck".
+    """
+    threshold = 5
+    window = threshold * wait
+    if mode == "wait":
+        state = SensorState(threshold, threshold)
+        period = wait
+        update = lambda value, now: state.update(value)
+    else:
+        state = DebouncedSensorState(window, window, 0.05, wait, sampleInterval)
+        period = sampleInterval
+        update = state.update
+    samples = int(duration / period)
+    reports = 0
+    wrong = 0
+    previous = None
+    status_changes = 0
+    reported = []
+    start = time.perf_counter()
+    for index in range(samples):
+        now = index * period
+        status = update(level_at(now, changes, levels, glitches), now)
+        if status is None:
+            continue
+        reports += 1
+        expected = expected_status(now, changes, levels, window, window)
+        if status != expected:
+            wrong += 1
+        if status != previous and previous is not None:
+            status_changes += 1
+        previous = status
+        reported.append((now, status))
+    elapsed = time.perf_counter() - start
+    delays = []
+    for index in range(1, bisect_right(changes, duration)):
+        # from the glitch-free signal reaching "empty" or "stuck" to the first report of it
+        target = changes[index] + window
+        if target >= min(changes[index + 1], samples * period):
+            continue
+        status = "empty" if levels[index] else "stuck"
+        first = bisect_right(reported, (target, ""))
+        detected = next((moment for moment, value in reported[first:] if value == status or moment >= changes[index + 1]), None)
+        if detected is not None and detected < changes[index + 1]:
+            delays.append(detected - target)
+    return {
+        "samples": samples,
+        "reports": reports,
+        "wrong_reports_ratio": wrong / reports,
+        "status_changes": status_changes,
+        "true_status_changes": 2 * (bisect_right(changes, duration) - 1),
+        "mean_detection_delay_seconds": sum(delays) / len(delays) if delays else None,
+        "microseconds_per_sample": elapsed * 1000000 / samples,
+    }
+
+if __name__ == "__main__":
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 3600.0
+    changes, levels, glitches = signal(duration, 1, 0.5, 0.03)
+    result = {
+        "wait_1s": run("wait", duration, 1.0, None, changes, levels, glitches),
+        "sample_interval_10ms": run("debounced", duration, 1.0, 0.01, changes, levels, glitches),
+    }
+    print(json.dumps(result, indent=2))
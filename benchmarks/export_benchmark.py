@@ -0,0 +1,139 @@
+"""
+benchmarks/export_benchmark.py
+
+This script compares loading the history of every sensor by parsing the legacy JSON files, by querying the segmented storage, and by mapping the exported columns, and prints the results as JSON.
+Run it from the root of the repository, as a module, so it imports the package of the checkout: `python -m benchmarks.export_benchmark [sensors] [measures]`.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from a2sensor.sensor_collect.columnar_export import ColumnarExport
+from a2sensor.sensor_collect.measure import Measure
+from a2sensor.sensor_collect.measure_storage import MeasureStorage
+import glob
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+def history(sensors:int, measures:int, start:int) -> list:
+    """
+    Builds the readings of given sensors, one every ten seconds.
+    :return: The batches of measures, each one with a reading of every sensor.
+    """
+    generator = random.Random(start)
+    return [ [ Measure(f"tank-{index}", f"Tank {index}", generator.choice(Measure.STATUSES), start + step * 10000000 + index) for index in range(sensors) ] for step in range(measures) ]
+
+def store(backend:str, folder:str, batches:list):
+    """
+    Appends given batches to a storage of given backend.
+    """
+    storage = MeasureStorage.for_backend(backend, folder, "%Y-%m-%d %H:%M:%S %z", flushInterval=0)
+    for batch in batches:
+        storage.append_all(batch)
+    storage.close()
+
+def glob_json(folder:str) -> int:
+    """
+    Loads every measure the way analysts did: globbing and parsing each JSON file.
+    :return: The measures loaded.
+    """
+    result = 0
+    for sensor_folder in sorted(glob.glob(os.path.join(folder, "*"))):
+        epochs = []
+        statuses = []
+        for path in sorted(glob.glob(os.path.join(sensor_folder, "*.json"))):
+            with open(path, 'r') as file:
+                data = json.load(file)
+            epochs.append(data["value"]["timestamp"])
+            statuses.append(data["value"]["status"])
+        result += len(epochs)
+    return result
+
+def query_storage(storage) -> int:
+    """
+    Loads every measure by querying the storage.
+    :return: The measures loaded.
+    """
+    result = 0
+    for sensor_id in storage.sensor_ids():
+        epochs = []
+        statuses = []
+        for measure in storage.query(sensor_id):
+            epochs.append(measure.epoch)
+            statuses.append(measure.status)
+        result += len(epochs)
+    return result
+
+def map_columns(export:ColumnarExport) -> int:
+    """
+    Loads every measure by mapping the exported columns.
+    :return: The measures loaded.
+    """
+    result = 0
+    for sensor_id in export.sensor_ids():
+        columns = export.columns(sensor_id)
+        result += len(columns["epoch"])
+    return result
+
+def timed(function, *arguments) -> dict:
+    """
+    Runs given function.
+    :return: Its result and the milliseconds it took.
+    """
+    start = time.perf_counter()
+    result = function(*arguments)
+    return { "measures": result, "milliseconds": (time.perf_counter() - start) * 1000 }
+
+if __name__ == "__main__":
+    sensors = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    # two weeks of a reading every ten seconds
+    measures = int(sys.argv[2]) if len(sys.argv) > 2 else 120960
+    legacy_measures = min(measures, 2000)
+    start = 1700000000000000
+    with tempfile.TemporaryDirectory() as folder:
+        legacy = os.path.join(folder, "legacy")
+        store("json", legacy, history(sensors, legacy_measures, start))
+        legacy_result = timed(glob_json, legacy)
+
+        segmented = os.path.join(folder, "segmented")
+        batches = history(sensors, measures, start)
+        store("segmented", segmented, batches)
+        storage = MeasureStorage.for_backend("segmented", segmented, "%Y-%m-%d %H:%M:%S %z", flushInterval=0)
+        query_result = timed(query_storage, storage)
+        export = ColumnarExport(storage)
+        full_export = timed(lambda: sum(export.export().values()))
+        storage.close()
+
+        # an hour of new readings
+        store("segmented", segmented, history(sensors, 360, start + measures * 10000000))
+        storage = MeasureStorage.for_backend("segmented", segmented, "%Y-%m-%d %H:%M:%S %z", flushInterval=0)
+        export = ColumnarExport(storage)
+        incremental_export = timed(lambda: sum(export.export().values()))
+        storage.close()
+        columns_result = timed(map_columns, export)
+
+    result = {
+        "sensors": sensors,
+        "measures_per_sensor": measures,
+        "glob_json_files": dict(legacy_result, measures_per_second=legacy_result["measures"] / legacy_result["milliseconds"] * 1000),
+        "query_segmented_storage": dict(query_result, measures_per_second=query_result["measures"] / query_result["milliseconds"] * 1000),
+        "full_export": full_export,
+        "incremental_export_of_an_hour": incremental_export,
+        "map_columns": dict(columns_result, measures_per_second=columns_result["measures"] / columns_result["milliseconds"] * 1000),
+    }
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,186 @@
+"""
+benchmarks/ingestion_benchmark.py
+
+This script measures the requests per second of the ingestion endpoints, with each JSON codec, and prints the results as JSON.
+Run it from the root of the repository, as a module, so it imports the package of the checkout: `python -m benchmarks.ingestion_benchmark [requests]`.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from a2sensor.sensor_collect.async_http_server import AsyncHttpServer
+from a2sensor.sensor_collect.measure_validator import MeasureValidator
+from a2sensor.sensor_collect.server import Server
+import json
+import logging
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+
+def codecs() -> list:
+    """
+    Lists the JSON codecs available. Trees without a JsonCodec have just the standard library.
+    :return: Their names.
+    """
+    try:
+        from a2sensor.sensor_collect.json_codec import JsonCodec
+    except ImportError:
+        return [ "json" ]
+    try:
+        import orjson
+        return [ "json", "orjson" ]
+    except ImportError:
+        return [ "json" ]
+
+def codec_options(codec:str) -> dict:
+    """
+    Builds the Server options choosing given JSON codec, if the tree supports it.
+    :return: The options.
+    """
+    try:
+        from a2sensor.sensor_collect.json_codec import JsonCodec
+        return { "jsonCodec": codec }
+    except ImportError:
+        return {}
+
+def measure_bodies(count:int) -> list:
+    """
+    Builds the bodies of PUT /v1/<sensorId>/measure requests, as sensors send them.
+    :return: The sensor ids and bodies.
+    """
+    generator = random.Random(1)
+    result = []
+    for _ in range(count):
+        index = generator.randint(0, 9)
+        body = json.dumps({ "sensorName": f"Tank {index}", "sensorStatus": generator.choice(MeasureValidator.STATUSES) }).encode("utf-8")
+        result.append((f"tank-{index}", body))
+    return result
+
+def batch_bodies(count:int, size:int, ndjson:bool) -> list:
+    """
+    Builds the bodies of POST /v1/measures requests.
+    :return: The bodies.
+    """
+    generator = random.Random(1)
+    epoch = 1700000000000000
+    result = []
+    for _ in range(count):
+        items = []
+        for _ in range(size):
+            epoch += 1000
+            index = generator.randint(0, 9)
+            items.append({ "sensorId": f"tank-{index}", "sensorName": f"Tank {index}", "sensorStatus": generator.choice(MeasureValidator.STATUSES), "epoch": epoch })
+        if ndjson:
+            result.append("".join(json.dumps(item) + "\n" for item in items).encode("utf-8"))
+        else:
+            result.append(json.dumps(items).encode("utf-8"))
+    return result
+
+def dispatch(codec:str, requests:int, batchSize:int) -> dict:
+    """
+    Calls the endpoints of the asyncio HTTP server directly, without sockets: parsing, validation,
+    persistence and the encoding of the response.
+    :return: The requests per second of each endpoint.
+    """
+    result = {}
+    with tempfile.TemporaryDirectory() as folder:
+        server = Server(os.path.join(folder, "data"), rollupInterval=0, **codec_options(codec))
+        endpoints = AsyncHttpServer(server, 0)
+        headers = { "content-type": "application/json" }
+        bodies = measure_bodies(requests)
+        start = time.perf_counter()
+        for sensor_id, body in bodies:
+            endpoints.measure_endpoint(sensor_id, headers, body)
+        result["put_measure"] = requests / (time.perf_counter() - start)
+        batches = max(1, requests // batchSize)
+        for kind, mimetype in [ ("post_measures_json", "application/json"), ("post_measures_ndjson", "application/x-ndjson") ]:
+            headers = { "content-type": mimetype }
+            bodies = batch_bodies(batches, batchSize, mimetype == "application/x-ndjson")
+            start = time.perf_counter()
+            for body in bodies:
+                endpoints.measures_endpoint(headers, body)
+            result[kind] = batches / (time.perf_counter() - start)
+        server.close()
+    result["batch_size"] = batchSize
+    return result
+
+def over_http(codec:str, requests:int) -> dict:
+    """
+    Sends PUT /v1/<sensorId>/measure requests to the asyncio HTTP server, over a keep-alive connection.
+    :return: The requests per second.
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        server = Server(os.path.join(folder, "data"), httpPort=port, httpHost="127.0.0.1", rollupInterval=0, **codec_options(codec))
+        server.start_http_server()
+        for attempt in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", port)).close()
+                break
+            except OSError:
+                time.sleep(0.05)
+        messages = [ f"PUT /v1/{sensor_id}/measure HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1") + body for sensor_id, body in measure_bodies(requests) ]
+        with socket.create_connection(("127.0.0.1", port)) as connection:
+            reader = connection.makefile('rb')
+            start = time.perf_counter()
+            for message in messages:
+                connection.sendall(message)
+                length = 0
+                while True:
+                    line = reader.readline()
+                    if line in (b"\r\n", b""):
+                        break
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":")[1])
+                reader.read(length)
+            elapsed = time.perf_counter() - start
+        server.close()
+    return { "put_measure": requests / elapsed }
+
+def flask(codec:str, requests:int) -> dict:
+    """
+    Sends PUT /v1/<sensorId>/measure requests to the Flask app, through its test client.
+    :return: The requests per second, or why it was skipped.
+    """
+    try:
+        from a2sensor.sensor_collect.flask_app import app
+    except ImportError:
+        return { "skipped": "flask is not installed" }
+    with tempfile.TemporaryDirectory() as folder:
+        Server.configure(os.path.join(folder, "data"), None, rollupInterval=0, **codec_options(codec))
+        client = app.test_client()
+        bodies = measure_bodies(requests)
+        start = time.perf_counter()
+        for sensor_id, body in bodies:
+            client.put(f"/v1/{sensor_id}/measure", data=body, content_type="application/json")
+        elapsed = time.perf_counter() - start
+        Server.instance().close()
+    return { "put_measure": requests / elapsed }
+
+if __name__ == "__main__":
+    logging.getLogger("a2sensor").setLevel(logging.WARNING)
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    result = {}
+    for codec in codecs():
+        result[codec] = {
+            "dispatch": dispatch(codec, requests, 100),
+            "http": over_http(codec, requests // 4),
+            "flask": flask(codec, requests // 4),
+        }
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,115 @@
+"""
+benchmarks/rules_benchmark.py
+
+This script measures the latency the alert rules add to the ingestion path, and how fast they are evaluated as the number of sensors grows, and prints the results as JSON.
+Run it from the root of the repository, as a module, so it imports the package of the checkout: `python -m benchmarks.rules_benchmark [measures]`.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from a2sensor.sensor_collect.duration_rule import DurationRule
+from a2sensor.sensor_collect.flapping_rule import FlappingRule
+from a2sensor.sensor_collect.group_rule import GroupRule
+from a2sensor.sensor_collect.measure import Measure
+from a2sensor.sensor_collect.rules_engine import RulesEngine
+from a2sensor.sensor_collect.server import Server
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+RULES = """
+[[rule]]
+name = "stuck"
+type = "duration"
+status = "stuck"
+minutes = 10
+
+[[rule]]
+name = "group"
+type = "group"
+status = "empty"
+more_than = 3
+sensors = [ "tank-0", "tank-1", "tank-2", "tank-3", "tank-4", "tank-5", "tank-6", "tank-7", "tank-8", "tank-9" ]
+
+[[rule]]
+name = "flapping"
+type = "flapping"
+transitions = 6
+seconds = 300
+
+[[sink]]
+type = "file"
+path = "{path}"
+"""
+
+def readings(count:int, sensors:int) -> list:
+    """
+    Builds random readings of given sensors, one every millisecond.
+    :return: The measures.
+    """
+    generator = random.Random(1)
+    epoch = 1700000000000000
+    return [ Measure(f"tank-{index}", f"Tank {index}", generator.choice(Measure.STATUSES), epoch + position * 1000) for position, index in enumerate(generator.randint(0, sensors - 1) for _ in range(count)) ]
+
+def ingestion(count:int, rules:bool) -> dict:
+    """
+    Times Server.save_all with single measures, as the sampling path hands them, with or without rules.
+    :return: The mean and 99th percentile microseconds per call.
+    """
+    measures = readings(count, 10)
+    with tempfile.TemporaryDirectory() as folder:
+        options = {}
+        if rules:
+            path = os.path.join(folder, "rules.toml")
+            with open(path, 'w') as file:
+                file.write(RULES.replace("{path}", os.path.join(folder, "alerts.ndjson")))
+            options["rulesFile"] = path
+        server = Server(os.path.join(folder, "data"), rollupInterval=0, **options)
+        durations = []
+        for measure in measures:
+            start = time.perf_counter()
+            server.save_all([ measure ])
+            durations.append(time.perf_counter() - start)
+        server.close()
+    durations.sort()
+    return { "calls": count, "mean_microseconds": sum(durations) / count * 1000000, "p99_microseconds": durations[int(count * 0.99)] * 1000000 }
+
+def evaluation(count:int, sensors:int) -> dict:
+    """
+    Times the evaluation of the three kinds of rules over given number of sensors.
+    :return: The measures evaluated per second, and the alerts raised or resolved.
+    """
+    measures = readings(count, sensors)
+    ids = [ f"tank-{index}" for index in range(sensors) ]
+    engine = RulesEngine([ DurationRule("stuck", "stuck", 600), GroupRule("group", ids[:10], "empty", 3), FlappingRule("flapping", 6, 300) ], [])
+    start = time.perf_counter()
+    alerts = engine.evaluate(measures)
+    elapsed = time.perf_counter() - start
+    engine.close()
+    return { "sensors": sensors, "measures_per_second": count / elapsed, "alerts": len(alerts) }
+
+if __name__ == "__main__":
+    logging.getLogger("a2sensor").setLevel(logging.WARNING)
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    result = {
+        "ingestion_without_rules": ingestion(count // 5, False),
+        "ingestion_with_rules": ingestion(count // 5, True),
+        "evaluation": [ evaluation(count, sensors) for sensors in [ 10, 1000, 100000 ] ],
+    }
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,71 @@
+"""
+benchmarks/sample_benchmark.py
+
+This script measures the per-sample overhead of the save path, from LocalSensors.sample to the storage.
+Run it from the root of the repository, as a module, so it imports the package of the checkout: `python -m benchmarks.sample_benchmark`.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from a2sensor.sensor_collect.server import Server
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+SENSORS = """
+[tank-1]
+id = "tank-1"
+name = "Tank 1"
+pin = 17
+wait = 1
+
+[tank-2]
+id = "tank-2"
+name = "Tank 2"
+pin = 27
+wait = 1
+"""
+
+def measure(backend:str, samples:int) -> dict:
+    """
+    Feeds a random trace through LocalSensors.sample, writing synchronously to given backend.
+    Informational logs are filtered out, as with any level above INFO.
+    :return: The microseconds per sample.
+    """
+    generator = random.Random(1)
+    trace = [ (generator.choice([ "tank-1", "tank-2" ]), generator.randint(0, 1)) for _ in range(samples) ]
+    with tempfile.TemporaryDirectory() as folder:
+        config = os.path.join(folder, "sensors.toml")
+        with open(config, 'w') as file:
+            file.write(SENSORS)
+        server = Server(os.path.join(folder, "data"), config, storageBackend=backend, queueSize=0, rollupInterval=0)
+        sample = server.local_sensors.sample
+        start = time.perf_counter()
+        for key, value in trace:
+            sample(key, value)
+        server.storage.flush()
+        elapsed = time.perf_counter() - start
+        server.close()
+    return { "samples": samples, "microseconds_per_sample": elapsed * 1000000 / samples }
+
+if __name__ == "__main__":
+    logging.getLogger("a2sensor").setLevel(logging.WARNING)
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    result = { backend: measure(backend, samples if backend != "json" else samples // 10) for backend in [ "segmented", "binary", "json" ] }
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,77 @@
+"""
+benchmarks/startup_benchmark.py
+
+This script times cold imports of the package and its entry points, each in a fresh interpreter, and prints the results as JSON.
+Run it from the root of the repository, as a module, so it imports the package of the checkout: `python -m benchmarks.startup_benchmark`.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# modules that must not be loaded by importing the package
+HEAVY_MODULES = [ "RPi", "toml", "flask", "numpy", "asyncio", "concurrent.futures", "multiprocessing" ]
+
+SCENARIOS = {
+    "interpreter": "pass",
+    "package": "import a2sensor.sensor_collect",
+    "cli_module": "import a2sensor.sensor_collect.sensor_collect",
+    "server": "from a2sensor.sensor_collect import Server",
+}
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+exec(sys.argv[1])
+elapsed = time.perf_counter() - start
+import logging
+print(json.dumps({
+    "seconds": elapsed,
+    "loaded": [ name for name in sys.argv[2].split(",") if name in sys.modules ],
+    "logging_configured": bool(logging.getLogger().handlers),
+}))
+"""
+
+def measure(statement:str, runs:int) -> dict:
+    """
+    Runs given statement in fresh interpreters, without bytecode writes so every run sees the same cache.
+    :return: The median and best wall time of the statement and of the whole process, and what it loaded.
+    """
+    inner = []
+    total = []
+    probe = None
+    for _ in range(runs):
+        begin = time.perf_counter()
+        output = subprocess.run([ sys.executable, "-B", "-c", PROBE, statement, ",".join(HEAVY_MODULES) ], capture_output=True, text=True, check=True, env=os.environ.copy())
+        total.append(time.perf_counter() - begin)
+        probe = json.loads(output.stdout.strip().splitlines()[-1])
+        inner.append(probe["seconds"])
+    return {
+        "import_median_ms": statistics.median(inner) * 1000,
+        "import_best_ms": min(inner) * 1000,
+        "process_median_ms": statistics.median(total) * 1000,
+        "heavy_modules_loaded": probe["loaded"],
+        "logging_configured": probe["logging_configured"],
+    }
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    result = { name: measure(statement, runs) for name, statement in SCENARIOS.items() }
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,75 @@
+"""
+benchmarks/status_benchmark.py
+
+This script compares the speed of the incremental SensorState with the window-based status computation.
+Their equivalence is checked by tests/test_sensor_state.py.
+Run it from the root of the repository, as a module, so it imports the package of the checkout: `python -m benchmarks.status_benchmark`.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from a2sensor.sensor_collect.sensor_state import SensorState
+from collections import deque
+from itertools import islice
+import json
+import random
+import sys
+import time
+
+def window_status(previousValues, timesActive:int, timesInactive:int) -> str:
+    """
+    Computes the status as LocalSensors.to_status does.
+    """
+    last_items_ok_count = min(timesActive, len(previousValues))
+    last_items_ok = islice(previousValues, len(previousValues) - last_items_ok_count, None)
+    last_items_ko_count = min(timesInactive, len(previousValues))
+    last_items_ko = islice(previousValues, len(previousValues) - last_items_ko_count, None)
+    if all(last_items_ok):
+        return "empty"
+    elif all(not x for x in last_items_ko):
+        return "stuck"
+    return "ok"
+
+def measure(samples:int=200000) -> dict:
+    """
+    Times both implementations over the same random trace.
+    :return: The samples per second of each one.
+    """
+    generator = random.Random(1)
+    trace = [ generator.randint(0, 1) for _ in range(samples) ]
+
+    window = deque(maxlen=5)
+    start = time.perf_counter()
+    for value in trace:
+        window.append(value)
+        window_status(window, 5, 5)
+    window_elapsed = time.perf_counter() - start
+
+    state = SensorState(5, 5)
+    update = state.update
+    start = time.perf_counter()
+    for value in trace:
+        update(value)
+    state_elapsed = time.perf_counter() - start
+
+    return {
+        "samples": samples,
+        "window_samples_per_second": samples / window_elapsed,
+        "state_samples_per_second": samples / state_elapsed,
+        "speedup": window_elapsed / state_elapsed,
+    }
+
+if __name__ == "__main__":
+    print(json.dumps(measure(int(sys.argv[1]) if len(sys.argv) > 1 else 200000), indent=2))
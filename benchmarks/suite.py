@@ -0,0 +1,204 @@
+"""
+benchmarks/suite.py
+
+This script runs the reproducible benchmarks of the collector, off a Raspberry Pi, and prints their results as JSON.
+Run it from the root of the repository, as a module, so it imports the package of the checkout: `python -m benchmarks.suite`.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from a2sensor.sensor_collect.measure import Measure
+from a2sensor.sensor_collect.measure_storage import MeasureStorage
+from a2sensor.sensor_collect.measure_validator import MeasureValidator
+from a2sensor.sensor_collect.metrics import Metrics
+from a2sensor.sensor_collect.sensor_state import SensorState
+from a2sensor.sensor_collect.server import Server
+from a2sensor.sensor_collect.simulated_gpio import SimulatedGpio
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+def sensors_file(folder:str, count:int, wait:float) -> str:
+    """
+    Writes a sensors file with given number of sensors, on consecutive pins.
+    :return: Its path.
+    """
+    path = os.path.join(folder, "sensors.toml")
+    with open(path, 'w') as file:
+        for index in range(count):
+            file.write(f'[tank-{index}]\nid = "tank-{index}"\nname = "Tank {index}"\npin = {index + 2}\nwait = {wait}\n\n')
+    return path
+
+def status_throughput(samples:int) -> dict:
+    """
+    Times SensorState.update over a simulated trace.
+    :return: The samples per second.
+    """
+    gpio = SimulatedGpio(seed=1)
+    trace = [ gpio.input(2) for _ in range(samples) ]
+    update = SensorState(5, 5).update
+    start = time.perf_counter()
+    for value in trace:
+        update(value)
+    elapsed = time.perf_counter() - start
+    return { "samples": samples, "samples_per_second": samples / elapsed }
+
+def end_to_end(sampler:str, sensors:int, duration:float) -> dict:
+    """
+    Samples simulated pins as fast as possible, through LocalSensors and the Server into segmented storage.
+    The scheduler needs a period, so its sensors are due every 100 microseconds, and it skips what it can't keep up with.
+    :return: The samples per second, and the share of them persisted by the end.
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        config = sensors_file(folder, sensors, 0 if sampler == "threads" else 0.0001)
+        server = Server(os.path.join(folder, "data"), config, sampler=sampler, gpioBackend="simulated", rollupInterval=0)
+        local_sensors = server.local_sensors
+        metrics = Metrics.instance()
+        before = sum(metrics.value("a2sensor_samples_total", (("sensor", f"tank-{index}"),)) or 0 for index in range(sensors))
+        thread = threading.Thread(target=local_sensors.start)
+        start = time.perf_counter()
+        thread.start()
+        time.sleep(duration)
+        local_sensors.exit_event.set()
+        thread.join()
+        elapsed = time.perf_counter() - start
+        samples = sum(metrics.value("a2sensor_samples_total", (("sensor", f"tank-{index}"),)) or 0 for index in range(sensors)) - before
+        server.close()
+        persisted = sum(1 for index in range(sensors) for _ in server.storage.query(f"tank-{index}"))
+    return { "sensors": sensors, "samples": samples, "samples_per_second": samples / elapsed, "persisted": persisted }
+
+def storage_throughput(backend:str, measures:int) -> dict:
+    """
+    Appends measures of ten sensors to given backend, in batches of 100.
+    :return: The measures per second, flushing included.
+    """
+    generator = random.Random(1)
+    epoch = 1700000000000000
+    batches = []
+    for first in range(0, measures, 100):
+        batch = []
+        for offset in range(min(100, measures - first)):
+            epoch += 1000
+            batch.append(Measure(f"tank-{generator.randint(0, 9)}", "Tank", generator.choice(MeasureValidator.STATUSES), epoch))
+        batches.append(batch)
+    with tempfile.TemporaryDirectory() as folder:
+        storage = MeasureStorage.for_backend(backend, folder, "%Y-%m-%d %H:%M:%S %z", flushInterval=0)
+        start = time.perf_counter()
+        for batch in batches:
+            storage.append_all(batch)
+        storage.flush()
+        elapsed = time.perf_counter() - start
+        storage.close()
+    return { "measures": measures, "measures_per_second": measures / elapsed }
+
+def flask_ingestion(requests:int) -> dict:
+    """
+    Sends PUT /v1/<sensorId>/measure requests to the Flask app, through its test client.
+    :return: The requests per second, or why it was skipped.
+    """
+    try:
+        import flask
+    except ImportError:
+        return { "skipped": "flask is not installed" }
+    with tempfile.TemporaryDirectory() as folder:
+        Server.configure(os.path.join(folder, "data"), None, rollupInterval=0)
+        from a2sensor.sensor_collect.flask_app import app
+        client = app.test_client()
+        body = { "sensorName": "Tank", "sensorStatus": "ok" }
+        start = time.perf_counter()
+        for index in range(requests):
+            client.put(f"/v1/tank-{index % 10}/measure", json=body)
+        elapsed = time.perf_counter() - start
+        Server.instance().close()
+    return { "requests": requests, "requests_per_second": requests / elapsed }
+
+def asyncio_ingestion(requests:int, connections:int) -> dict:
+    """
+    Sends PUT /v1/<sensorId>/measure requests to the asyncio HTTP server, over keep-alive connections,
+    each one with a request in flight at any time.
+    :return: The requests per second.
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        server = Server(os.path.join(folder, "data"), httpPort=port, httpHost="127.0.0.1", rollupInterval=0)
+        server.start_http_server()
+        for attempt in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", port)).close()
+                break
+            except OSError:
+                time.sleep(0.05)
+        body = b'{"sensorName":"Tank","sensorStatus":"ok"}'
+
+        def client(index:int, count:int):
+            with socket.create_connection(("127.0.0.1", port)) as connection:
+                request = f"PUT /v1/tank-{index % 10}/measure HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+                reader = connection.makefile('rb')
+                for _ in range(count):
+                    connection.sendall(request)
+                    length = 0
+                    while True:
+                        line = reader.readline()
+                        if line in (b"\r\n", b""):
+                            break
+                        if line.lower().startswith(b"content-length:"):
+                            length = int(line.split(b":")[1])
+                    reader.read(length)
+
+        threads = [ threading.Thread(target=client, args=(index, requests // connections)) for index in range(connections) ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        server.close()
+    sent = requests // connections * connections
+    return { "requests": sent, "connections": connections, "requests_per_second": sent / elapsed }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs the collector benchmarks, printing JSON")
+    parser.add_argument("--samples", type=int, default=200000, help="The samples of the status benchmark")
+    parser.add_argument("--sensors", type=int, default=8, help="The simulated sensors of the end-to-end benchmark")
+    parser.add_argument("--duration", type=float, default=3.0, help="The seconds each end-to-end benchmark runs")
+    parser.add_argument("--measures", type=int, default=100000, help="The measures of the storage benchmarks")
+    parser.add_argument("--requests", type=int, default=5000, help="The requests of the HTTP benchmarks")
+    parser.add_argument("--connections", type=int, default=16, help="The connections of the asyncio HTTP benchmark")
+    args = parser.parse_args()
+    logging.getLogger("a2sensor").setLevel(logging.WARNING)
+
+    result = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "status": status_throughput(args.samples),
+        "end_to_end": { sampler: end_to_end(sampler, args.sensors, args.duration) for sampler in [ "threads", "scheduler" ] },
+        "storage": { backend: storage_throughput(backend, args.measures if backend != "json" else args.measures // 10) for backend in [ "segmented", "binary", "json" ] },
+        "http": {
+            "flask": flask_ingestion(args.requests),
+            "asyncio": asyncio_ingestion(args.requests, args.connections),
+        },
+    }
+    json.dump(result, sys.stdout, indent=2)
+    print()
@@ -0,0 +1,112 @@
+"""
+benchmarks/uplink_benchmark.py
+
+This script forwards measures through the uplink to a local stand-in upstream collector, and prints the results as JSON.
+Run it from the root of the repository, as a module, so it imports the package of the checkout: `python -m benchmarks.uplink_benchmark`.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from a2sensor.sensor_collect.measure import Measure
+from a2sensor.sensor_collect.measure_validator import MeasureValidator
+from a2sensor.sensor_collect.server import Server
+from a2sensor.sensor_collect.uplink import Uplink
+import gzip
+import json
+import logging
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+
+def free_port() -> int:
+    """
+    Finds a free local port.
+    :return: Such port.
+    """
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+def upstream(folder:str, port:int) -> Server:
+    """
+    Starts a stand-in upstream collector, with the asyncio HTTP server on given port.
+    :return: Its Server.
+    """
+    server = Server(folder, httpPort=port, httpHost="127.0.0.1", rollupInterval=0)
+    server.start_http_server()
+    for attempt in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+    return server
+
+def received(server:Server, sensors:int) -> int:
+    """
+    Counts the measures stored by the upstream collector so far.
+    :return: Such number.
+    """
+    server.storage.flush()
+    return sum(1 for index in range(sensors) for _ in server.storage.query(f"tank-{index}"))
+
+def forward(measures:int, sensors:int, batchSize:int, outage:float) -> dict:
+    """
+    Stores measures in a collector with an uplink, optionally with the upstream collector down for
+    the first seconds, and waits until all of them reach it.
+    :return: The measures per second from the first write to the last one received, and the compression ratio.
+    """
+    generator = random.Random(1)
+    epoch = 1700000000000000
+    batch = []
+    for _ in range(measures):
+        epoch += 1000
+        index = generator.randint(0, sensors - 1)
+        batch.append(Measure(f"tank-{index}", f"Tank {index}", generator.choice(MeasureValidator.STATUSES), epoch))
+    with tempfile.TemporaryDirectory() as folder:
+        port = free_port()
+        central = None if outage > 0 else upstream(os.path.join(folder, "central"), port)
+        edge = Server(os.path.join(folder, "edge"), uplinkUrl=f"http://127.0.0.1:{port}", uplinkBatchSize=batchSize, uplinkInterval=0.1, rollupInterval=0)
+        start = time.perf_counter()
+        for first in range(0, measures, 100):
+            edge.save_all(batch[first:first + 100])
+        if central is None:
+            time.sleep(outage)
+            central = upstream(os.path.join(folder, "central"), port)
+        while received(central, sensors) < measures:
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        edge.close()
+        central.close()
+    raw = b"".join(Uplink.encode(measure) for measure in batch[:batchSize])
+    return {
+        "measures": measures,
+        "batch_size": batchSize,
+        "outage_seconds": outage,
+        "measures_per_second": measures / elapsed,
+        "compression_ratio": len(raw) / len(gzip.compress(raw, 6)),
+    }
+
+if __name__ == "__main__":
+    logging.getLogger("a2sensor").setLevel(logging.ERROR)
+    measures = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    result = {
+        "connected": forward(measures, 10, 500, 0),
+        "after_outage": forward(measures, 10, 500, 2.0),
+    }
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,70 @@
+"""
+tests/test_async_http_server.py
+
+This script checks that long-polls of the asyncio HTTP server wait in its event loop.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from a2sensor.sensor_collect.async_http_server import AsyncHttpServer
+from a2sensor.sensor_collect.measure import Measure
+from a2sensor.sensor_collect.server import Server
+import asyncio
+import os
+import pytest
+import threading
+import time
+
+# more than the threads of the default executor, whatever the number of CPUs
+POLLS = 64
+
+@pytest.fixture
+def server(tmp_path):
+    result = Server(os.path.join(tmp_path, "data"), rollupInterval=0)
+    result.status_cache.update(Measure("tank-1", "Tank 1", "ok", 1700000000000000))
+    yield result
+    result.close()
+
+async def long_polls(server:Server, wait:float) -> list:
+    endpoints = AsyncHttpServer(server, 0)
+    etag = server.status_cache.etag
+    return await asyncio.gather(*[ endpoints.status_endpoint({ "wait": [ str(wait) ] }, { "if-none-match": etag }) for _ in range(POLLS) ])
+
+def test_concurrent_long_polls_time_out_together(server):
+    start = time.monotonic()
+    responses = asyncio.run(long_polls(server, 1))
+    elapsed = time.monotonic() - start
+    assert [ status_code for status_code, headers, body in responses ] == [ 304 ] * POLLS
+    assert elapsed < 2
+
+def test_concurrent_long_polls_are_woken_by_a_change(server):
+    timer = threading.Timer(0.2, server.status_cache.update, [ Measure("tank-1", "Tank 1", "empty", 1700000001000000) ])
+    timer.start()
+    start = time.monotonic()
+    responses = asyncio.run(long_polls(server, 30))
+    elapsed = time.monotonic() - start
+    timer.join()
+    assert [ status_code for status_code, headers, body in responses ] == [ 200 ] * POLLS
+    assert all(b'"empty"' in body for status_code, headers, body in responses)
+    assert elapsed < 5
+
+def test_long_polls_end_when_the_cache_closes(server):
+    timer = threading.Timer(0.2, server.status_cache.close)
+    timer.start()
+    start = time.monotonic()
+    responses = asyncio.run(long_polls(server, 30))
+    timer.join()
+    assert [ status_code for status_code, headers, body in responses ] == [ 304 ] * POLLS
+    assert time.monotonic() - start < 5
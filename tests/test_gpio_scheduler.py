@@ -0,0 +1,51 @@
+"""
+tests/test_gpio_scheduler.py
+
+This script checks that sensors with an invalid period are rejected, and that the GpioScheduler only takes positive ones.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from a2sensor.sensor_collect.gpio_scheduler import GpioScheduler
+from a2sensor.sensor_collect.sensor_descriptor import SensorDescriptor
+from a2sensor.sensor_collect.simulated_gpio import SimulatedGpio
+import pytest
+import threading
+
+@pytest.mark.parametrize("wait", [ -1, -0.5, float("nan"), "1", True ])
+def test_descriptor_rejects_invalid_waits(wait):
+    with pytest.raises(ValueError, match="tank"):
+        SensorDescriptor.for_sensor("tank", { "pin": 4, "wait": wait })
+
+def test_descriptor_accepts_sampling_as_fast_as_possible():
+    assert SensorDescriptor.for_sensor("tank", { "pin": 4, "wait": 0 }).period == 0
+
+@pytest.mark.parametrize("period", [ 0, -0.5, float("nan") ])
+def test_scheduler_rejects_periods_that_are_not_positive(period):
+    scheduler = GpioScheduler(SimulatedGpio(), lambda sensorKey, value: None, threading.Event())
+    with pytest.raises(ValueError):
+        scheduler.add("tank", 4, period)
+    assert scheduler.pins == []
+
+def test_scheduler_keeps_sampling_after_rejecting_a_pin():
+    now = [ 0.0 ]
+    samples = []
+    scheduler = GpioScheduler(SimulatedGpio(), lambda sensorKey, value: samples.append(sensorKey), threading.Event(), clock=lambda: now[0])
+    scheduler.schedule("good", 4, 1.0)
+    scheduler.schedule("bad", 5, 0)
+    for step in range(3):
+        scheduler.run_once()
+        now[0] += 1.0
+    assert samples == [ "good" ] * 3
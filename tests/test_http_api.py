@@ -0,0 +1,177 @@
+"""
+tests/test_http_api.py
+
+This script runs the same requests against the Flask app and the asyncio HTTP server, expecting the same responses.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from a2sensor.sensor_collect.async_http_server import AsyncHttpServer
+from a2sensor.sensor_collect.server import Server
+import asyncio
+import gzip
+import json
+import os
+import pytest
+import time
+
+EPOCH = 1700000000000000
+
+class FlaskClient():
+    """
+    Sends requests to the Flask app, through its test client.
+    """
+
+    def __init__(self):
+        pytest.importorskip("flask")
+        from a2sensor.sensor_collect.flask_app import app
+        self._client = app.test_client()
+
+    def request(self, method:str, path:str, body:bytes=b"", headers:dict=None):
+        response = self._client.open(path, method=method, data=body, headers=headers or {})
+        return response.status_code, response.headers.get("ETag", None), response.get_data()
+
+class AsyncClient():
+    """
+    Sends requests to the endpoints of the asyncio HTTP server, without sockets.
+    """
+
+    def __init__(self):
+        self._endpoints = AsyncHttpServer(Server.instance(), 0)
+
+    def request(self, method:str, path:str, body:bytes=b"", headers:dict=None):
+        status_code, extra_headers, response_body = asyncio.run(self._endpoints.dispatch(method, path, { name.lower(): value for name, value in (headers or {}).items() }, body))
+        return status_code, extra_headers.get("ETag", None), response_body
+
+@pytest.fixture(params=[ "flask", "asyncio" ])
+def client(request, tmp_path):
+    Server.configure(os.path.join(tmp_path, "data"), None, rollupInterval=3600, queueSize=0, flushInterval=0)
+    try:
+        yield FlaskClient() if request.param == "flask" else AsyncClient()
+    finally:
+        Server.instance().close()
+
+JSON = { "Content-Type": "application/json" }
+NDJSON = { "Content-Type": "application/x-ndjson" }
+
+def item(index:int, status:str="ok", epoch:int=None) -> dict:
+    return { "sensorId": f"tank-{index}", "sensorName": f"Tank {index}", "sensorStatus": status, "epoch": epoch if epoch is not None else EPOCH + index }
+
+def lines(body:bytes) -> list:
+    return [ json.loads(line) for line in body.splitlines() ]
+
+def test_put_measure(client):
+    status_code, etag, body = client.request("PUT", "/v1/tank-1/measure", json.dumps({ "sensorName": "Tank 1", "sensorStatus": "ok" }).encode("utf-8"), JSON)
+    assert (status_code, json.loads(body)) == (200, { "status": "success" })
+    status_code, etag, body = client.request("GET", "/v1/tank-1/measures")
+    assert status_code == 200
+    assert [ (measure["id"], measure["name"], measure["value"]["status"]) for measure in lines(body) ] == [ ("tank-1", "Tank 1", "ok") ]
+
+@pytest.mark.parametrize("body, headers", [
+    (b'{"sensorName": "Tank 1", "sensorStatus": ', JSON),
+    (b'[]', JSON),
+    (json.dumps({ "sensorName": "Tank 1", "sensorStatus": "ok" }).encode("utf-8"), { "Content-Type": "text/plain" }),
+])
+def test_put_malformed_json(client, body, headers):
+    status_code, etag, body = client.request("PUT", "/v1/tank-1/measure", body, headers)
+    assert (status_code, json.loads(body)) == (400, { "error": "Invalid JSON format" })
+
+@pytest.mark.parametrize("sensor_id", [ ".hidden", "a..b", "a%5Cb" ])
+def test_put_invalid_sensor_id(client, sensor_id):
+    status_code, etag, body = client.request("PUT", f"/v1/{sensor_id}/measure", json.dumps({ "sensorName": "Tank 1", "sensorStatus": "ok" }).encode("utf-8"), JSON)
+    result = json.loads(body)
+    assert (status_code, result["status"]) == (400, "invalid request")
+    assert "'sensorId'" in result["messages"][0]
+
+@pytest.mark.parametrize("data, message", [
+    ({ "sensorStatus": "ok" }, "Missing 'sensorName' attribute"),
+    ({ "sensorName": { "room": "kitchen" }, "sensorStatus": "ok" }, "Provided 'sensorName' is {'room': 'kitchen'} and must be a string"),
+    ({ "sensorName": "Tank 1", "sensorStatus": "full" }, "Provided 'sensorStatus' is full and must be one of 'empty', 'ok' or 'stuck'"),
+])
+def test_put_invalid_measure(client, data, message):
+    status_code, etag, body = client.request("PUT", "/v1/tank-1/measure", json.dumps(data).encode("utf-8"), JSON)
+    assert (status_code, json.loads(body)) == (400, { "status": "invalid request", "messages": [ message ] })
+    assert client.request("GET", "/v1/tank-1/measures")[2] == b""
+
+@pytest.mark.parametrize("encoding", [ "json", "ndjson", "gzip" ])
+def test_post_measures(client, encoding):
+    items = [ item(index) for index in range(3) ]
+    if encoding == "ndjson":
+        body, headers = "".join(json.dumps(each) + "\n" for each in items).encode("utf-8"), NDJSON
+    elif encoding == "gzip":
+        body, headers = gzip.compress(json.dumps(items).encode("utf-8")), dict(JSON, **{ "Content-Encoding": "gzip" })
+    else:
+        body, headers = json.dumps(items).encode("utf-8"), JSON
+    status_code, etag, body = client.request("POST", "/v1/measures", body, headers)
+    result = json.loads(body)
+    assert (status_code, result["status"]) == (200, "success")
+    for index in range(3):
+        assert [ measure["value"]["epoch"] for measure in lines(client.request("GET", f"/v1/tank-{index}/measures")[2]) ] == [ EPOCH + index ]
+
+def test_post_measures_partially_valid(client):
+    items = [ item(1), dict(item(2), sensorStatus="full"), dict(item(3), sensorId="../etc") ]
+    status_code, etag, body = client.request("POST", "/v1/measures", json.dumps(items).encode("utf-8"), JSON)
+    result = json.loads(body)
+    assert (status_code, result["status"]) == (207, "partial success")
+    assert [ each["status"] for each in result["results"] ] == [ "success", "invalid request", "invalid request" ]
+    assert len(lines(client.request("GET", "/v1/tank-1/measures")[2])) == 1
+    assert client.request("GET", "/v1/tank-2/measures")[2] == b""
+
+@pytest.mark.parametrize("body, headers", [
+    (json.dumps([ dict(item(1), sensorStatus="full") ]).encode("utf-8"), JSON),
+    (b'{"sensorId": "tank-1"}', JSON),
+    (b'[{"sensorId": ', JSON),
+    (b'{"sensorId": "tank-1"}\n{', NDJSON),
+    (b'not gzip', dict(JSON, **{ "Content-Encoding": "gzip" })),
+])
+def test_post_measures_invalid(client, body, headers):
+    status_code, etag, body = client.request("POST", "/v1/measures", body, headers)
+    assert status_code == 400
+
+def test_get_measures_in_a_time_range(client):
+    items = [ item(1, epoch=EPOCH + offset * 1000000) for offset in range(10) ]
+    assert client.request("POST", "/v1/measures", json.dumps(items).encode("utf-8"), JSON)[0] == 200
+    status_code, etag, body = client.request("GET", f"/v1/tank-1/measures?from={EPOCH // 1000000 + 2}&to={EPOCH // 1000000 + 5}")
+    assert status_code == 200
+    assert [ measure["value"]["epoch"] for measure in lines(body) ] == [ EPOCH + offset * 1000000 for offset in range(2, 5) ]
+    assert client.request("GET", "/v1/tank-1/measures?from=yesterday")[0] == 400
+    assert client.request("GET", "/v1/tank-1/measures?to=nan")[0] == 400
+
+def test_get_rollups(client):
+    items = [ item(1, "ok" if offset < 30 else "empty", EPOCH + offset * 10000000) for offset in range(60) ]
+    assert client.request("POST", "/v1/measures", json.dumps(items).encode("utf-8"), JSON)[0] == 200
+    Server.instance().rollups.run_once(EPOCH + 3600 * 1000000)
+    status_code, etag, body = client.request("GET", f"/v1/tank-1/rollups?from={EPOCH // 1000000 - 60}&to={EPOCH // 1000000 + 660}&points=100")
+    assert status_code == 200
+    rows = lines(body)
+    assert rows
+    assert sum(row["ok"] for row in rows) == 30 and sum(row["empty"] for row in rows) == 30
+    assert client.request("GET", "/v1/tank-1/rollups?points=many")[0] == 400
+
+def test_status_etag_and_long_poll(client):
+    assert client.request("POST", "/v1/measures", json.dumps([ item(1) ]).encode("utf-8"), JSON)[0] == 200
+    status_code, etag, body = client.request("GET", "/v1/status")
+    result = json.loads(body)
+    assert status_code == 200 and etag is not None
+    assert result["sensors"] == { "tank-1": { "name": "Tank 1", "status": "ok", "since": EPOCH + 1 } }
+    assert client.request("GET", "/v1/status", headers={ "If-None-Match": etag })[:2] == (304, etag)
+    start = time.monotonic()
+    assert client.request("GET", "/v1/status?wait=0.3", headers={ "If-None-Match": etag })[:2] == (304, etag)
+    assert time.monotonic() - start >= 0.25
+    assert client.request("GET", "/v1/status?wait=inf", headers={ "If-None-Match": etag })[0] == 400
+    assert client.request("POST", "/v1/measures", json.dumps([ item(1, "empty", EPOCH + 2) ]).encode("utf-8"), JSON)[0] == 200
+    status_code, new_etag, body = client.request("GET", "/v1/status?wait=5", headers={ "If-None-Match": etag })
+    assert status_code == 200 and new_etag != etag
+    assert json.loads(body)["sensors"]["tank-1"]["status"] == "empty"
@@ -0,0 +1,47 @@
+"""
+tests/test_measure_validator.py
+
+This script checks that MeasureValidator rejects measures the storage can't persist.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from a2sensor.sensor_collect.json_lines_codec import JsonLinesCodec
+from a2sensor.sensor_collect.measure import Measure
+from a2sensor.sensor_collect.measure_validator import MeasureValidator
+import json
+import pytest
+
+NAMES = [ { "room": "kitchen" }, [ "Tank", 1 ], 42, True ]
+
+@pytest.mark.parametrize("name", NAMES)
+def test_rejects_names_that_are_not_strings(name):
+    messages = MeasureValidator.validate(name, "ok")
+    assert len(messages) == 1 and "'sensorName'" in messages[0]
+
+@pytest.mark.parametrize("name", NAMES)
+def test_rejects_batch_items_with_names_that_are_not_strings(name):
+    item = { "sensorId": "tank-1", "sensorName": name, "sensorStatus": "ok" }
+    assert not MeasureValidator.is_valid_item(item)
+    status_code, result, measures = MeasureValidator.validate_batch([ item, { "sensorId": "tank-2", "sensorName": "Tank 2", "sensorStatus": "ok" } ])
+    assert status_code == 207
+    assert [ measure.sensor_id for measure in measures ] == [ "tank-2" ]
+
+@pytest.mark.parametrize("name", NAMES + [ "Tank \"1\"" ])
+def test_codec_encodes_any_name(name):
+    codec = JsonLinesCodec("%Y-%m-%d %H:%M:%S %z")
+    record = codec.encode(Measure("tank-1", name, "ok", 1700000000000000))
+    assert json.loads(record)["name"] == name
+    assert codec.decode(record).sensor_name == name
@@ -0,0 +1,98 @@
+"""
+tests/test_rules_engine.py
+
+This script checks that a failing alert rule doesn't affect the other rules of a RulesEngine.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from a2sensor.sensor_collect.alert_rule import AlertRule
+from a2sensor.sensor_collect.alert_sink import AlertSink
+from a2sensor.sensor_collect.measure import Measure
+from a2sensor.sensor_collect.metrics import Metrics
+from a2sensor.sensor_collect.rules_engine import RulesEngine
+import pytest
+import threading
+
+class EchoRule(AlertRule):
+    """
+    Fires on every measure, and resolves on every tick.
+    """
+
+    def update(self, measure):
+        return [ self.alert("firing", measure.epoch, measure.sensor_id) ]
+
+    def tick(self, now):
+        return [ self.alert("resolved", now, "tick") ]
+
+class FaultyRule(AlertRule):
+    """
+    Fails on the measures of the "bad" sensor, and on every tick.
+    """
+
+    def update(self, measure):
+        if measure.sensor_id == "bad":
+            raise RuntimeError("boom")
+        return []
+
+    def tick(self, now):
+        raise RuntimeError("boom")
+
+class ListSink(AlertSink):
+    """
+    Keeps the alerts it receives.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.alerts = []
+        self.delivered = threading.Event()
+
+    def send(self, alerts):
+        self.alerts.extend(alerts)
+        self.delivered.set()
+
+def errors(rule:str) -> float:
+    return Metrics.instance().value("a2sensor_rules_errors_total", (("rule", rule),)) or 0
+
+@pytest.fixture
+def engine():
+    result = RulesEngine([ FaultyRule("faulty"), EchoRule("echo") ], [], tickInterval=3600)
+    yield result
+    result.close()
+
+def test_evaluate_keeps_the_alerts_of_the_other_rules(engine):
+    before = errors("faulty")
+    measures = [ Measure(sensor_id, sensor_id, "ok", epoch) for epoch, sensor_id in enumerate([ "good", "bad", "good", "bad", "other" ]) ]
+    alerts = engine.evaluate(measures)
+    assert [ (alert["rule"], alert["message"]) for alert in alerts ] == [ ("echo", "good"), ("echo", "bad"), ("echo", "good"), ("echo", "bad"), ("echo", "other") ]
+    assert errors("faulty") == before + 2
+    assert errors("echo") == 0
+
+def test_tick_keeps_the_alerts_of_the_other_rules(engine):
+    before = errors("faulty")
+    alerts = engine.tick(1700000000000000)
+    assert [ (alert["rule"], alert["state"]) for alert in alerts ] == [ ("echo", "resolved") ]
+    assert errors("faulty") == before + 1
+
+def test_queued_measures_reach_the_sinks_despite_a_failing_rule():
+    sink = ListSink()
+    engine = RulesEngine([ FaultyRule("faulty"), EchoRule("echo") ], [ sink ], tickInterval=3600)
+    try:
+        engine.put_all([ Measure("bad", "Bad", "ok", 1), Measure("good", "Good", "ok", 2) ])
+        assert sink.delivered.wait(5)
+    finally:
+        engine.close()
+    assert [ alert["message"] for alert in sink.alerts ] == [ "bad", "good" ]
@@ -0,0 +1,61 @@
+"""
+tests/test_sensor_state.py
+
+This script checks SensorState against LocalSensors.to_status.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from a2sensor.sensor_collect.local_sensors import LocalSensors
+from a2sensor.sensor_collect.sensor_state import SensorState
+from collections import deque
+import pytest
+import random
+from types import SimpleNamespace
+
+def to_status(window, active:int, inactive:int) -> str:
+    """
+    Computes the status of given window with LocalSensors.to_status, for a sensor with given thresholds.
+    """
+    sensors = SimpleNamespace(sensors={ "tank": { "times_active_until_considered_stuck": active, "times_inactive_until_considered_empty": inactive } })
+    return LocalSensors.to_status(sensors, "tank", list(window))
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_to_status_on_random_traces(seed):
+    generator = random.Random(seed)
+    for case in range(100):
+        active = generator.randint(0, 12)
+        inactive = generator.randint(0, 12)
+        # runs of the same value, so both long and short runs show up
+        stickiness = generator.random()
+        window = deque(maxlen=max(active, inactive))
+        state = SensorState(active, inactive)
+        value = generator.randint(0, 1)
+        for sample in range(generator.randint(1, 200)):
+            if generator.random() > stickiness:
+                value = 1 - value
+            window.append(value)
+            assert state.update(value) == to_status(window, active, inactive), f"active={active} inactive={inactive} window={list(window)}"
+
+@pytest.mark.parametrize("active, inactive", [ (0, 0), (0, 5), (5, 0), (1, 1), (5, 5), (3, 8) ])
+def test_matches_to_status_on_every_short_trace(active, inactive):
+    for length in range(1, 11):
+        for bits in range(2 ** length):
+            trace = [ (bits >> index) & 1 for index in range(length) ]
+            window = deque(maxlen=max(active, inactive))
+            state = SensorState(active, inactive)
+            for value in trace:
+                window.append(value)
+                assert state.update(value) == to_status(window, active, inactive), f"active={active} inactive={inactive} trace={trace}"
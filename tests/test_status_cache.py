@@ -0,0 +1,51 @@
+"""
+tests/test_status_cache.py
+
+This script checks that the StatusCache ignores measures arriving late.
+
+Copyright (C) 2023-today a2sensor's a2sensor/sensor_collect
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from a2sensor.sensor_collect.measure import Measure
+from a2sensor.sensor_collect.status_cache import StatusCache
+
+EPOCH = 1700000000000000
+
+def measure(status:str, seconds:int) -> Measure:
+    return Measure("tank-1", "Tank 1", status, EPOCH + seconds * 1000000)
+
+def test_ignores_a_status_older_than_the_current_one():
+    cache = StatusCache()
+    assert cache.update(measure("ok", 10))
+    version = cache.version
+    assert not cache.update(measure("empty", 5))
+    assert cache.version == version
+    assert cache.snapshot()[1]["tank-1"] == { "name": "Tank 1", "status": "ok", "since": EPOCH + 10000000 }
+
+def test_ignores_a_status_older_than_the_newest_measure():
+    cache = StatusCache()
+    assert cache.update(measure("ok", 10))
+    # the same status, so "since" stays at 10
+    assert not cache.update(measure("ok", 20))
+    assert not cache.update(measure("empty", 15))
+    assert cache.snapshot()[1]["tank-1"]["status"] == "ok"
+    assert cache.update(measure("empty", 25))
+    assert cache.snapshot()[1]["tank-1"] == { "name": "Tank 1", "status": "empty", "since": EPOCH + 25000000 }
+
+def test_takes_a_status_as_old_as_the_newest_measure():
+    cache = StatusCache()
+    assert cache.update(measure("ok", 10))
+    assert cache.update(measure("stuck", 10))
+    assert cache.snapshot()[1]["tank-1"]["status"] == "stuck"